@@ -0,0 +1,213 @@
+"""End-to-end benchmarks for the auth, vault and export/import flows.
+
+Runs the app in-process (httpx ASGI transport) against a throwaway SQLite
+database and prints a JSON report, e.g.::
+
+    python bench/bench_app.py --iterations 200 --concurrency 8 --sizes 100,1000,10000 --output before.json
+
+Compare two reports (say, from two commits) key by key; every flow reports
+count, throughput and latency percentiles.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+
+def seed_entries(user_id: int, count: int):
+    """Insert `count` entries directly, bypassing the API, for the export/import sizes."""
+    from sqlalchemy import insert
+    from database import SessionLocal
+    from models.models import PasswordEntry
+    from utils.auth import encrypt_password
+
+    with SessionLocal() as db:
+        for start in range(0, count, 1000):
+            db.execute(insert(PasswordEntry), [
+                {
+                    "user_id": user_id,
+                    "title": f"Service {i}",
+                    "url": f"https://service{i}.example.com/login",
+                    "username": f"user{i}@example.com",
+                    "encrypted_password": encrypt_password(f"Seed-Passw0rd!{i}"),
+                    "notes": f"Seeded entry {i}",
+                }
+                for i in range(start, min(start + 1000, count))
+            ])
+        db.commit()
+
+
+async def bench_auth(app, mail, iterations: int, concurrency: int) -> dict:
+    clients = [harness.client_for(app) for _ in range(concurrency)]
+    emails = []
+    for worker, client in enumerate(clients):
+        await harness.register_and_login(client, mail, f"auth{worker}")
+        emails.append(f"auth{worker}@bench.example.com")
+
+    async def login(worker, i):
+        response = await clients[worker].post("/auth/login", json={"email": emails[worker], "password": harness.BENCH_PASSWORD})
+        response.raise_for_status()
+
+    async def verify_otp(worker, i):
+        response = await clients[worker].post("/auth/verify-otp", json={"email": emails[worker], "otp": mail.otp_for(emails[worker])})
+        response.raise_for_status()
+
+    async def login_verify_otp(worker, i):
+        await login(worker, i)
+        await verify_otp(worker, i)
+
+    results = {"login_verify_otp": await harness.run_concurrently(login_verify_otp, iterations, concurrency)}
+    # Measure the two halves separately too: login is dominated by bcrypt, verify-otp by JWT signing.
+    login_latencies = []
+    verify_latencies = []
+
+    async def split(worker, i):
+        start = time.perf_counter()
+        await login(worker, i)
+        middle = time.perf_counter()
+        await verify_otp(worker, i)
+        login_latencies.append(middle - start)
+        verify_latencies.append(time.perf_counter() - middle)
+
+    wall = await harness.run_concurrently(split, iterations, concurrency)
+    results["login"] = harness.summarize(login_latencies, wall.get("wall_seconds", 0))
+    results["verify_otp"] = harness.summarize(verify_latencies, wall.get("wall_seconds", 0))
+
+    for client in clients:
+        await client.aclose()
+    return results
+
+
+async def bench_vault(app, mail, iterations: int, concurrency: int) -> dict:
+    clients = [harness.client_for(app) for _ in range(concurrency)]
+    for worker, client in enumerate(clients):
+        await harness.register_and_login(client, mail, f"vault{worker}")
+    entry_ids = [[] for _ in range(concurrency)]
+
+    async def create(worker, i):
+        response = await clients[worker].post("/api/v1/create-password", json={
+            "title": f"Service {i}",
+            "url": f"https://service{i}.example.com",
+            "username": f"user{i}",
+            "password": f"Bench-Entry-{i}!aA",
+            "notes": "benchmark",
+        })
+        response.raise_for_status()
+        entry_ids[worker].append(response.json()["id"])
+
+    async def list_all(worker, i):
+        (await clients[worker].get("/api/v1/passwords-list")).raise_for_status()
+
+    async def list_page(worker, i):
+        (await clients[worker].get("/api/v1/passwords-list", params={"limit": 50})).raise_for_status()
+
+    async def reveal(worker, i):
+        ids = entry_ids[worker]
+        response = await clients[worker].post("/api/v1/get-password", json={
+            "serviceID": str(ids[i % len(ids)]),
+            "email": f"vault{worker}@bench.example.com",
+            "password": harness.BENCH_PASSWORD,
+        })
+        response.raise_for_status()
+
+    async def update(worker, i):
+        ids = entry_ids[worker]
+        response = await clients[worker].put(f"/api/v1/update-password/{ids[i % len(ids)]}", json={
+            "title": f"Service {i} (updated)",
+            "url": f"https://service{i}.example.com",
+            "username": f"user{i}",
+            "password": f"Bench-Update-{i}!aA",
+            "notes": "benchmark",
+            "is_deleted": False,
+            "is_Favrout": bool(i % 2),
+        })
+        response.raise_for_status()
+
+    results = {}
+    for name, operation in (("create", create), ("list", list_all), ("list_page_50", list_page),
+                            ("reveal", reveal), ("update", update)):
+        results[name] = await harness.run_concurrently(operation, iterations, concurrency)
+
+    for client in clients:
+        await client.aclose()
+    return results
+
+
+async def bench_export_import(app, mail, sizes: list, repeats: int) -> dict:
+    results = {}
+    async with harness.client_for(app) as client:
+        for size in sizes:
+            user_id = await harness.register_and_login(client, mail, f"export{size}")
+            target_id = await harness.register_and_login(client, mail, f"import{size}")
+            seed_entries(user_id, size)
+            exported = {}
+            size_results = {}
+
+            for stream in (False, True):
+                label = "stream" if stream else "json"
+
+                async def export(worker, i):
+                    response = await client.get("/api/v1/encryption/export-passwords", params={
+                        "user_id": user_id, "passphrase": "bench passphrase", "stream": stream,
+                    })
+                    response.raise_for_status()
+                    exported[label] = response.content
+
+                async def import_(worker, i):
+                    response = await client.post(
+                        "/api/v1/encryption/import-passwords",
+                        params={"user_id": target_id},
+                        data={"passphrase": "bench passphrase"},
+                        files={"file": (f"export.{label}", exported[label])},
+                    )
+                    response.raise_for_status()
+
+                size_results[f"export_{label}"] = await harness.run_concurrently(export, repeats, 1)
+                size_results[f"export_{label}"]["bytes"] = len(exported[label])
+                size_results[f"import_{label}"] = await harness.run_concurrently(import_, repeats, 1)
+            results[str(size)] = size_results
+    return results
+
+
+async def main(args) -> dict:
+    mail = harness.install_mail_stub()
+    harness.quiet_logging()
+    report = {
+        "benchmark": "app",
+        "environment": harness.environment_info(),
+        "parameters": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "sizes": args.sizes,
+            "repeats": args.repeats,
+        },
+        "results": {},
+    }
+    async with harness.running_app() as app:
+        report["results"]["auth"] = await bench_auth(app, mail, args.iterations, args.concurrency)
+        report["results"]["vault"] = await bench_vault(app, mail, args.iterations, args.concurrency)
+        report["results"]["export_import"] = await bench_export_import(app, mail, args.sizes, args.repeats)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50, help="Requests per vault/auth operation")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (one user each)")
+    parser.add_argument("--sizes", type=lambda s: [int(v) for v in s.split(",")], default=[100, 1000, 5000],
+                        help="Comma-separated vault sizes for export/import")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per export/import size")
+    parser.add_argument("--workdir", help="Keep the database, keys and logs here instead of a temp dir")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory(prefix="pm-bench-") as tmp:
+        harness.prepare_environment(os.path.abspath(args.workdir) if args.workdir else tmp)
+        harness.write_report(asyncio.run(main(args)), output)
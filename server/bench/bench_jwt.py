@@ -0,0 +1,107 @@
+"""Sign/verify micro-benchmark for the JWT algorithms the app supports.
+
+Times PyJWT directly with a freshly generated key per algorithm and a
+payload shaped like the app's access tokens, on one core, e.g.::
+
+    python bench/bench_jwt.py --iterations 5000 --algorithms RS256,ES256,EdDSA --output jwt.json
+
+The app's verified-token cache is bypassed on purpose: the numbers are the
+cost of a cache miss (a token's first request on a worker) and of minting a
+token at login. Run it on the hardware the API runs on before picking
+JWT_ALGORITHM.
+"""
+import argparse
+import datetime
+import os
+import secrets
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import harness  # noqa: E402
+
+sys.path.insert(0, harness.SRC_DIR)
+
+import jwt  # noqa: E402
+from utils.signing_keys import JWT_ALGORITHMS, generate_signing_key, key_id  # noqa: E402
+
+
+def sample_payload(i: int) -> dict:
+    return {
+        "sub": str(i),
+        "email": f"user{i}@bench.example.com",
+        "username": f"user{i}",
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+        "jti": secrets.token_urlsafe(16),
+    }
+
+
+def time_each(operation, items: list) -> tuple[list, list]:
+    latencies = []
+    results = []
+    for item in items:
+        start = time.perf_counter()
+        results.append(operation(item))
+        latencies.append(time.perf_counter() - start)
+    return latencies, results
+
+
+def bench_algorithm(algorithm: str, iterations: int, warmup: int, rsa_key_size: int) -> dict:
+    private_key = generate_signing_key(algorithm, rsa_key_size)
+    public_key = private_key.public_key()
+    headers = {"kid": key_id(public_key)}
+
+    def sign(payload):
+        return jwt.encode(payload, private_key, algorithm=algorithm, headers=headers)
+
+    def verify(token):
+        return jwt.decode(token, public_key, algorithms=[algorithm])
+
+    payloads = [sample_payload(i) for i in range(iterations + warmup)]
+    time_each(sign, payloads[:warmup])
+    start = time.perf_counter()
+    sign_latencies, tokens = time_each(sign, payloads[warmup:])
+    sign_wall = time.perf_counter() - start
+
+    time_each(verify, tokens[:warmup])
+    start = time.perf_counter()
+    verify_latencies, _ = time_each(verify, tokens)
+    verify_wall = time.perf_counter() - start
+
+    return {
+        "key": f"RSA-{rsa_key_size}" if algorithm == "RS256" else {"ES256": "P-256", "EdDSA": "Ed25519"}[algorithm],
+        "token_bytes": len(tokens[0]),
+        "sign": harness.summarize(sign_latencies, sign_wall),
+        "verify": harness.summarize(verify_latencies, verify_wall),
+    }
+
+
+def parse_algorithms(value: str) -> list:
+    algorithms = [name.strip() for name in value.split(",") if name.strip()]
+    for name in algorithms:
+        if name not in JWT_ALGORITHMS:
+            raise argparse.ArgumentTypeError(f"Unknown algorithm {name!r}; choose from {', '.join(JWT_ALGORITHMS)}")
+    return algorithms
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare JWT sign/verify throughput per algorithm.")
+    parser.add_argument("--iterations", type=int, default=2000, help="Tokens signed and verified per algorithm")
+    parser.add_argument("--warmup", type=int, default=100, help="Untimed operations before each measurement")
+    parser.add_argument("--algorithms", type=parse_algorithms, default=list(JWT_ALGORITHMS))
+    parser.add_argument("--rsa-key-size", type=int, default=2048)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    results = {}
+    for algorithm in args.algorithms:
+        results[algorithm] = bench_algorithm(algorithm, args.iterations, args.warmup, args.rsa_key_size)
+        print(f"{algorithm:>6}: sign {results[algorithm]['sign']['throughput_per_second']:>9.0f}/s, "
+              f"verify {results[algorithm]['verify']['throughput_per_second']:>9.0f}/s", file=sys.stderr)
+    harness.write_report({
+        "environment": harness.environment_info(),
+        "pyjwt": jwt.__version__,
+        "iterations": args.iterations,
+        "results": results,
+    }, args.output)
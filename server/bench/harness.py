@@ -0,0 +1,203 @@
+"""Shared setup for the benchmarks in this directory.
+
+`prepare_environment` must run before anything from `src/` is imported:
+`Config` reads the environment once, at import time. It points the app at
+a throwaway SQLite database, freshly generated JWT signing (of type
+JWT_ALGORITHM, RS256 by default) and Fernet keys and a private mail spool, so runs never touch a real database or SMTP server.
+Tuning knobs that aren't needed for isolation (CRYPTO_POOL_SIZE,
+DB_POOL_SIZE, ...) are left to the caller's environment.
+"""
+import asyncio
+import json
+import logging
+import os
+import platform
+import re
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(SERVER_DIR, "src")
+
+BENCH_PASSWORD = "Bench-Passw0rd!"
+
+
+def _write_jwt_keys(workdir: str, algorithm: str):
+    # Only imports cryptography, so it's safe before the environment is set
+    from utils.signing_keys import generate_signing_key, write_key_pair
+
+    private_path = os.path.join(workdir, "private_key.pem")
+    public_path = os.path.join(workdir, "public_key.pem")
+    write_key_pair(generate_signing_key(algorithm), private_path, public_path)
+    return private_path, public_path
+
+
+def prepare_environment(workdir: str):
+    """Isolate the app in `workdir` and make `src/` importable."""
+    from cryptography.fernet import Fernet
+
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, SRC_DIR)
+    algorithm = os.environ.get("JWT_ALGORITHM") or "RS256"
+    private_path, public_path = _write_jwt_keys(workdir, algorithm)
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "PRIVATE_KEY_PATH": private_path,
+        "PUBLIC_KEY_PATH": public_path,
+        "JWT_VERIFY_KEY_PATHS": "",
+        "JWT_ALGORITHM": algorithm,
+        "ENCRYPTION_KEY": Fernet.generate_key().decode(),
+        "SECRET_KEY": os.urandom(32).hex(),
+        "FRONTEND_URL": "http://localhost",
+        "MAIL_SPOOL_DIR": os.path.join(workdir, "mail_spool"),
+        "OTP_STORE_BACKEND": "memory",
+        # Every client is 127.0.0.1 and logs in over and over
+        "RATE_LIMIT_ENABLED": "false",
+    })
+    for name in ("ASYNC_DATABASE_URL", "PROMETHEUS_MULTIPROC_DIR"):
+        os.environ.pop(name, None)
+
+    # app.log is written to the working directory
+    os.chdir(workdir)
+
+
+def quiet_logging():
+    """Drop per-request INFO logging (app and httpx) so it doesn't skew timings.
+
+    Call after importing the app: utils.logger configures the root logger on import.
+    """
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("fastapi_project").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class MailStub:
+    """Stands in for `queue_email`: keeps the last message per recipient."""
+
+    OTP_PATTERN = re.compile(r"<strong>(\d+)</strong>")
+
+    def __init__(self):
+        self.last_message = {}
+
+    def __call__(self, to_email: str, subject: str, body: str, is_html: bool = False):
+        self.last_message[to_email] = body
+        return {"message": "Email queued successfully!"}
+
+    def otp_for(self, email: str) -> str:
+        return self.OTP_PATTERN.search(self.last_message[email]).group(1)
+
+
+def install_mail_stub() -> MailStub:
+    from routers import auth
+
+    stub = MailStub()
+    auth.queue_email = stub
+    return stub
+
+
+@asynccontextmanager
+async def running_app():
+    """The FastAPI app with its lifespan (pools, background tasks) started."""
+    from main import app
+
+    async with app.router.lifespan_context(app):
+        yield app
+
+
+def client_for(app):
+    import httpx
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver", timeout=None)
+
+
+async def register_and_login(client, mail: MailStub, name: str) -> int:
+    """Register `name` through the API, log in and complete the OTP step; returns the user id."""
+    email = f"{name}@bench.example.com"
+    response = await client.post("/auth/register", json={
+        "username": name,
+        "email": email,
+        "password": BENCH_PASSWORD,
+        "phone_number": name,
+    })
+    response.raise_for_status()
+    await login(client, mail, email)
+    response = await client.post("/auth/verify-token")
+    response.raise_for_status()
+    return int(response.json()["payload"]["sub"])
+
+
+async def login(client, mail: MailStub, email: str):
+    response = await client.post("/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    response = await client.post("/auth/verify-otp", json={"email": email, "otp": mail.otp_for(email)})
+    response.raise_for_status()
+
+
+async def run_concurrently(operation, iterations: int, concurrency: int) -> dict:
+    """Run `await operation(worker, i)` `iterations` times spread over `concurrency` workers.
+
+    Each worker only runs its own share, so per-worker state (a logged-in
+    client, a user's entries) can be indexed by `worker`.
+    """
+    latencies = []
+
+    async def worker(worker_index: int):
+        for i in range(worker_index, iterations, concurrency):
+            start = time.perf_counter()
+            await operation(worker_index, i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def summarize(latencies: list, wall_seconds: float) -> dict:
+    if not latencies:
+        return {"count": 0}
+    ordered = sorted(latencies)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))] * 1000
+
+    return {
+        "count": len(ordered),
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_per_second": round(len(ordered) / wall_seconds, 2) if wall_seconds else None,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(50), 3),
+        "p90_ms": round(percentile(90), 3),
+        "p99_ms": round(percentile(99), 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def environment_info() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=SERVER_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--", "src")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            name: os.environ.get(name)
+            for name in ("CRYPTO_POOL_SIZE", "CRYPTO_POOL_KIND", "DB_POOL_SIZE", "DB_MAX_OVERFLOW", "JWT_ALGORITHM")
+        },
+    }
+
+
+def write_report(report: dict, output: str | None):
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
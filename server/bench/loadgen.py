@@ -0,0 +1,223 @@
+"""Open-loop load generator for the HTTP API.
+
+Requests arrive as a Poisson process at --rate per second no matter how
+slowly the server answers (open loop), so overload shows up as growing
+latency instead of quietly lowering the offered load. Latency is measured
+from each request's scheduled arrival, which keeps client-side queueing
+(waiting for a connection, a late event loop) in the numbers::
+
+    python bench/loadgen.py --base-url http://localhost:8000 --users-file users.jsonl \\
+        --rate 200 --duration 60 --mix list=50,search=20,entry=15,reveal=10,login=5
+
+Users come from bench/seed.py's --users-file. Access tokens are minted
+locally with the app's signing key, so run this with the server's
+PRIVATE_KEY_PATH (and the rest of its environment). `login` only exercises
+/auth/login (bcrypt plus an OTP e-mail); it doesn't complete the OTP step.
+Start the server with RATE_LIMIT_ENABLED=false unless the limiter itself is
+under test: all load comes from one IP, so login/reveal would mostly get 429.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+from collections import Counter, defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import harness  # noqa: E402
+
+SEARCH_TERMS = ["google", "github", "amazon", "bank", "mail", "netflix", "slack", "paypal", "gitlab", "spotify"]
+
+
+class VirtualUser:
+    def __init__(self, record: dict):
+        self.id = record["id"]
+        self.email = record["email"]
+        self.entry_ids = record.get("entry_ids") or []
+        self._cookie = None
+
+    @property
+    def headers(self) -> dict:
+        if self._cookie is None:
+            from utils.jwt import create_access_token
+
+            token = create_access_token({"sub": str(self.id), "email": self.email, "username": self.email.split("@")[0]})
+            self._cookie = f"access_token={token}"
+        return {"Cookie": self._cookie}
+
+
+def op_list(client, user, rng, args):
+    return client.get("/api/v1/passwords-list", params={"limit": 50}, headers=user.headers)
+
+
+def op_list_all(client, user, rng, args):
+    return client.get("/api/v1/passwords-list", headers=user.headers)
+
+
+def op_search(client, user, rng, args):
+    return client.get("/api/v1/search", params={"q": rng.choice(SEARCH_TERMS)}, headers=user.headers)
+
+
+def op_entry(client, user, rng, args):
+    return client.get(f"/api/v1/get-password-entry/{rng.choice(user.entry_ids)}", headers=user.headers)
+
+
+def op_reveal(client, user, rng, args):
+    return client.post("/api/v1/get-password", headers=user.headers, json={
+        "serviceID": str(rng.choice(user.entry_ids)),
+        "email": user.email,
+        "password": args.password,
+    })
+
+
+def op_create(client, user, rng, args):
+    n = rng.getrandbits(32)
+    return client.post("/api/v1/create-password", headers=user.headers, json={
+        "title": f"Load {n}",
+        "url": f"https://load{n}.example.com",
+        "username": f"load{n}",
+        "password": f"Load-Passw0rd!{n}",
+    })
+
+
+def op_login(client, user, rng, args):
+    return client.post("/auth/login", json={"email": user.email, "password": args.password})
+
+
+OPERATIONS = {
+    "list": op_list,
+    "list_all": op_list_all,
+    "search": op_search,
+    "entry": op_entry,
+    "reveal": op_reveal,
+    "create": op_create,
+    "login": op_login,
+}
+NEEDS_ENTRIES = {"entry", "reveal"}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}; choose from {', '.join(OPERATIONS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_users(path: str, limit: int | None) -> list:
+    users = []
+    with open(path) as f:
+        for line in f:
+            users.append(VirtualUser(json.loads(line)))
+            if limit and len(users) >= limit:
+                break
+    if not users:
+        raise SystemExit(f"No users in {path}")
+    return users
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    users = load_users(args.users_file, args.max_users)
+    users_with_entries = [user for user in users if user.entry_ids]
+    names = list(args.mix)
+    weights = [args.mix[name] for name in names]
+
+    latencies = defaultdict(list)  # From scheduled arrival, queueing included
+    service_times = defaultdict(list)  # From the moment the request was sent
+    errors = defaultdict(Counter)
+    in_flight = set()
+    dropped = 0
+    loop = asyncio.get_running_loop()
+
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+
+        async def fire(name: str, scheduled: float):
+            candidates = users_with_entries if name in NEEDS_ENTRIES else users
+            user = rng.choice(candidates)
+            sent = loop.time()
+            try:
+                response = await OPERATIONS[name](client, user, rng, args)
+                if response.status_code >= 400:
+                    errors[name][str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                errors[name][type(e).__name__] += 1
+            finished = loop.time()
+            latencies[name].append(finished - scheduled)
+            service_times[name].append(finished - sent)
+
+        if NEEDS_ENTRIES & set(names) and not users_with_entries:
+            raise SystemExit("The mix reads entries, but no user in the users file has any.")
+
+        started = loop.time()
+        next_arrival = started
+        while next_arrival - started < args.duration:
+            delay = next_arrival - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= args.max_in_flight:
+                dropped += 1
+            else:
+                task = asyncio.create_task(fire(rng.choices(names, weights)[0], next_arrival))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            next_arrival += rng.expovariate(args.rate)
+        await asyncio.gather(*in_flight)
+        elapsed = loop.time() - started
+
+    results = {}
+    for name in names:
+        summary = harness.summarize(latencies[name], elapsed)
+        service = harness.summarize(service_times[name], elapsed)
+        summary["service_p50_ms"] = service.get("p50_ms")
+        summary["service_p99_ms"] = service.get("p99_ms")
+        summary["errors"] = dict(errors[name])
+        results[name] = summary
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "benchmark": "loadgen",
+        "environment": harness.environment_info(),
+        "parameters": {
+            "base_url": args.base_url,
+            "rate": args.rate,
+            "duration": args.duration,
+            "mix": args.mix,
+            "connections": args.connections,
+            "max_in_flight": args.max_in_flight,
+            "users": len(users),
+        },
+        "offered_rate": args.rate,
+        "achieved_rate": round(len(all_latencies) / elapsed, 2),
+        "dropped": dropped,
+        "overall": harness.summarize(all_latencies, elapsed),
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load generator for the HTTP API.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users-file", required=True, help="JSON lines written by bench/seed.py")
+    parser.add_argument("--max-users", type=int, help="Only use the first N users from the file")
+    parser.add_argument("--password", default="Seed-Passw0rd!", help="Master password the users were seeded with")
+    parser.add_argument("--rate", type=float, default=50, help="Mean arrivals per second")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to generate load for")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("list=50,search=20,entry=15,reveal=10,login=5"),
+                        help="Comma-separated operation=weight pairs")
+    parser.add_argument("--connections", type=int, default=100, help="HTTP connection pool size")
+    parser.add_argument("--max-in-flight", type=int, default=10000,
+                        help="Arrivals beyond this many outstanding requests are dropped and counted")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    harness.write_report(asyncio.run(run(args)), args.output)
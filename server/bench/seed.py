@@ -0,0 +1,160 @@
+"""Bulk-generate users and vault entries for scale and load testing.
+
+Writes straight to the database configured for the app (DATABASE_URL,
+ENCRYPTION_KEY, ... from the environment or .env), using the same Fernet
+format as `encrypt_password`, so the API can read everything it seeds::
+
+    python bench/seed.py --users 100000 --entries-min 5 --entries-max 50000 --users-file users.jsonl
+
+Every user gets the same master password (--password). Its bcrypt hash is
+computed once and reused, which is what makes seeding fast; pass
+--unique-hashes to hash per user instead. The users file lists each user's
+id, email and a sample of entry ids for bench/loadgen.py.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from sqlalchemy import insert, select  # noqa: E402
+from database import SessionLocal, engine  # noqa: E402
+from models import models  # noqa: E402
+from models.models import PasswordEntry, User  # noqa: E402
+from routers.encryption import insert_batch  # noqa: E402
+from utils.auth import encrypt_password, hash_password  # noqa: E402
+
+SERVICES = [
+    "google.com", "github.com", "amazon.com", "netflix.com", "facebook.com", "twitter.com", "linkedin.com",
+    "microsoft.com", "apple.com", "dropbox.com", "slack.com", "paypal.com", "ebay.com", "spotify.com",
+    "reddit.com", "bank.co.uk", "mail.yahoo.com", "atlassian.net", "gitlab.com", "stackoverflow.com",
+]
+ENTRY_IDS_SAMPLE = 20
+
+
+def entry_count(rng: random.Random, args) -> int:
+    if args.distribution == "uniform":
+        return rng.randint(args.entries_min, args.entries_max)
+    # Heavy-tailed: most vaults are small, a few are huge
+    return min(int(args.entries_min * rng.paretovariate(args.pareto_alpha)), args.entries_max)
+
+
+def make_entry(rng: random.Random, user_id: int, index: int, ciphertexts: list | None, now: datetime.datetime) -> dict:
+    service = rng.choice(SERVICES)
+    created_at = now - datetime.timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+    if ciphertexts is None:
+        encrypted_password = encrypt_password(f"Seed-{rng.getrandbits(64):x}!Aa1")
+    else:
+        encrypted_password = rng.choice(ciphertexts)
+    return {
+        "user_id": user_id,
+        "title": f"{service.split('.')[0].title()} {index}",
+        "url": f"https://{service}/login",
+        "username": f"user{user_id}.{index}@example.com",
+        "encrypted_password": encrypted_password,
+        "notes": f"Seeded entry {index}" if rng.random() < 0.2 else None,
+        "is_Favrout": rng.random() < 0.05,
+        "created_at": created_at,
+        "updated_at": created_at + datetime.timedelta(seconds=rng.randint(0, int((now - created_at).total_seconds()))),
+    }
+
+
+def insert_users(db, rows: list) -> list:
+    """Insert a batch of users and return their ids in row order."""
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return list(db.scalars(insert(User).returning(User.id, sort_by_parameter_order=True), rows))
+    db.execute(insert(User), rows)
+    ids = dict(db.execute(select(User.email, User.id).where(User.email.in_([row["email"] for row in rows]))).all())
+    return [ids[row["email"]] for row in rows]
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    models.Base.metadata.create_all(bind=engine)
+    shared_hash = None if args.unique_hashes else hash_password(args.password)
+    # Optionally reuse a fixed set of real ciphertexts: Fernet is cheap, but not at 10^9 rows
+    ciphertexts = None
+    if args.cipher_pool:
+        ciphertexts = [encrypt_password(f"Seed-{rng.getrandbits(64):x}!Aa1") for _ in range(args.cipher_pool)]
+
+    users_file = open(args.users_file, "w") if args.users_file else None
+    now = datetime.datetime.utcnow()
+    started = time.perf_counter()
+    total_entries = 0
+
+    try:
+        for batch_start in range(0, args.users, args.user_batch):
+            batch = range(batch_start, min(batch_start + args.user_batch, args.users))
+            with SessionLocal() as db:
+                user_ids = insert_users(db, [
+                    {
+                        "username": f"{args.prefix}{n}",
+                        "email": f"{args.prefix}{n}@{args.domain}",
+                        "hashed_password": shared_hash or hash_password(args.password),
+                        "phone_number": f"{args.prefix}-{n}",
+                        "is_blocked": False,
+                        "is_verified": True,
+                    }
+                    for n in batch
+                ])
+
+                for n, user_id in zip(batch, user_ids):
+                    count = entry_count(rng, args)
+                    sample = []
+                    for start in range(0, count, args.entry_batch):
+                        rows = [make_entry(rng, user_id, i, ciphertexts, now) for i in range(start, min(start + args.entry_batch, count))]
+                        ids = insert_batch(db, rows)
+                        if ids and len(sample) < ENTRY_IDS_SAMPLE:
+                            sample.extend(ids[:ENTRY_IDS_SAMPLE - len(sample)])
+                    if count and not sample:
+                        sample = list(db.scalars(
+                            select(PasswordEntry.id).where(PasswordEntry.user_id == user_id).limit(ENTRY_IDS_SAMPLE)
+                        ))
+                    total_entries += count
+                    if users_file:
+                        users_file.write(json.dumps({
+                            "id": user_id,
+                            "email": f"{args.prefix}{n}@{args.domain}",
+                            "entries": count,
+                            "entry_ids": sample,
+                        }) + "\n")
+                db.commit()
+
+            done = batch.stop
+            elapsed = time.perf_counter() - started
+            eta = elapsed / done * (args.users - done)
+            print(f"{done}/{args.users} users, {total_entries} entries, "
+                  f"{total_entries / elapsed:.0f} entries/s, ETA {eta:.0f}s", file=sys.stderr)
+    finally:
+        if users_file:
+            users_file.close()
+
+    print(json.dumps({
+        "users": args.users,
+        "entries": total_entries,
+        "seconds": round(time.perf_counter() - started, 2),
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-generate users and vault entries.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--entries-min", type=int, default=10)
+    parser.add_argument("--entries-max", type=int, default=50000)
+    parser.add_argument("--distribution", choices=["pareto", "uniform"], default="pareto")
+    parser.add_argument("--pareto-alpha", type=float, default=1.2, help="Lower means a heavier tail of huge vaults")
+    parser.add_argument("--password", default="Seed-Passw0rd!", help="Master password shared by every seeded user")
+    parser.add_argument("--unique-hashes", action="store_true", help="bcrypt each user's password separately (slow)")
+    parser.add_argument("--cipher-pool", type=int, default=0,
+                        help="Reuse this many pre-encrypted passwords instead of encrypting every entry")
+    parser.add_argument("--prefix", default="seed", help="Username/email prefix, so runs can be told apart")
+    parser.add_argument("--domain", default="seed.example.com")
+    parser.add_argument("--user-batch", type=int, default=500, help="Users per transaction")
+    parser.add_argument("--entry-batch", type=int, default=5000, help="Entries per insert")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed, for reproducible data sets")
+    parser.add_argument("--users-file", help="Write one JSON line per user for bench/loadgen.py")
+    seed(parser.parse_args())
@@ -11,16 +11,107 @@ class Config:
 
     # Database settings
     DATABASE_URL = os.getenv("DATABASE_URL")
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")  # Defaults to DATABASE_URL with its async driver (aiosqlite, asyncpg, aiomysql)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # Connections kept open per worker process
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))  # Extra connections allowed under bursts
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # Reconnect connections older than this (seconds)
+    DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "True").lower() == "true"  # Test connections on checkout
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", 500))  # Compiled SQL statements cached per engine
+    SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # WAL lets readers run alongside a writer
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # NORMAL is safe with WAL and much faster than FULL
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))  # Wait on a locked database instead of failing
 
     # JWT and encryption settings
     PRIVATE_KEY_PATH = os.getenv("PRIVATE_KEY_PATH")
     PUBLIC_KEY_PATH = os.getenv("PUBLIC_KEY_PATH")
     ACCESS_TOKEN_EXPIRE_HOURS = int(os.getenv("ACCESS_TOKEN_EXPIRE_HOURS", 24))  # Default to 24 hours
     ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY")
-    SECRET_KEY = os.getenv("SECRET_KEY")
+    ENCRYPTION_KEYS = os.getenv("ENCRYPTION_KEYS")  # Comma-separated Fernet keys, newest first; the first encrypts, all decrypt
+    SECRET_KEY = os.getenv("SECRET_KEY")  # Required, at least MIN_SECRET_KEY_LENGTH characters; keys reset-token digests and step-up grants
+    JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")  # RS256, ES256 or EdDSA; detected from the private key when unset
+    JWT_VERIFY_KEY_PATHS = os.getenv("JWT_VERIFY_KEY_PATHS")  # Extra comma-separated public keys accepted during rotation
+    JWT_KEY_RELOAD_INTERVAL_SECONDS = float(os.getenv("JWT_KEY_RELOAD_INTERVAL_SECONDS", 30))  # How often key files are checked for changes
+    STEP_UP_GRANT_MINUTES = float(os.getenv("STEP_UP_GRANT_MINUTES", 5))  # How long one master-password check unlocks reveal/delete
+    REVOCATION_FILTER_CAPACITY = int(os.getenv("REVOCATION_FILTER_CAPACITY", 100000))  # Revoked tokens the Bloom filter is sized for
+    REVOCATION_FILTER_ERROR_RATE = float(os.getenv("REVOCATION_FILTER_ERROR_RATE", 0.001))  # Share of live tokens that cost a DB lookup
+    REVOCATION_REFRESH_INTERVAL_SECONDS = float(os.getenv("REVOCATION_REFRESH_INTERVAL_SECONDS", 5))  # How soon other workers see a logout
+    REVOCATION_SWEEP_INTERVAL_SECONDS = float(os.getenv("REVOCATION_SWEEP_INTERVAL_SECONDS", 3600))  # How often expired revocations are pruned
+    TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))  # Max verified token payloads kept in memory
+    TOKEN_CACHE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_TTL_SECONDS", 300))  # Upper bound on how long a verified payload is reused
+
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))  # User auth records kept in memory (0 disables the cache)
+    USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", 30))  # Upper bound on how stale another worker's write can look
+
+    # Crypto worker pool settings
+    CRYPTO_POOL_SIZE = int(os.getenv("CRYPTO_POOL_SIZE", 0))  # Default to the CPU count
+    CRYPTO_POOL_KIND = os.getenv("CRYPTO_POOL_KIND", "thread")  # "thread" or "process"
+    CRYPTO_POOL_MAX_QUEUE = int(os.getenv("CRYPTO_POOL_MAX_QUEUE", 64))  # Waiting calls allowed before returning 503
+
+    # Password hashing settings
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 0))  # 0 = calibrate at startup; pin it (see jobs/calibrate_bcrypt.py) so hashes at any other cost are re-hashed on login
+    BCRYPT_TARGET_MS = float(os.getenv("BCRYPT_TARGET_MS", 250))  # Hash time the calibration aims for
+    BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", 10))  # Calibration never goes below this cost; unpinned, hashes below it are upgraded on login
+
+    # OTP settings
+    OTP_STORE_BACKEND = os.getenv("OTP_STORE_BACKEND", "memory")  # "memory" (single worker) or "database" (shared)
+    OTP_SWEEP_INTERVAL_SECONDS = float(os.getenv("OTP_SWEEP_INTERVAL_SECONDS", 30))  # How often expired OTPs are deleted
+
+    # Password reset settings
+    RESET_TOKEN_TTL_MINUTES = float(os.getenv("RESET_TOKEN_TTL_MINUTES", 15))  # How long an emailed reset link works
+    RESET_TOKEN_SWEEP_INTERVAL_SECONDS = float(os.getenv("RESET_TOKEN_SWEEP_INTERVAL_SECONDS", 300))  # How often expired tokens are deleted
+
+    # Rate limiting for the bcrypt-backed endpoints (login, step-up, get-password(s), delete-password)
+    RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+    RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" (per worker) or "database" (shared)
+    RATE_LIMIT_IP_BURST = float(os.getenv("RATE_LIMIT_IP_BURST", 20))  # Attempts one client IP may make back to back
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", 30))  # Sustained attempts per IP
+    RATE_LIMIT_ACCOUNT_BURST = float(os.getenv("RATE_LIMIT_ACCOUNT_BURST", 5))  # Attempts against one email / user id back to back
+    RATE_LIMIT_ACCOUNT_PER_MINUTE = float(os.getenv("RATE_LIMIT_ACCOUNT_PER_MINUTE", 10))  # Sustained attempts per account
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))  # Buckets kept in memory; least recently used go first
+    RATE_LIMIT_SWEEP_INTERVAL_SECONDS = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL_SECONDS", 60))  # How often refilled buckets are dropped
+    RATE_LIMIT_TRUST_FORWARDED_FOR = os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "False").lower() == "true"  # Behind a proxy: key on the address it appends to X-Forwarded-For
+
+    # Vault list settings
+    PASSWORD_LIST_MAX_LIMIT = int(os.getenv("PASSWORD_LIST_MAX_LIMIT", 500))  # Largest page /passwords-list will return
+    BATCH_REVEAL_MAX_IDS = int(os.getenv("BATCH_REVEAL_MAX_IDS", 100))  # Most entries /get-passwords decrypts per call
+    SEARCH_INDEX_MAX_USERS = int(os.getenv("SEARCH_INDEX_MAX_USERS", 1000))  # Per-user search indexes kept in memory (LRU)
+
+    # Export / import settings
+    EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 64 * 1024))  # Plaintext bytes per encrypted frame
+    EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", 500))  # Rows fetched per round trip while streaming
+    IMPORT_READ_SIZE = int(os.getenv("IMPORT_READ_SIZE", 64 * 1024))  # Upload bytes read per step
+    IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))  # Rows per bulk insert, each committed on its own
+    IMPORT_STALE_SECONDS = float(os.getenv("IMPORT_STALE_SECONDS", 600))  # A running import idle this long counts as failed (its process died)
 
     # SMTP settings for email
     SMTP_SERVER = os.getenv("SMTP_SERVER")
     SMTP_PORT = int(os.getenv("SMTP_PORT", 587))  # Default to 587
     SMTP_USERNAME = os.getenv("SMTP_USERNAME")
-    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
\ No newline at end of file
+    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "True").lower() == "true"  # Disable for local test sinks
+    SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", 30))
+    SMTP_IDLE_TIMEOUT_SECONDS = float(os.getenv("SMTP_IDLE_TIMEOUT_SECONDS", 60))  # Pooled connections idle longer are reopened
+    MAIL_FROM = os.getenv("MAIL_FROM") or SMTP_USERNAME
+
+    # Background mail dispatcher settings
+    MAIL_SPOOL_DIR = os.getenv("MAIL_SPOOL_DIR", "mail_spool")  # Queued mail survives restarts here
+    MAIL_POOL_SIZE = int(os.getenv("MAIL_POOL_SIZE", 2))  # SMTP connections (and sender threads)
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))  # Messages sent per connection checkout
+    MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", 5))
+    MAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("MAIL_RETRY_BACKOFF_SECONDS", 2))  # Doubles after each failed attempt
+    MAIL_RETRY_BACKOFF_MAX_SECONDS = float(os.getenv("MAIL_RETRY_BACKOFF_MAX_SECONDS", 300))
+    MAIL_DRAIN_TIMEOUT_SECONDS = float(os.getenv("MAIL_DRAIN_TIMEOUT_SECONDS", 10))  # Time allowed to flush the queue on shutdown
+    MAIL_FAILED_RETENTION_HOURS = float(os.getenv("MAIL_FAILED_RETENTION_HOURS", 24))  # Undeliverable mail is kept this long for inspection
+    MAIL_PURGE_INTERVAL_SECONDS = float(os.getenv("MAIL_PURGE_INTERVAL_SECONDS", 3600))  # How often expired failed mail is deleted
+
+
+MIN_SECRET_KEY_LENGTH = 32
+
+
+def check_secret_key():
+    """Fail at startup, not on the first password reset or step-up, if SECRET_KEY is missing or short."""
+    if not Config.SECRET_KEY:
+        raise ValueError("SECRET_KEY is not set; generate one with: python -c \"import secrets; print(secrets.token_hex(32))\"")
+    if len(Config.SECRET_KEY) < MIN_SECRET_KEY_LENGTH:
+        raise ValueError(f"SECRET_KEY must be at least {MIN_SECRET_KEY_LENGTH} characters long")
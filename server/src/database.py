@@ -1,17 +1,184 @@
-from sqlalchemy import create_engine
+import importlib.util
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
 from config import Config
+from utils.metrics import DB_POOL_CAPACITY, DB_POOL_CHECKOUT_WAIT, DB_POOL_IN_USE, DB_POOL_TIMEOUTS
+
+
+class PoolMetrics:
+    """Counters for connection checkouts, fed by InstrumentedQueuePool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+
+class _CheckoutTimingMixin:
+    """Records how long each checkout waited for a connection in `metrics`."""
+
+    metrics: PoolMetrics
+    engine_label: str
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            waited = time.perf_counter() - start
+            self.metrics.record(waited, timed_out=True)
+            DB_POOL_TIMEOUTS.labels(self.engine_label).inc()
+            raise
+        waited = time.perf_counter() - start
+        self.metrics.record(waited)
+        DB_POOL_CHECKOUT_WAIT.labels(self.engine_label).observe(waited)
+        return connection
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    metrics = PoolMetrics()
+    engine_label = "sync"
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+    engine_label = "async"
+
+
+# Async drivers used when ASYNC_DATABASE_URL isn't set explicitly
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def async_database_url(database_url: str):
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend}; set ASYNC_DATABASE_URL.")
+    drivername = ASYNC_DRIVERS[backend]
+    driver = drivername.partition("+")[2]
+    if importlib.util.find_spec(driver) is None:
+        raise ValueError(
+            f"The async driver for {backend} ({driver}) is not installed; "
+            f"install it or set ASYNC_DATABASE_URL to a {backend}+<driver>:// URL."
+        )
+    return url.set(drivername=drivername)
+
+
+def engine_options(database_url, is_async: bool = False) -> dict:
+    """create_engine keyword arguments for the configured engine profile."""
+    url = make_url(database_url)
+    options = {
+        "pool_pre_ping": Config.DB_POOL_PRE_PING,
+        "query_cache_size": Config.DB_STATEMENT_CACHE_SIZE,
+    }
+
+    if url.get_backend_name() == "sqlite":
+        # Connections are shared across FastAPI's threadpool, not tied to one thread
+        options["connect_args"] = {"check_same_thread": False}
+        if url.database in (None, "", ":memory:"):
+            # Every connection to :memory: is a new empty database, so share a single one
+            options["poolclass"] = StaticPool
+            return options
+    elif url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {"prepared_statement_cache_size": Config.DB_STATEMENT_CACHE_SIZE}
+
+    options.update(
+        poolclass=InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool,
+        pool_size=Config.DB_POOL_SIZE,
+        max_overflow=Config.DB_MAX_OVERFLOW,
+        pool_timeout=Config.DB_POOL_TIMEOUT,
+        pool_recycle=Config.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def track_pool_usage(engine, label: str):
+    """Keep the Prometheus in-use and capacity gauges current for `engine`'s pool."""
+    in_use = DB_POOL_IN_USE.labels(label)
+    event.listen(engine, "checkout", lambda *args: in_use.inc())
+    event.listen(engine, "checkin", lambda *args: in_use.dec())
+    if isinstance(engine.pool, QueuePool):
+        DB_POOL_CAPACITY.labels(label).set(engine.pool.size() + Config.DB_MAX_OVERFLOW)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={Config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={int(Config.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
 
 
 # SQLAlchemy database URL format
 DATABASE_URL = Config.DATABASE_URL
 
 # Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
+track_pool_usage(engine, "sync")
+
+# Async engine for the request handlers, so waiting on the database doesn't hold a thread
+ASYNC_DATABASE_URL = Config.ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+if async_engine.dialect.name == "sqlite":
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+track_pool_usage(async_engine.sync_engine, "async")
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, _CheckoutTimingMixin):
+        stats.update(pool.metrics.snapshot())
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
+
+
+def pool_stats() -> dict:
+    """Pool occupancy plus checkout wait statistics, for sizing the pools."""
+    return {"sync": _pool_stats(engine.pool), "async": _pool_stats(async_engine.pool)}
+
 
 # Create a SessionLocal class for database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay readable after commit; lazy refreshes aren't possible on an AsyncSession
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Base class for models
 Base = declarative_base()
@@ -23,3 +190,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
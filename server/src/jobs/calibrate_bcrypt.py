@@ -0,0 +1,48 @@
+"""Measure bcrypt on this machine and suggest BCRYPT_ROUNDS for a latency budget.
+
+Run it on the hardware the API runs on, then pin the result so every worker
+and host hashes at the same cost::
+
+    python jobs/calibrate_bcrypt.py --target-ms 250
+
+Without a pinned BCRYPT_ROUNDS each worker calibrates at startup, workers
+may land on different costs, and logins only upgrade hashes made below
+BCRYPT_MIN_ROUNDS. Pinning makes BCRYPT_ROUNDS the one cost existing
+hashes are moved to, from below or above.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlib.hash import bcrypt  # noqa: E402
+from config import Config  # noqa: E402
+from utils.auth import calibrate_bcrypt_rounds  # noqa: E402
+
+
+def time_rounds(rounds: int, samples: int) -> float:
+    handler = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        handler.hash("calibration")
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suggest BCRYPT_ROUNDS for a target hash time.")
+    parser.add_argument("--target-ms", type=float, default=Config.BCRYPT_TARGET_MS)
+    parser.add_argument("--min-rounds", type=int, default=Config.BCRYPT_MIN_ROUNDS)
+    parser.add_argument("--samples", type=int, default=3, help="Hashes timed per cost in the table")
+    args = parser.parse_args()
+
+    rounds = calibrate_bcrypt_rounds(args.target_ms, args.min_rounds)
+    table = {r: round(time_rounds(r, args.samples), 1) for r in range(max(rounds - 2, 4), rounds + 2)}
+    for r, ms in table.items():
+        print(f"{r:>2} rounds: {ms:8.1f} ms{'  <- BCRYPT_ROUNDS' if r == rounds else ''}", file=sys.stderr)
+    print(json.dumps({"target_ms": args.target_ms, "bcrypt_rounds": rounds, "median_ms": table}))
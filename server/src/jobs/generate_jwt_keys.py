@@ -0,0 +1,46 @@
+"""Generate a JWT signing key pair for RS256, ES256 or EdDSA.
+
+Run it from `src/`::
+
+    python jobs/generate_jwt_keys.py --algorithm EdDSA --private-key key/ed25519_private.pem --public-key key/ed25519_public.pem
+
+To switch algorithms without logging everyone out, point PRIVATE_KEY_PATH
+(and PUBLIC_KEY_PATH) at the new pair, set JWT_ALGORITHM to match, and keep
+the old public key in JWT_VERIFY_KEY_PATHS until the last token it signed
+has expired (ACCESS_TOKEN_EXPIRE_HOURS). Tokens carry the kid of their key,
+so old and new tokens verify side by side.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.signing_keys import JWT_ALGORITHMS, generate_signing_key, key_id, write_key_pair  # noqa: E402
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a JWT signing key pair.")
+    parser.add_argument("--algorithm", choices=JWT_ALGORITHMS, default="EdDSA")
+    parser.add_argument("--private-key", required=True, help="Where to write the private key (PEM, PKCS#8)")
+    parser.add_argument("--public-key", required=True, help="Where to write the public key (PEM)")
+    parser.add_argument("--rsa-key-size", type=int, default=2048, help="Modulus size for RS256")
+    parser.add_argument("--force", action="store_true", help="Overwrite existing files")
+    args = parser.parse_args()
+
+    for path in (args.private_key, args.public_key):
+        if os.path.exists(path) and not args.force:
+            parser.error(f"{path} exists; pass --force to overwrite it")
+
+    private_key = generate_signing_key(args.algorithm, args.rsa_key_size)
+    # Make the private key file owner-only before anything is written to it
+    os.close(os.open(args.private_key, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+    os.chmod(args.private_key, 0o600)  # An existing file keeps its old mode otherwise
+    write_key_pair(private_key, args.private_key, args.public_key)
+    print(json.dumps({
+        "algorithm": args.algorithm,
+        "kid": key_id(private_key.public_key()),
+        "private_key": args.private_key,
+        "public_key": args.public_key,
+    }))
@@ -0,0 +1,49 @@
+"""Give SQLite entry timestamps written by the old `func.now()` default a `.000000` fraction.
+
+Those values sort before the same second as SQLAlchemy binds it, so a
+keyset cursor on `updated_at` would serve same-second rows again. New rows
+get their timestamps from Python and always carry the fraction, so this
+only has to run once per database, after upgrading. Run it from `src/`
+with the app's environment (DATABASE_URL)::
+
+    python jobs/normalize_timestamps.py --batch-size 5000
+
+`password_entries` is walked in primary-key order, one batch per
+transaction, so writers are only held up for one batch at a time. It is
+safe to rerun; rows that already have a fraction are left alone. Other
+databases store real timestamps and need nothing.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import func, inspect, select, text  # noqa: E402
+from database import engine  # noqa: E402
+from models.models import PasswordEntry  # noqa: E402
+
+
+def normalize_entry_timestamps(engine, batch_size: int = 5000) -> int:
+    """Append `.000000` to second-precision timestamps on SQLite; returns the values changed."""
+    if engine.dialect.name != "sqlite" or not inspect(engine).has_table(PasswordEntry.__tablename__):
+        return 0
+    with engine.connect() as connection:
+        last_id = connection.scalar(select(func.max(PasswordEntry.id))) or 0
+    changed = 0
+    for start in range(0, last_id, batch_size):
+        with engine.begin() as connection:
+            for column in ("created_at", "updated_at"):
+                changed += connection.execute(text(
+                    f"UPDATE password_entries SET {column} = {column} || '.000000' "
+                    f"WHERE id > :start AND id <= :end AND length({column}) = 19"
+                ), {"start": start, "end": start + batch_size}).rowcount
+    return changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add the missing fraction to legacy SQLite entry timestamps.")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Entry ids per transaction")
+    args = parser.parse_args()
+    print(json.dumps({"dialect": engine.dialect.name, "changed": normalize_entry_timestamps(engine, args.batch_size)}))
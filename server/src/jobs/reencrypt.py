@@ -0,0 +1,186 @@
+"""Re-encrypt every stored password under the current encryption key.
+
+Reads re-encrypt rows lazily (see `reencrypt_stale_entries`); this job
+finishes a rotation on a deadline so the old key can be retired. Run it
+from `src/` with the app's environment (DATABASE_URL, ENCRYPTION_KEYS, ...)::
+
+    python jobs/reencrypt.py --checkpoint reencrypt.json --rate 2000 --workers 4
+
+`password_entries` is walked in primary-key order, one batch per
+transaction. After each batch the last id is written to the checkpoint
+file, so an interrupted run picks up where it stopped when started again
+with the same file. Each UPDATE only applies if the ciphertext is still the
+one that was read, so concurrent edits win, and `updated_at` is left alone.
+Rows that can't be decrypted with any key in the ring are counted and
+skipped.
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cryptography.fernet import InvalidToken  # noqa: E402
+from sqlalchemy import bindparam, func, select, update  # noqa: E402
+from database import SessionLocal  # noqa: E402
+from models.models import PasswordEntry  # noqa: E402
+from utils.encryption_keys import encryption_keys  # noqa: E402
+from utils.logger import logger  # noqa: E402
+
+entries = PasswordEntry.__table__
+
+REENCRYPT = (
+    update(entries)
+    .where(entries.c.id == bindparam("entry_id"), entries.c.encrypted_password == bindparam("old"))
+    .values(encrypted_password=bindparam("new"), updated_at=entries.c.updated_at)
+)
+
+
+def rotate_chunk(ciphertexts: list) -> list:
+    """Re-encrypt each ciphertext under the current key; None where it can't be decrypted.
+
+    Runs in the worker pool, so it must stay a top-level function.
+    """
+    rotated = []
+    for stored in ciphertexts:
+        try:
+            rotated.append(encryption_keys.rotate(stored))
+        except InvalidToken:
+            rotated.append(None)
+    return rotated
+
+
+def ignore_interrupts():
+    """Worker initializer: Ctrl-C is handled by the main process, which saves the checkpoint."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def load_checkpoint(path: str | None) -> dict:
+    state = {"key_id": encryption_keys.current_id, "last_id": 0, "scanned": 0, "rotated": 0, "conflicts": 0, "failed": 0}
+    if not path or not os.path.exists(path):
+        return state
+    with open(path) as f:
+        saved = json.load(f)
+    if saved.get("key_id") != encryption_keys.current_id:
+        # The current key changed since the checkpoint: rows before it may be on the wrong key now
+        logger.warning(f"Checkpoint {path} was written for key {saved.get('key_id')}, starting over")
+        return state
+    state.update(saved)
+    return state
+
+
+def save_checkpoint(path: str | None, state: dict):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)  # Atomic, so a crash never leaves a half-written checkpoint
+
+
+def chunked(items: list, count: int) -> list:
+    size = -(-len(items) // count)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def reencrypt_batch(db, executor, workers: int, rows: list) -> dict:
+    stale = [row for row in rows if encryption_keys.needs_rotation(row.encrypted_password)]
+    counts = {"rotated": 0, "conflicts": 0, "failed": 0}
+    if not stale:
+        return counts
+
+    chunks = chunked([row.encrypted_password for row in stale], workers)
+    rotated = [new for chunk in executor.map(rotate_chunk, chunks) for new in chunk]
+
+    params = []
+    for row, new in zip(stale, rotated):
+        if new is None:
+            counts["failed"] += 1
+            logger.warning(f"Password entry {row.id} could not be decrypted with any configured key")
+        else:
+            params.append({"entry_id": row.id, "old": row.encrypted_password, "new": new})
+    if params:
+        updated = db.execute(REENCRYPT, params).rowcount
+        if updated is None or updated < 0:
+            updated = len(params)  # Driver doesn't report executemany row counts
+        counts["rotated"] += updated
+        counts["conflicts"] += len(params) - updated
+    db.commit()
+    return counts
+
+
+def format_eta(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m{seconds:02d}s" if hours else f"{minutes}m{seconds:02d}s"
+
+
+def run(args) -> dict:
+    state = load_checkpoint(args.checkpoint)
+    if args.pool == "process":
+        pool = ProcessPoolExecutor(max_workers=args.workers, initializer=ignore_interrupts)
+    else:
+        pool = ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="reencrypt")
+
+    with SessionLocal() as db:
+        remaining = db.scalar(select(func.count()).select_from(entries).where(entries.c.id > state["last_id"]))
+        logger.info(f"Re-encrypting onto key {encryption_keys.current_id}: "
+                    f"{remaining} rows after id {state['last_id']}, {args.workers} {args.pool} workers")
+
+        started = time.monotonic()
+        scanned = 0
+        with pool as executor:
+            while True:
+                rows = db.execute(
+                    select(entries.c.id, entries.c.encrypted_password)
+                    .where(entries.c.id > state["last_id"])
+                    .order_by(entries.c.id)
+                    .limit(args.batch_size)
+                ).all()
+                if not rows:
+                    break
+
+                counts = reencrypt_batch(db, executor, args.workers, rows)
+                for name, value in counts.items():
+                    state[name] += value
+                state["last_id"] = rows[-1].id
+                state["scanned"] += len(rows)
+                save_checkpoint(args.checkpoint, state)
+
+                scanned += len(rows)
+                elapsed = time.monotonic() - started
+                if args.rate:
+                    # Hold the average at --rate rows per second
+                    ahead = scanned / args.rate - elapsed
+                    if ahead > 0:
+                        time.sleep(ahead)
+                        elapsed += ahead
+                speed = scanned / elapsed if elapsed else 0
+                eta = (remaining - scanned) / speed if speed else 0
+                print(f"{scanned}/{remaining} rows (up to id {state['last_id']}), "
+                      f"{state['rotated']} re-encrypted, {state['conflicts']} changed concurrently, "
+                      f"{state['failed']} undecryptable, {speed:.0f} rows/s, ETA {format_eta(max(eta, 0))}",
+                      file=sys.stderr)
+
+    state["seconds"] = round(time.monotonic() - started, 2)
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-encrypt stored passwords under the current encryption key.")
+    parser.add_argument("--checkpoint", help="Progress file; rerun with the same file to resume")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Parallel crypto workers")
+    parser.add_argument("--pool", choices=["process", "thread"], default="process")
+    parser.add_argument("--rate", type=float, default=0, help="Maximum rows scanned per second (0 = unlimited)")
+    args = parser.parse_args()
+    try:
+        print(json.dumps(run(args)))
+    except KeyboardInterrupt:
+        print(f"Interrupted; rerun with --checkpoint {args.checkpoint} to resume" if args.checkpoint
+              else "Interrupted; pass --checkpoint to be able to resume", file=sys.stderr)
+        sys.exit(130)
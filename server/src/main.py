@@ -1,16 +1,59 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
+from fastapi.responses import ORJSONResponse
 from routers import auth
 from routers import encryption
 from routers import manager
-from database import engine
+from database import engine, async_engine, pool_stats
 from models import models
 from fastapi.middleware.cors import CORSMiddleware
-from config import Config
+from config import Config, check_secret_key
+from utils.jwt import key_ring
+from utils.auth import bcrypt_rounds
+from utils.crypto_pool import crypto_pool
+from utils.otp_store import otp_store
+from utils.user_cache import user_auth_cache
+from utils.reset_tokens import sweep_reset_tokens
+from utils.revocation import revocation_list
+from utils.rate_limit import RateLimitMiddleware, rate_limiter
+from utils.mailer import mail_dispatcher
+from utils.tasks import start_periodic, stop_tasks
+from utils.metrics import CONTENT_TYPE_LATEST, MetricsMiddleware, generate_metrics, mark_process_dead
+from contextlib import asynccontextmanager
+import asyncio
+import signal
 
-app = FastAPI()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_secret_key()
+    # Load the JWT keys now, so a key that doesn't match JWT_ALGORITHM stops the process at boot
+    key_ring.signing_key()
+    # Pick the bcrypt cost now rather than on the first registration or login
+    await asyncio.to_thread(bcrypt_rounds)
+    await asyncio.to_thread(revocation_list.rebuild)
+    mail_dispatcher.start()
+    tasks = [
+        start_periodic("otp-sweep", Config.OTP_SWEEP_INTERVAL_SECONDS, otp_store.sweep),
+        start_periodic("reset-token-sweep", Config.RESET_TOKEN_SWEEP_INTERVAL_SECONDS, sweep_reset_tokens),
+        start_periodic("rate-limit-sweep", Config.RATE_LIMIT_SWEEP_INTERVAL_SECONDS, rate_limiter.sweep),
+        start_periodic("revocation-refresh", Config.REVOCATION_REFRESH_INTERVAL_SECONDS, revocation_list.refresh),
+        start_periodic("revocation-sweep", Config.REVOCATION_SWEEP_INTERVAL_SECONDS, revocation_list.sweep),
+        start_periodic("mail-failed-purge", Config.MAIL_PURGE_INTERVAL_SECONDS, mail_dispatcher.purge_failed),
+    ]
+    yield
+    await stop_tasks(tasks)
+    await asyncio.to_thread(mail_dispatcher.stop, Config.MAIL_DRAIN_TIMEOUT_SECONDS)
+    crypto_pool.shutdown()
+    await async_engine.dispose()
+    mark_process_dead()
 
 
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+# Innermost, so 429 responses still get CORS headers and are counted by MetricsMiddleware
+app.add_middleware(RateLimitMiddleware)
+
 # Add the CORS middleware to the application
 app.add_middleware(
     CORSMiddleware,
@@ -18,8 +61,20 @@ app.add_middleware(
     allow_credentials=True,          # Allow cookies and credentials
     allow_methods=["*"],             # Allow all HTTP methods
     allow_headers=["*"],             # Allow all headers
+    expose_headers=["X-Next-Cursor", "ETag", "X-Import-Id"],  # Let the browser read the pagination cursor, vault version and failed import
 )
 
+# Added last so it wraps everything, CORS preflights included
+app.add_middleware(MetricsMiddleware)
+
+# Re-read the JWT keys on SIGHUP so a rotation doesn't need a restart
+if hasattr(signal, "SIGHUP"):
+    try:
+        signal.signal(signal.SIGHUP, lambda signum, frame: key_ring.request_reload())
+    except ValueError:
+        # Only the main thread may install signal handlers
+        pass
+
 # Create database tables
 models.Base.metadata.create_all(bind=engine)
 
@@ -31,5 +86,17 @@ def read_root():
     return {"message": "Welcome to the Password Manager API!"}
 
 
+@app.get("/internal/stats")
+def read_stats():
+    return {
+        "crypto_pool": crypto_pool.stats(),
+        "db_pool": pool_stats(),
+        "rate_limit": rate_limiter.stats(),
+        "revocation": revocation_list.stats(),
+        "user_cache": user_auth_cache.stats(),
+    }
 
 
+@app.get("/metrics")
+def read_metrics():
+    return Response(generate_metrics(), media_type=CONTENT_TYPE_LATEST)
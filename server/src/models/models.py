@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, func
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -15,8 +15,6 @@ class User(Base):
     is_verified = Column(Boolean, default=False, nullable=False)  
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    reset_token = Column(String(900), nullable=True)
-    reset_token_expires_at = Column(DateTime, nullable=True)
     # Define relationship to PasswordEntry
     password_entries = relationship("PasswordEntry", back_populates="owner")
 class PasswordEntry(Base):
@@ -29,11 +27,80 @@ class PasswordEntry(Base):
     username = Column(String(150), nullable=False)  # Reasonable length for usernames
     encrypted_password = Column(Text, nullable=False)  
     notes = Column(Text)  
-    created_at = Column(DateTime, server_default=func.now())  
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())  
+    # Written from Python so every value carries microseconds: SQLite compares these as strings,
+    # and a keyset cursor binds the fraction even when it's zero
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     is_deleted = Column(Boolean, default=False, nullable=False)  
     is_Favrout = Column(Boolean, default=False, nullable=False)  
 
     # Define back reference to User
     owner = relationship("User", back_populates="password_entries")
-    
\ No newline at end of file
+
+    __table_args__ = (
+        # Keyset pagination of a user's live entries by id or by (updated_at, id)
+        Index("ix_password_entries_user_deleted_id", "user_id", "is_deleted", "id"),
+        Index("ix_password_entries_user_deleted_updated", "user_id", "is_deleted", "updated_at", "id"),
+    )
+
+
+class OTPCode(Base):
+    __tablename__ = 'otp_codes'
+
+    email = Column(String(255), primary_key=True)
+    otp = Column(String(16), nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    username = Column(String(255), nullable=False)
+    retry_count = Column(Integer, default=0, nullable=False)
+    expires_at = Column(Float, nullable=False, index=True)  # Unix timestamp
+
+
+class PasswordResetToken(Base):
+    __tablename__ = 'password_reset_tokens'
+
+    token_digest = Column(String(64), primary_key=True)  # HMAC-SHA256 of the emailed token; the token itself is never stored
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    expires_at = Column(Float, nullable=False, index=True)  # Unix timestamp
+
+
+class RevokedToken(Base):
+    __tablename__ = 'revoked_tokens'
+
+    jti = Column(String(64), primary_key=True)
+    expires_at = Column(Float, nullable=False, index=True)  # The token's exp; the row is useless after it
+    revoked_at = Column(Float, nullable=False, index=True)  # Lets workers load only revocations they haven't seen
+
+
+class VaultVersion(Base):
+    __tablename__ = 'vault_versions'
+
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)  # Bumped by every write to the user's entries
+
+
+class ImportJob(Base):
+    __tablename__ = 'import_jobs'
+
+    id = Column(String(32), primary_key=True)  # Handed to the client to resume or roll back a failed import
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    status = Column(String(16), nullable=False)  # "running" or "failed"; finished imports are deleted
+    imported = Column(Integer, default=0, nullable=False)  # Entries committed so far
+    committed_batches = Column(Integer, default=0, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix timestamp of the last committed batch
+
+
+class ImportBatch(Base):
+    __tablename__ = 'import_batches'
+
+    import_id = Column(String(32), ForeignKey('import_jobs.id'), primary_key=True)
+    batch = Column(Integer, primary_key=True)
+    entry_ids = Column(Text, nullable=False)  # JSON list of the entry ids the batch inserted
+
+
+class RateLimitBucket(Base):
+    __tablename__ = 'rate_limit_buckets'
+
+    key = Column(String(320), primary_key=True)  # "<rule>:<ip, email or user id>"
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)  # Unix timestamp of the last refill
+    expires_at = Column(Float, nullable=False, index=True)  # When the bucket is full again and can be dropped
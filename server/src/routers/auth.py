@@ -1,18 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Response, Cookie
-from sqlalchemy.orm import Session
-from database import get_db
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
 from pydantic import BaseModel, EmailStr
-from utils.auth import verify_password, send_email, generate_otp, hash_password, is_strong_password,generate_reset_token,hash_token,verify_hash_token
-from utils.jwt import create_access_token, decode_access_token
+from utils.auth import verify_password_async, rehash_password_if_needed, generate_otp, hash_password_async, is_strong_password,generate_reset_token
+from utils.jwt import STEP_UP_COOKIE, create_access_token, decode_access_token
 from utils.logger import logger
+from utils.mailer import queue_email
+from utils.revocation import revocation_list
+from utils.otp_store import otp_store, OTP_OK, OTP_NOT_FOUND, OTP_EXPIRED, OTP_TOO_MANY
+from models.models import PasswordResetToken, User
+from utils.reset_tokens import reset_token_digest
+from utils.user_cache import load_user_auth_by_email, user_auth_cache
+from config import Config
+import asyncio
 import time
-from models.models import User
-from datetime import datetime, timedelta
 
 router = APIRouter()
-otp_store = {}  # Use Redis in production for better performance and persistence.
 
 MAX_RETRIES = 3
+OTP_TTL_SECONDS = 60
 
 
 # Pydantic Models
@@ -43,12 +50,12 @@ class UserCreate(BaseModel):
     phone_number: str
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await load_user_auth_by_email(db, email)
 
 
-def validate_user_credentials(db: Session, email: str, password: str):
-    db_user = get_user_by_email(db, email)
+async def validate_user_credentials(db: AsyncSession, email: str, password: str):
+    db_user = await get_user_by_email(db, email)
     if not db_user:
         logger.warning(f"Login attempt for non-existent user: {email}")
         raise HTTPException(
@@ -63,32 +70,29 @@ def validate_user_credentials(db: Session, email: str, password: str):
             detail="Your account has been blocked. Please contact support."
         )
 
-    if not verify_password(password, db_user.hashed_password):
+    if not await verify_password_async(password, db_user.hashed_password):
         logger.warning(f"Invalid credentials for: {db_user.username} ({db_user.email})")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
 
+    await rehash_password_if_needed(db, db_user, password)
     return db_user
 
 
 def generate_and_send_otp(email: str, user_id: int, username: str):
-    if email in otp_store and time.time() < otp_store[email]["expires_at"]:
+    """Blocking (OTP store and mail spool writes); async handlers run it in a thread."""
+    otp = generate_otp(6)
+    created = otp_store.create(
+        email,
+        {"otp": otp, "user_id": user_id, "username": username},
+        ttl=OTP_TTL_SECONDS,
+    )
+    if not created:
         logger.info(f"OTP already sent to user: {username} ({email})")
         return {"message": "An OTP has already been sent. Please check your email."}
 
-    otp = generate_otp(6)
-    expiration_time = time.time() + 60
-
-    otp_store[email] = {
-        "otp": otp,
-        "expires_at": expiration_time,
-        "retry_count": 0,
-        "user_id": user_id,
-        "username": username
-    }
-
     html_body = f"""
     <html>
       <body>
@@ -100,29 +104,29 @@ def generate_and_send_otp(email: str, user_id: int, username: str):
       </body>
     </html>
     """
-    send_email(email, "Your OTP Code", html_body, is_html=True)
+    queue_email(email, "Your OTP Code", html_body, is_html=True)
     logger.info(f"OTP sent to user: {username} ({email})")
     return {"message": "OTP sent successfully!"}
 
 
 # Endpoints
 @router.post("/login", status_code=status.HTTP_200_OK)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = validate_user_credentials(db, user.email, user.password)
-    return generate_and_send_otp(db_user.email, db_user.id, db_user.username)
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await validate_user_credentials(db, user.email, user.password)
+    return await asyncio.to_thread(generate_and_send_otp, db_user.email, db_user.id, db_user.username)
 
 
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     if not is_strong_password(user.password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password must be at least 12 characters long, include uppercase, lowercase, a number, and a special character.",
         )
 
-    db_user = db.query(User).filter(
+    db_user = await db.scalar(select(User).where(
         (User.username == user.username.lower()) | (User.email == user.email) | (User.phone_number == user.phone_number)
-    ).first()
+    ).limit(1))
 
     if db_user:
         raise HTTPException(
@@ -130,7 +134,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
             detail="Username, email, or phone number already registered",
         )
 
-    hashed_password = hash_password(user.password)
+    hashed_password = await hash_password_async(user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -139,69 +143,66 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     )
 
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    user_auth_cache.invalidate(db_user.id, db_user.email)
     logger.info(f"User registered successfully: {user.username} ({user.email})")
 
     return {"message": "User registered successfully"}
 
 
 @router.post("/resend-otp", status_code=status.HTTP_200_OK)
-def resend_otp(resend_data: ResendOTP, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, resend_data.email)
+async def resend_otp(resend_data: ResendOTP, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_email(db, resend_data.email)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
 
-    return generate_and_send_otp(db_user.email, db_user.id, db_user.username)
+    return await asyncio.to_thread(generate_and_send_otp, db_user.email, db_user.id, db_user.username)
 
 
 @router.post("/verify-otp", status_code=status.HTTP_200_OK)
-def verify_otp(otp_data: VerifyOTP, response: Response):
+async def verify_otp(otp_data: VerifyOTP, response: Response):
     email = otp_data.email
-    otp = otp_data.otp
+    if otp_store.blocking:
+        result = await asyncio.to_thread(otp_store.verify, email, otp_data.otp, MAX_RETRIES)
+    else:
+        result = otp_store.verify(email, otp_data.otp, MAX_RETRIES)
 
-    if email not in otp_store:
+    if result.status == OTP_NOT_FOUND:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="OTP not found or expired"
         )
 
-    stored_otp = otp_store[email]["otp"]
-    expires_at = otp_store[email]["expires_at"]
-
-    if time.time() > expires_at:
-        del otp_store[email]
+    if result.status == OTP_EXPIRED:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="OTP expired"
         )
 
-    if "retry_count" in otp_store[email] and otp_store[email]["retry_count"] >= MAX_RETRIES:
-        logger.warning(f"Too many failed attempts. Please request a new OTP: {otp_store[email]})")
-        del otp_store[email]
+    if result.status == OTP_TOO_MANY:
+        logger.warning(f"Too many failed attempts. Please request a new OTP: {email}")
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Too many failed attempts. Please request a new OTP."
         )
 
-    if otp != stored_otp:
-        otp_store[email]["retry_count"] += 1
-        logger.warning(f"Invalid OTP. You have {MAX_RETRIES - otp_store[email]['retry_count']} attempts remaining.")
+    if result.status != OTP_OK:
+        logger.warning(f"Invalid OTP. You have {result.remaining} attempts remaining.")
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Invalid OTP. You have {MAX_RETRIES - otp_store[email]['retry_count']} attempts remaining."
+            detail=f"Invalid OTP. You have {result.remaining} attempts remaining."
         )
 
-    logger.warning(f"OTP verified successfully! {otp_store[email]}")
+    logger.warning(f"OTP verified successfully! {email}")
 
     access_token = create_access_token(
         data={
-            "sub": str(otp_store[email]["user_id"]),
+            "sub": str(result.record["user_id"]),
             "email": email,
-            "username": otp_store[email]["username"]
+            "username": result.record["username"]
         }
     )
 
@@ -215,12 +216,11 @@ def verify_otp(otp_data: VerifyOTP, response: Response):
         path="/"
     )
 
-    del otp_store[email]
     return {"message": "OTP verified successfully!", "access_token": access_token}
 
 
 @router.post("/verify-token", status_code=status.HTTP_200_OK)
-def verify_token(access_token: str = Cookie(None, alias="access_token")):
+async def verify_token(access_token: str = Cookie(None, alias="access_token")):
     if not access_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -229,17 +229,34 @@ def verify_token(access_token: str = Cookie(None, alias="access_token")):
 
     try:
         payload = decode_access_token(access_token)
-        return {"message": "Token is valid", "payload": payload}
     except HTTPException as e:
         raise e
+    if payload.get("jti") and await revocation_list.is_revoked(payload["jti"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+        )
+    return {"message": "Token is valid", "payload": payload}
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
-def logout(response: Response):
+async def logout(response: Response, access_token: str = Cookie(None, alias="access_token")):
+    # Clearing the cookie isn't enough if the token was copied elsewhere, so revoke it until it expires
+    try:
+        payload = decode_access_token(access_token) if access_token else {}
+    except Exception:
+        payload = {}  # Expired or invalid already
+    if payload.get("jti") and payload.get("exp"):
+        await asyncio.to_thread(revocation_list.revoke, payload["jti"], payload["exp"])
+
     response.delete_cookie(
         key="access_token",
         path="/",
     )
+    response.delete_cookie(
+        key=STEP_UP_COOKIE,
+        path="/api/v1",
+    )
     return {"message": "Logged out successfully"}
 
 
@@ -248,19 +265,22 @@ def logout(response: Response):
 
 
 @router.post("/forgot-password", status_code=status.HTTP_200_OK)
-def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
-    db_user = get_user_by_email(db, request.email)
+async def forgot_password(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    db_user = await get_user_by_email(db, request.email)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="If the email exists, a reset link has been sent"
         )
     reset_token = generate_reset_token()
-    hashed_token = hash_token(reset_token)
-    reset_token_expires_at = datetime.now()  + timedelta(minutes=15) 
-    db_user.reset_token = hashed_token
-    db_user.reset_token_expires_at = reset_token_expires_at
-    db.commit()
+    # A new link replaces any earlier one
+    await db.execute(delete(PasswordResetToken).where(PasswordResetToken.user_id == db_user.id))
+    db.add(PasswordResetToken(
+        token_digest=reset_token_digest(reset_token),
+        user_id=db_user.id,
+        expires_at=time.time() + Config.RESET_TOKEN_TTL_MINUTES * 60,
+    ))
+    await db.commit()
 
     reset_link = f"http://localhost:5173/reset-password?token={reset_token}&id={db_user.id}"
     html_body = f"""
@@ -269,12 +289,12 @@ def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db
         <h1>Password Reset Request</h1>
         <p>Click the link below to reset your password:</p>
         <p><a href="{reset_link}">Reset Password</a></p>
-        <p>This link will expire in 15 minutes.</p>
+        <p>This link will expire in {Config.RESET_TOKEN_TTL_MINUTES:g} minutes.</p>
         <p>If you did not request this, please ignore this email.</p>
       </body>
     </html>
     """
-    send_email(request.email, "Password Reset Request", html_body, is_html=True)
+    await asyncio.to_thread(queue_email, request.email, "Password Reset Request", html_body, is_html=True)
 
     return {"message": "If the email exists, a reset link has been sent"}
 
@@ -282,35 +302,46 @@ def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db
 
 
 @router.post("/reset-password", status_code=status.HTTP_200_OK)
-def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.id == request.id).first()    
-    if not db_user:
+async def reset_password(request: ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    token_digest = reset_token_digest(request.token)
+    reset_token = await db.get(PasswordResetToken, token_digest)
+    # The link also carries the user id; a token only works for the user it was issued to
+    if not reset_token or str(reset_token.user_id) != request.id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired token"
         )
 
-    if not verify_hash_token(request.token, db_user.reset_token):
+    if time.time() > reset_token.expires_at:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid or expired token"
+            detail="Token has expired"
         )
 
-    if datetime.now() > db_user.reset_token_expires_at:
+    if not is_strong_password(request.new_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Token has expired"
+            detail="Password must be at least 12 characters long, include uppercase, lowercase, a number, and a special character."
         )
 
-    if not is_strong_password(request.new_password):
+    # Hash before any write, with the read transaction ended, so the slow bcrypt
+    # call holds neither a connection nor a lock
+    user_id = reset_token.user_id
+    await db.rollback()
+    hashed_password = await hash_password_async(request.new_password)
+
+    # Consume the token; of two concurrent redemptions only one deletes it
+    consumed = await db.execute(delete(PasswordResetToken).where(PasswordResetToken.token_digest == token_digest))
+    db_user = await db.get(User, user_id)
+    if consumed.rowcount != 1 or not db_user:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Password must be at least 12 characters long, include uppercase, lowercase, a number, and a special character."
+            detail="Invalid or expired token"
         )
 
-    db_user.hashed_password = hash_password(request.new_password)
-    db_user.reset_token = None
-    db_user.reset_token_expires_at = None
-    db.commit()
+    db_user.hashed_password = hashed_password
+    await db.commit()
+    user_auth_cache.invalidate(db_user.id, db_user.email)
 
     return {"message": "Password reset successfully"}
\ No newline at end of file
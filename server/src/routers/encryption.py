@@ -1,15 +1,31 @@
 from fastapi import APIRouter, Depends, HTTPException, Response, File, UploadFile,Form
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_async_db, SessionLocal
+from config import Config
 from utils.auth import encrypt_password, decrypt_password,password_generator
-from models.models import  PasswordEntry
+from utils.crypto_pool import crypto_pool
+from utils.export_format import encrypt_stream, is_chunked_export, StreamDecryptor
+from utils.json_stream import JSONArrayParser
+from utils.logger import logger
+from utils.search_index import search_index
+from utils.vault_version import bump_vault_version
+from models.models import  ImportBatch, ImportJob, PasswordEntry
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.backends import default_backend
 from cryptography.fernet import Fernet
 import json
 import base64
+import io
 import os
+import time
+import uuid
+from datetime import datetime
+from typing import NamedTuple
 from pydantic import BaseModel
 
 
@@ -63,14 +79,103 @@ def decrypt_password(encrypted_file: str, passphrase: str) -> str:
     return cipher_suite.decrypt(encrypted_data).decode()
 
 
+def _fernet_encrypt(key: bytes, data: bytes) -> bytes:
+    return Fernet(key).encrypt(data)
+
+def _fernet_decrypt(key: bytes, token: bytes) -> bytes:
+    return Fernet(key).decrypt(token)
+
+async def derive_key_async(passphrase: str, salt: bytes) -> bytes:
+    """Run derive_key on the crypto pool so PBKDF2 doesn't block the event loop."""
+    return await crypto_pool.run_async("derive_key", derive_key, passphrase, salt)
+
+async def encrypt_password_async(encrypted_file: str, passphrase: str) -> str:
+    """Async variant of encrypt_password; the KDF and the cipher run on the crypto pool."""
+    salt = os.urandom(16)
+    key = await derive_key_async(passphrase, salt)
+    token = await crypto_pool.run_async("fernet_encrypt", _fernet_encrypt, key, encrypted_file.encode())
+    return base64.b64encode(salt + token).decode()
+
+async def decrypt_password_async(encrypted_file: str, passphrase: str) -> str:
+    """Async variant of decrypt_password; the KDF and the cipher run on the crypto pool."""
+    decoded_data = base64.b64decode(encrypted_file)
+    salt = decoded_data[:16]
+    encrypted_data = decoded_data[16:]
+
+    key = await derive_key_async(passphrase, salt)
+    return (await crypto_pool.run_async("fernet_decrypt", _fernet_decrypt, key, encrypted_data)).decode()
+
+
+
+EXPORT_COLUMNS = (
+    PasswordEntry.id,
+    PasswordEntry.title,
+    PasswordEntry.url,
+    PasswordEntry.username,
+    PasswordEntry.encrypted_password,
+    PasswordEntry.notes,
+    PasswordEntry.is_deleted,
+    PasswordEntry.is_Favrout,
+    PasswordEntry.created_at,
+    PasswordEntry.updated_at,
+)
+
+
+def iter_export_json(user_id: int):
+    """Yield the export JSON array piece by piece, reading rows `EXPORT_YIELD_PER` at a time.
+
+    Opens its own session: the request's session is closed before a streamed body is sent.
+    """
+    with SessionLocal() as db:
+        rows = db.execute(
+            select(*EXPORT_COLUMNS)
+            .where(PasswordEntry.user_id == user_id, PasswordEntry.is_deleted == False)
+            .order_by(PasswordEntry.id)
+            .execution_options(yield_per=Config.EXPORT_YIELD_PER)
+        )
+        separator = b"[\n"
+        for entry in rows:
+            yield separator + json.dumps({
+                "id": entry.id,
+                "title": entry.title,
+                "url": entry.url,
+                "username": entry.username,
+                "encrypted_password": entry.encrypted_password,
+                "notes": entry.notes,
+                "is_deleted": entry.is_deleted,
+                "is_Favrout": entry.is_Favrout,
+                "created_at": entry.created_at.isoformat() if entry.created_at else None,
+                "updated_at": entry.updated_at.isoformat() if entry.updated_at else None,
+            }).encode()
+            separator = b",\n"
+        yield b"[]" if separator == b"[\n" else b"\n]"
+
 
 @router.get("/export-passwords", response_class=Response)
 async def export_passwords(
     user_id: int,
     passphrase: str, 
-    db: Session = Depends(get_db)
+    stream: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    password_entries = db.query(PasswordEntry).filter(PasswordEntry.user_id == user_id, PasswordEntry.is_deleted == False).all()
+    if stream:
+        if not await db.scalar(select(PasswordEntry.id).where(PasswordEntry.user_id == user_id, PasswordEntry.is_deleted == False).limit(1)):
+            raise HTTPException(status_code=404, detail="No password entries found for this user.")
+
+        # Chunked format (utils/export_format.py): constant memory however large the vault is.
+        salt = os.urandom(16)
+        key = base64.urlsafe_b64decode(await derive_key_async(passphrase, salt))
+        return StreamingResponse(
+            encrypt_stream(key, salt, iter_export_json(user_id), Config.EXPORT_CHUNK_SIZE),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": "attachment; filename=passwords_export.pmx"},
+        )
+
+    password_entries = (await db.execute(
+        select(*EXPORT_COLUMNS)
+        .where(PasswordEntry.user_id == user_id, PasswordEntry.is_deleted == False)
+        .order_by(PasswordEntry.id)
+    )).all()
     
     if not password_entries:
         raise HTTPException(status_code=404, detail="No password entries found for this user.")
@@ -92,7 +197,7 @@ async def export_passwords(
     ]
 
     json_data = json.dumps(entries_data, indent=2)
-    encrypted_data = encrypt_password(json_data, passphrase)  
+    encrypted_data = await encrypt_password_async(json_data, passphrase)
 
     return Response(
         content=encrypted_data,
@@ -103,42 +208,268 @@ async def export_passwords(
 
 
 
+def _parse_timestamp(value):
+    return datetime.fromisoformat(value) if value else datetime.utcnow()
+
+
+def import_row(user_id: int, entry_data: dict) -> dict:
+    return {
+        "user_id": user_id,
+        "title": entry_data["title"],
+        "url": entry_data["url"],
+        "username": entry_data["username"],
+        "encrypted_password": entry_data["encrypted_password"],
+        "notes": entry_data["notes"],
+        "is_deleted": entry_data["is_deleted"],
+        "is_Favrout": entry_data["is_Favrout"],
+        "created_at": _parse_timestamp(entry_data["created_at"]),
+        "updated_at": _parse_timestamp(entry_data["updated_at"]),
+    }
+
+
+def insert_batch(db: Session, rows: list) -> list | None:
+    """Core executemany insert, without per-row ORM unit-of-work bookkeeping.
+
+    Returns the new ids in row order where the dialect can return them from an executemany.
+    """
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        statement = insert(PasswordEntry).returning(PasswordEntry.id, sort_by_parameter_order=True)
+        return list(db.scalars(statement, rows))
+    db.execute(insert(PasswordEntry), rows)
+    return None
+
+
+async def iter_import_entries(file: UploadFile, passphrase: str):
+    """Yield entries from an uploaded export while it is still being read.
+
+    Chunked exports are decrypted frame by frame; legacy single-token exports
+    can only be decrypted whole, but are still parsed incrementally.
+    """
+    parser = JSONArrayParser()
+    data = await file.read(Config.IMPORT_READ_SIZE)
+
+    if is_chunked_export(data):
+        decryptor = StreamDecryptor()
+        key_set = False
+        while True:
+            plaintexts = decryptor.feed(data)
+            if decryptor.header_ready and not key_set:
+                key = await derive_key_async(passphrase, decryptor.salt)
+                decryptor.set_key(base64.urlsafe_b64decode(key))
+                key_set = True
+                plaintexts = decryptor.feed(b"")  # Open the frames buffered so far
+            for plaintext in plaintexts:
+                for entry in parser.feed(plaintext):
+                    yield entry
+            if not data:
+                break
+            data = await file.read(Config.IMPORT_READ_SIZE)
+        decryptor.close()
+    else:
+        file_content = data + await file.read()
+        decrypted_data = await decrypt_password_async(file_content.decode(), passphrase)  # Decrypt using passphrase
+        for entry in parser.feed(decrypted_data.encode()):
+            yield entry
+    parser.close()
+
+
+IMPORT_RUNNING = "running"
+IMPORT_FAILED = "failed"
+
+
+class ImportProgress(NamedTuple):
+    import_id: str
+    imported: int  # Entries already committed
+    committed_batches: int
+
+
+def _resumable(now: float):
+    """Failed imports, and running ones whose process stopped committing batches."""
+    return (ImportJob.status == IMPORT_FAILED) | (ImportJob.updated_at < now - Config.IMPORT_STALE_SECONDS)
+
+
+def start_import_job(user_id: int, resume_id: str | None = None) -> ImportProgress:
+    """Record a new import, or take over the failed import `resume_id` where it stopped."""
+    now = time.time()
+    with SessionLocal() as db:
+        if resume_id is None:
+            job = ImportJob(id=uuid.uuid4().hex, user_id=user_id, status=IMPORT_RUNNING, imported=0,
+                            committed_batches=0, updated_at=now)
+            db.add(job)
+            db.commit()
+            return ImportProgress(job.id, 0, 0)
+        # Conditional, so two requests can't resume the same import
+        claimed = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == resume_id, ImportJob.user_id == user_id, _resumable(now))
+            .values(status=IMPORT_RUNNING, updated_at=now)
+        )
+        if claimed.rowcount != 1:
+            raise HTTPException(status_code=404, detail="No failed import with this id.")
+        job = db.get(ImportJob, resume_id)
+        db.commit()
+        return ImportProgress(job.id, job.imported, job.committed_batches)
+
+
+def commit_import_batch(user_id: int, job: ImportProgress, rows: list) -> tuple[list, int]:
+    """Insert one batch and record it against the import in a short transaction of its own.
+
+    Returns the new entry ids and the vault version the batch committed.
+    """
+    with SessionLocal() as db:
+        new_ids = insert_batch(db, rows)
+        if new_ids is None:
+            # No executemany RETURNING on this dialect; a rollback needs the ids, so insert row by row
+            new_ids = [db.execute(insert(PasswordEntry).values(row)).inserted_primary_key[0] for row in rows]
+        db.add(ImportBatch(import_id=job.import_id, batch=job.committed_batches, entry_ids=json.dumps(new_ids)))
+        progressed = db.execute(
+            update(ImportJob)
+            .where(ImportJob.id == job.import_id, ImportJob.committed_batches == job.committed_batches)
+            .values(committed_batches=job.committed_batches + 1, imported=job.imported + len(rows), updated_at=time.time())
+        )
+        if progressed.rowcount != 1:
+            raise RuntimeError("The import was resumed by another request")
+        version = bump_vault_version(db, user_id)
+        db.commit()
+    return new_ids, version
+
+
+def finish_import_job(import_id: str, succeeded: bool):
+    """Forget a finished import, or mark a failed one so it can be resumed or rolled back."""
+    with SessionLocal() as db:
+        if succeeded:
+            db.execute(delete(ImportBatch).where(ImportBatch.import_id == import_id))
+            db.execute(delete(ImportJob).where(ImportJob.id == import_id))
+        else:
+            db.execute(update(ImportJob).where(ImportJob.id == import_id).values(status=IMPORT_FAILED))
+        db.commit()
+
+
+def rollback_import_job(user_id: int, import_id: str) -> tuple[list, int | None]:
+    """Delete every entry a failed import committed. Returns the removed ids and the new vault version."""
+    with SessionLocal() as db:
+        claimed = db.execute(
+            delete(ImportJob).where(ImportJob.id == import_id, ImportJob.user_id == user_id, _resumable(time.time()))
+        )
+        if claimed.rowcount != 1:
+            raise HTTPException(status_code=404, detail="No failed import with this id.")
+        removed = []
+        for entry_ids in db.scalars(select(ImportBatch.entry_ids).where(ImportBatch.import_id == import_id)):
+            entry_ids = json.loads(entry_ids)
+            db.execute(delete(PasswordEntry).where(PasswordEntry.user_id == user_id, PasswordEntry.id.in_(entry_ids)))
+            removed += entry_ids
+        db.execute(delete(ImportBatch).where(ImportBatch.import_id == import_id))
+        version = bump_vault_version(db, user_id) if removed else None
+        db.commit()
+    return removed, version
+
+
+async def run_import(user_id: int, passphrase: str, file: UploadFile, job: ImportProgress):
+    """Insert entries in IMPORT_BATCH_SIZE batches, yielding the running count after each.
+
+    Decrypting and parsing happen outside any transaction; each batch is
+    committed on its own and recorded against `job`, so a failed import
+    keeps its committed batches and can be resumed (entries already
+    committed are skipped) or rolled back with `rollback_import_job`.
+    """
+    skip = job.imported
+    batch = []
+
+    async def flush():
+        nonlocal job
+        new_ids, version = await run_in_threadpool(commit_import_batch, user_id, job, batch)
+        job = ImportProgress(job.import_id, job.imported + len(batch), job.committed_batches + 1)
+        search_index.apply(user_id, version, upserts=[
+            (new_id, row["title"], row["url"], row["username"])
+            for new_id, row in zip(new_ids, batch)
+            if not row["is_deleted"]
+        ])
+
+    try:
+        async for entry_data in iter_import_entries(file, passphrase):
+            if skip:
+                skip -= 1  # Committed before the import was resumed
+                continue
+            batch.append(import_row(user_id, entry_data))
+            if len(batch) >= Config.IMPORT_BATCH_SIZE:
+                await flush()
+                batch = []
+                yield job.imported
+        if batch:
+            await flush()
+    except BaseException:
+        await run_in_threadpool(finish_import_job, job.import_id, False)
+        logger.warning(f"Import {job.import_id} for user {user_id} stopped after {job.imported} entries")
+        raise
+
+    await run_in_threadpool(finish_import_job, job.import_id, True)
+    logger.info(f"Imported {job.imported} password entries for user {user_id}")
+    yield job.imported
+
+
+def detach_upload(file: UploadFile) -> UploadFile:
+    """Take over an upload's spooled file so it outlives the endpoint.
+
+    FastAPI closes form uploads as soon as the endpoint returns, before a streamed body is sent.
+    """
+    detached = UploadFile(file.file, size=file.size, filename=file.filename, headers=file.headers)
+    file.file = io.BytesIO()
+    return detached
+
+
 @router.post("/import-passwords")
 async def import_passwords(
     user_id: int,
     passphrase: str = Form(...),  
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    progress: bool = False,
+    resume: str | None = None,
 ):
-    file_content = await file.read()
+    job = await run_in_threadpool(start_import_job, user_id, resume)
+    if progress:
+        # Stream newline-delimited JSON progress while the import runs
+        upload = detach_upload(file)
+
+        async def progress_lines():
+            imported = job.imported
+            try:
+                async for imported in run_import(user_id, passphrase, upload, job):
+                    yield json.dumps({"import_id": job.import_id, "imported": imported}) + "\n"
+                yield json.dumps({"message": "Passwords imported successfully.", "imported": imported}) + "\n"
+            except Exception as e:
+                logger.exception(f"Import for user {user_id} failed")
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                yield json.dumps({"error": f"Failed to import passwords: {detail}", "import_id": job.import_id}) + "\n"
+            finally:
+                await upload.close()
+
+        return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
 
     try:
-        decrypted_data = decrypt_password(file_content.decode(), passphrase)  # Decrypt using passphrase
-        entries_data = json.loads(decrypted_data)
-
-        for entry_data in entries_data:
-            new_entry = PasswordEntry(
-                user_id=user_id,
-                title=entry_data["title"],
-                url=entry_data["url"],
-                username=entry_data["username"],
-                encrypted_password=entry_data["encrypted_password"],
-                notes=entry_data["notes"],
-                is_deleted=entry_data["is_deleted"],
-                is_Favrout=entry_data["is_Favrout"],
-                created_at=entry_data["created_at"],
-                updated_at=entry_data["updated_at"],
-            )
+        imported = 0
+        async for imported in run_import(user_id, passphrase, file, job):
+            pass
+        return {"message": "Passwords imported successfully.", "imported": imported}
 
-            db.add(new_entry)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.warning(f"Import for user {user_id} failed: {e}")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Failed to import passwords: {str(e)}",
+            headers={"X-Import-Id": job.import_id},  # Pass as ?resume= to continue, or roll it back
+        )
 
-        db.commit()
-        return {"message": "Passwords imported successfully."}
 
-    except Exception as e:
-        db.rollback()
-        print(e)
-        raise HTTPException(status_code=400, detail=f"Failed to import passwords: {str(e)}")
+@router.post("/import-passwords/{import_id}/rollback")
+async def rollback_import(import_id: str, user_id: int):
+    """Remove the entries a failed import committed before it stopped."""
+    removed, version = await run_in_threadpool(rollback_import_job, user_id, import_id)
+    if removed:
+        search_index.apply(user_id, version, removals=removed)
+    logger.info(f"Rolled back import {import_id} for user {user_id}: {len(removed)} entries removed")
+    return {"message": "Import rolled back.", "removed": len(removed)}
 
 
 
@@ -1,10 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
-from database import get_db
-from models.models import PasswordEntry, User
-from utils.jwt import decode_access_token
-from utils.auth import encrypt_password, decrypt_password, is_strong_password, verify_password
-from pydantic import BaseModel, EmailStr
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import bindparam, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_async_db
+from config import Config
+from models.models import PasswordEntry
+from utils.jwt import STEP_UP_COOKIE, create_step_up_grant, decode_access_token, verify_step_up_grant
+from utils.auth import encrypt_password, decrypt_password, is_strong_password, rehash_password_if_needed, verify_password_async
+from utils.encryption_keys import encryption_keys
+from utils.logger import logger
+from utils.revocation import revocation_list
+from utils.search_index import search_index
+from utils.user_cache import load_user_auth
+from utils.vault_version import bump_vault_version_async, get_vault_version, etag_matches
+from pydantic import BaseModel, ConfigDict, EmailStr, TypeAdapter
+from typing import Literal
+from cryptography.fernet import InvalidToken
+from datetime import datetime
+import base64
+import hashlib
+import json
 
 router = APIRouter()
 
@@ -13,6 +27,15 @@ router = APIRouter()
 class Data(BaseModel):
     serviceID: str
     email: EmailStr
+    password: str | None = None  # Not needed with a step-up grant
+
+
+class BatchReveal(BaseModel):
+    serviceIDs: list[int]
+    password: str | None = None  # Not needed with a step-up grant
+
+
+class StepUpRequest(BaseModel):
     password: str
 
 
@@ -34,6 +57,42 @@ class PasswordEntryUpdate(BaseModel):
     is_Favrout: bool
 
 
+class PasswordEntrySummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    user_id: int
+    title: str
+    url: str | None
+    username: str
+    notes: str | None
+    created_at: datetime | None
+    updated_at: datetime | None
+    is_deleted: bool
+    is_Favrout: bool
+
+
+class PasswordEntryDetail(PasswordEntrySummary):
+    password: str
+
+
+# Columns behind PasswordEntrySummary, for queries that don't need whole entries
+SUMMARY_COLUMNS = (
+    PasswordEntry.id,
+    PasswordEntry.user_id,
+    PasswordEntry.title,
+    PasswordEntry.url,
+    PasswordEntry.username,
+    PasswordEntry.notes,
+    PasswordEntry.created_at,
+    PasswordEntry.updated_at,
+    PasswordEntry.is_deleted,
+    PasswordEntry.is_Favrout,
+)
+
+PasswordEntryList = TypeAdapter(list[PasswordEntrySummary])
+
+
 # Helper Functions
 async def get_current_user(request: Request):
     token = request.cookies.get("access_token")
@@ -51,20 +110,28 @@ async def get_current_user(request: Request):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token or missing user ID"
             )
-        return user_id
+        user_id = int(user_id)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
+    # Tokens issued before jti was added can't be revoked and simply run until they expire
+    if payload.get("jti") and await revocation_list.is_revoked(payload["jti"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked"
+        )
+    return user_id
+
 
-def get_password_entry_by_id(db: Session, service_id: int, user_id: int):
-    password_entry = db.query(PasswordEntry).filter(
+async def get_password_entry_by_id(db: AsyncSession, service_id: int, user_id: int):
+    password_entry = await db.scalar(select(PasswordEntry).where(
         PasswordEntry.id == service_id,
         PasswordEntry.user_id == user_id,
         PasswordEntry.is_deleted == False
-    ).first()
+    ))
 
     if not password_entry:
         raise HTTPException(
@@ -74,89 +141,120 @@ def get_password_entry_by_id(db: Session, service_id: int, user_id: int):
     return password_entry
 
 
-def handle_db_operation(db: Session, operation):
+async def handle_db_operation(db: AsyncSession, operation):
     try:
-        db.commit()
-        db.refresh(operation)
+        await db.commit()
+        await db.refresh(operation)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"An error occurred: {str(e)}"
         )
 
 
-def validate_user_credentials(db: Session, user_id: int, password: str):
-    db_user = db.query(User).filter(User.id == user_id).first()
+async def reencrypt_stale_entries(db: AsyncSession, entries: list):
+    """Move entries still on an old encryption key onto the current one.
+
+    `entries` holds `(id, stored ciphertext, plaintext)` for passwords just
+    decrypted, so nothing is decrypted twice. Each UPDATE only applies if the
+    ciphertext is unchanged, leaves `updated_at` and the vault version alone
+    (the password itself didn't change), and a failure never fails the read.
+    """
+    stale = [
+        {"entry_id": entry_id, "old": stored, "new": encrypt_password(plaintext)}
+        for entry_id, stored, plaintext in entries
+        if encryption_keys.needs_rotation(stored)
+    ]
+    if not stale:
+        return
+    table = PasswordEntry.__table__
+    try:
+        await db.execute(
+            update(table)
+            .where(table.c.id == bindparam("entry_id"), table.c.encrypted_password == bindparam("old"))
+            .values(encrypted_password=bindparam("new"), updated_at=table.c.updated_at),
+            stale,
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"Re-encrypting {len(stale)} password entries failed: {e}")
+
+
+def entry_list_response(rows, headers: dict | None = None) -> Response:
+    """Serialize result rows to JSON in one pydantic-core pass, bypassing jsonable_encoder."""
+    entries = PasswordEntryList.validate_python(rows, from_attributes=True)
+    return Response(PasswordEntryList.dump_json(entries), media_type="application/json", headers=headers)
+
+
+async def validate_user_credentials(db: AsyncSession, user_id: int, password: str):
+    db_user = await load_user_auth(db, user_id)
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials."
         )
 
-    if not verify_password(password, db_user.hashed_password):
+    if not await verify_password_async(password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
+    await rehash_password_if_needed(db, db_user, password)
     return db_user
 
 
+async def authorize_sensitive_call(request: Request, db: AsyncSession, user_id: int, password: str | None):
+    """Gate a reveal or delete: a valid step-up grant stands in for the master password (and its bcrypt verify)."""
+    grant = request.headers.get("X-Step-Up-Grant") or request.cookies.get(STEP_UP_COOKIE)
+    if grant and verify_step_up_grant(grant, request.cookies.get("access_token", ""), user_id):
+        return
+    if password is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Master password or step-up grant required."
+        )
+    await validate_user_credentials(db, user_id, password)
+
+
 # Endpoints
-@router.put("/toggle-favorite/{service_id}")
-def toggle_favorite(
+@router.put("/toggle-favorite/{service_id}", response_model=PasswordEntrySummary)
+async def toggle_favorite(
     service_id: int,
     user_id: int = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    password_entry = get_password_entry_by_id(db, service_id, user_id)
+    password_entry = await get_password_entry_by_id(db, service_id, user_id)
     password_entry.is_Favrout = not password_entry.is_Favrout
-    handle_db_operation(db, password_entry)
+    version = await bump_vault_version_async(db, password_entry.user_id)
+    await handle_db_operation(db, password_entry)
+    search_index.apply(password_entry.user_id, version)  # Nothing indexed changed; keep the index current
 
-    return {
-        "id": password_entry.id,
-        "user_id": password_entry.user_id,
-        "title": password_entry.title,
-        "url": password_entry.url,
-        "username": password_entry.username,
-        "notes": password_entry.notes,
-        "created_at": password_entry.created_at,
-        "updated_at": password_entry.updated_at,
-        "is_deleted": password_entry.is_deleted,
-        "is_Favrout": password_entry.is_Favrout
-    }
+    return PasswordEntrySummary.model_validate(password_entry)
 
 
-@router.get("/get-password-entry/{service_id}")
-def get_password_entry(
+@router.get("/get-password-entry/{service_id}", response_model=PasswordEntryDetail)
+async def get_password_entry(
     service_id: int,
     user_id: int = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    password_entry = get_password_entry_by_id(db, service_id, user_id)
-    return {
-        "id": password_entry.id,
-        "user_id": password_entry.user_id,
-        "title": password_entry.title,
-        "url": password_entry.url,
-        "username": password_entry.username,
-        "password": decrypt_password(password_entry.encrypted_password),
-        "notes": password_entry.notes,
-        "created_at": password_entry.created_at,
-        "updated_at": password_entry.updated_at,
-        "is_deleted": password_entry.is_deleted,
-        "is_Favrout": password_entry.is_Favrout
-    }
+    password_entry = await get_password_entry_by_id(db, service_id, user_id)
+    entry = PasswordEntrySummary.model_validate(password_entry)
+    password = decrypt_password(password_entry.encrypted_password)
+    await reencrypt_stale_entries(db, [(password_entry.id, password_entry.encrypted_password, password)])
+    return PasswordEntryDetail(**dict(entry), password=password)
 
 
-@router.put("/update-password/{service_id}")
-def update_password(
+@router.put("/update-password/{service_id}", response_model=PasswordEntrySummary)
+async def update_password(
     service_id: int,
     update_data: PasswordEntryUpdate,
     user_id: int = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    password_entry = get_password_entry_by_id(db, service_id, user_id)
+    password_entry = await get_password_entry_by_id(db, service_id, user_id)
 
     if not is_strong_password(update_data.password):
         raise HTTPException(
@@ -172,37 +270,60 @@ def update_password(
     password_entry.is_deleted = update_data.is_deleted
     password_entry.is_Favrout = update_data.is_Favrout
 
-    handle_db_operation(db, password_entry)
+    version = await bump_vault_version_async(db, password_entry.user_id)
+    await handle_db_operation(db, password_entry)
+    if password_entry.is_deleted:
+        search_index.remove(password_entry.user_id, version, password_entry.id)
+    else:
+        search_index.upsert(password_entry.user_id, version, password_entry.id, password_entry.title, password_entry.url, password_entry.username)
 
-    return {
-        "id": password_entry.id,
-        "user_id": password_entry.user_id,
-        "title": password_entry.title,
-        "url": password_entry.url,
-        "username": password_entry.username,
-        "notes": password_entry.notes,
-        "created_at": password_entry.created_at,
-        "updated_at": password_entry.updated_at,
-        "is_deleted": password_entry.is_deleted,
-        "is_Favrout": password_entry.is_Favrout
-    }
+    return PasswordEntrySummary.model_validate(password_entry)
+
+
+@router.post("/step-up")
+async def step_up(
+    data: StepUpRequest,
+    request: Request,
+    response: Response,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Check the master password once and issue a grant accepted by reveal/delete for STEP_UP_GRANT_MINUTES.
+
+    The grant is bound to the current access token and set as an HttpOnly
+    cookie; API clients may send it in the X-Step-Up-Grant header instead.
+    """
+    await validate_user_credentials(db, user_id, data.password)
+    grant = create_step_up_grant(request.cookies["access_token"], user_id)
+    max_age = int(Config.STEP_UP_GRANT_MINUTES * 60)
+    response.set_cookie(
+        key=STEP_UP_COOKIE,
+        value=grant,
+        httponly=True,
+        secure=False,
+        samesite="Lax",
+        max_age=max_age,
+        path="/api/v1"
+    )
+    return {"grant": grant, "expires_in": max_age}
 
 
 @router.post("/get-password")
-def get_password(
+async def get_password(
     data: Data,
+    request: Request,
     user_id: int = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = validate_user_credentials(db, user_id, data.password)
+    await authorize_sensitive_call(request, db, user_id, data.password)
 
-    password_entry = db.query(
+    password_entry = (await db.execute(select(
         PasswordEntry.id,
         PasswordEntry.encrypted_password
-    ).filter(
+    ).where(
         PasswordEntry.id == data.serviceID,
-        PasswordEntry.user_id == db_user.id
-    ).first()
+        PasswordEntry.user_id == user_id
+    ))).first()
 
     if not password_entry:
         raise HTTPException(
@@ -211,24 +332,76 @@ def get_password(
         )
 
     decrypted_password = decrypt_password(password_entry.encrypted_password)
+    await reencrypt_stale_entries(db, [(password_entry.id, password_entry.encrypted_password, decrypted_password)])
     return {
         "id": password_entry.id,
         "password": decrypted_password
     }
 
 
+@router.post("/get-passwords")
+async def get_passwords(
+    data: BatchReveal,
+    request: Request,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Reveal several passwords with one master-password check and one query.
+
+    Each requested id appears in either `results` or `errors`.
+    """
+    service_ids = list(dict.fromkeys(data.serviceIDs))  # De-duplicate, keep order
+    if not service_ids or len(service_ids) > Config.BATCH_REVEAL_MAX_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Request between 1 and {Config.BATCH_REVEAL_MAX_IDS} password entries."
+        )
+
+    await authorize_sensitive_call(request, db, user_id, data.password)
+
+    password_entries = (await db.execute(select(
+        PasswordEntry.id,
+        PasswordEntry.encrypted_password
+    ).where(
+        PasswordEntry.id.in_(service_ids),
+        PasswordEntry.user_id == user_id,
+        PasswordEntry.is_deleted == False
+    ))).all()
+    encrypted_by_id = {entry.id: entry.encrypted_password for entry in password_entries}
+
+    results = []
+    errors = []
+    revealed = []
+    for service_id in service_ids:
+        if service_id not in encrypted_by_id:
+            errors.append({"id": service_id, "detail": "Password entry not found."})
+            continue
+        try:
+            # decrypt_password shares one module-level key ring
+            password = decrypt_password(encrypted_by_id[service_id])
+        except InvalidToken:
+            errors.append({"id": service_id, "detail": "Password entry could not be decrypted."})
+            continue
+        results.append({"id": service_id, "password": password})
+        revealed.append((service_id, encrypted_by_id[service_id], password))
+
+    await reencrypt_stale_entries(db, revealed)
+    return {"results": results, "errors": errors}
+
+
 @router.delete("/delete-password")
-def delete_password(
+async def delete_password(
     data: Data,
+    request: Request,
     user_id: int = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_user = validate_user_credentials(db, user_id, data.password)
+    await authorize_sensitive_call(request, db, user_id, data.password)
 
-    password_entry = db.query(PasswordEntry).filter(
+    password_entry = await db.scalar(select(PasswordEntry).where(
         PasswordEntry.id == data.serviceID,
-        PasswordEntry.user_id == db_user.id
-    ).first()
+        PasswordEntry.user_id == user_id
+    ))
 
     if not password_entry:
         raise HTTPException(
@@ -237,17 +410,19 @@ def delete_password(
         )
 
     password_entry.is_deleted = True
-    db.commit()
+    version = await bump_vault_version_async(db, user_id)
+    await db.commit()
+    search_index.remove(user_id, version, password_entry.id)
 
     return {"detail": "Password entry marked as deleted successfully."}
 
 
 
-@router.post("/create-password")
-def create_password(
+@router.post("/create-password", response_model=PasswordEntrySummary)
+async def create_password(
     password_data: PasswordEntryCreate,
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     if not is_strong_password(password_data.password):
         raise HTTPException(
@@ -266,54 +441,145 @@ def create_password(
     )
 
     db.add(new_password_entry)
-    handle_db_operation(db, new_password_entry)
+    version = await bump_vault_version_async(db, user_id)
+    await handle_db_operation(db, new_password_entry)
+    search_index.upsert(
+        new_password_entry.user_id,
+        version,
+        new_password_entry.id,
+        new_password_entry.title,
+        new_password_entry.url,
+        new_password_entry.username
+    )
 
-    return {
-        "id": new_password_entry.id,
-        "user_id": new_password_entry.user_id,
-        "title": new_password_entry.title,
-        "url": new_password_entry.url,
-        "username": new_password_entry.username,
-        "notes": new_password_entry.notes,
-        "created_at": new_password_entry.created_at,
-        "updated_at": new_password_entry.updated_at,
-        "is_deleted": new_password_entry.is_deleted
-    }
+    return PasswordEntrySummary.model_validate(new_password_entry)
+
+
+def encode_cursor(sort: str, entry) -> str:
+    cursor = {"s": sort, "id": entry.id}
+    if sort == "updated_at":
+        cursor["u"] = entry.updated_at.isoformat()
+    return base64.urlsafe_b64encode(json.dumps(cursor).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> dict:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if data["s"] != sort:
+            raise ValueError("cursor was issued for a different sort")
+        if sort == "updated_at":
+            data["u"] = datetime.fromisoformat(data["u"])
+        return data
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor."
+        )
 
 
-@router.get("/passwords-list")
-def get_passwords_list(
-    user_id: str = Depends(get_current_user),
-    db: Session = Depends(get_db)
+@router.get("/passwords-list", response_model=list[PasswordEntrySummary])
+async def get_passwords_list(
+    request: Request,
+    limit: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    sort: Literal["id", "updated_at"] = "id",
+    favorites: bool | None = None,
+    prefix: str | None = Query(None, min_length=1, max_length=255),
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    password_entries = db.query(
-        PasswordEntry.id,
-        PasswordEntry.user_id,
-        PasswordEntry.title,
-        PasswordEntry.url,
-        PasswordEntry.username,
-        PasswordEntry.notes,
-        PasswordEntry.created_at,
-        PasswordEntry.updated_at,
-        PasswordEntry.is_deleted,
-        PasswordEntry.is_Favrout
-    ).filter(
+    """List the user's entries, optionally one keyset page at a time.
+
+    `sort=id` orders by id ascending; `sort=updated_at` orders by most recently
+    updated first, with id breaking ties. When `limit` is given and more rows
+    remain, the `X-Next-Cursor` response header holds the cursor for the next page.
+
+    The ETag combines the user's vault version with the query parameters, so
+    a matching If-None-Match is answered with 304 from one primary-key lookup.
+    """
+    version = await get_vault_version(db, user_id)
+    query_digest = hashlib.sha256(str(sorted(request.query_params.multi_items())).encode()).hexdigest()[:12]
+    etag = f'W/"{user_id}-{version}-{query_digest}"'
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    query = select(*SUMMARY_COLUMNS).where(
+        PasswordEntry.user_id == user_id,
+        PasswordEntry.is_deleted == False
+    )
+
+    if favorites is not None:
+        query = query.where(PasswordEntry.is_Favrout == favorites)
+    if prefix:
+        query = query.where(or_(
+            PasswordEntry.title.startswith(prefix, autoescape=True),
+            PasswordEntry.url.startswith(prefix, autoescape=True),
+            PasswordEntry.url.startswith(f"https://{prefix}", autoescape=True),
+            PasswordEntry.url.startswith(f"http://{prefix}", autoescape=True),
+        ))
+
+    if sort == "updated_at":
+        if cursor:
+            after = decode_cursor(cursor, sort)
+            query = query.where(tuple_(PasswordEntry.updated_at, PasswordEntry.id) < (after["u"], after["id"]))
+        query = query.order_by(PasswordEntry.updated_at.desc(), PasswordEntry.id.desc())
+    else:
+        if cursor:
+            query = query.where(PasswordEntry.id > decode_cursor(cursor, sort)["id"])
+        query = query.order_by(PasswordEntry.id)
+
+    if limit is not None:
+        limit = min(limit, Config.PASSWORD_LIST_MAX_LIMIT)
+        # Fetch one extra row to learn whether another page exists
+        password_entries = (await db.execute(query.limit(limit + 1))).all()
+        if len(password_entries) > limit:
+            password_entries = password_entries[:limit]
+            headers["X-Next-Cursor"] = encode_cursor(sort, password_entries[-1])
+    else:
+        password_entries = (await db.execute(query)).all()
+
+    return entry_list_response(password_entries, headers)
+
+
+@router.get("/search", response_model=list[PasswordEntrySummary])
+async def search_passwords(
+    q: str = Query(..., min_length=1, max_length=255),
+    limit: int = Query(20, ge=1, le=100),
+    fuzzy: bool = True,
+    user_id: int = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Search titles, URLs (including host and registrable domain) and usernames.
+
+    Served from the user's in-memory index, built on first use and rebuilt
+    when the vault version shows another worker wrote since; results are
+    best match first.
+    """
+    async def load_rows():
+        rows = await db.stream(select(
+            PasswordEntry.id,
+            PasswordEntry.title,
+            PasswordEntry.url,
+            PasswordEntry.username
+        ).where(
+            PasswordEntry.user_id == user_id,
+            PasswordEntry.is_deleted == False
+        ).execution_options(yield_per=1000))
+        async for row in rows:
+            yield row
+
+    version = await get_vault_version(db, user_id)
+    index = await search_index.get_or_build(user_id, version, load_rows)
+    matched_ids = index.search(q, limit, fuzzy)
+    if not matched_ids:
+        return []
+
+    password_entries = (await db.execute(select(*SUMMARY_COLUMNS).where(
+        PasswordEntry.id.in_(matched_ids),
         PasswordEntry.user_id == user_id,
         PasswordEntry.is_deleted == False
-    ).all()
-
-    return [
-        {
-            "id": entry.id,
-            "user_id": entry.user_id,
-            "title": entry.title,
-            "url": entry.url,
-            "is_Favrout": entry.is_Favrout,
-            "username": entry.username,
-            "notes": entry.notes,
-            "created_at": entry.created_at,
-            "updated_at": entry.updated_at,
-            "is_deleted": entry.is_deleted
-        }
-        for entry in password_entries
-    ]
\ No newline at end of file
+    ))).all()
+    entries_by_id = {entry.id: entry for entry in password_entries}
+
+    return entry_list_response([entries_by_id[entry_id] for entry_id in matched_ids if entry_id in entries_by_id])
@@ -1,37 +1,150 @@
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
+from functools import lru_cache
+import math
 import re
 import random
 import string
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
 from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 import secrets
-from cryptography.fernet import Fernet
 from config import Config
+from models.models import User
+from utils.crypto_pool import crypto_pool
+from utils.encryption_keys import encryption_keys
+from utils.logger import logger
+from utils.user_cache import UserAuthRecord, user_auth_cache
+from utils.mailer import build_email_message, open_smtp_connection
+from utils.metrics import observe
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 
-cipher_suite = Fernet(Config.ENCRYPTION_KEY.encode())
-
 def encrypt_password(password: str) -> str:
-    """Encrypt a password."""
-    return cipher_suite.encrypt(password.encode()).decode()
+    """Encrypt a password under the current key, tagged with its key id."""
+    with observe("fernet_encrypt"):
+        return encryption_keys.encrypt(password.encode())
 
 def decrypt_password(encrypted_password: str) -> str:
-    """Decrypt a password."""
-    return cipher_suite.decrypt(encrypted_password.encode()).decode()
+    """Decrypt a password with whichever key in the ring produced it."""
+    with observe("fernet_decrypt"):
+        return encryption_keys.decrypt(encrypted_password).decode()
+
+
+_bcrypt_rounds = None
+_bcrypt_rounds_lock = threading.Lock()
+
+
+def calibrate_bcrypt_rounds(target_ms: float, min_rounds: int = 4, max_rounds: int = 20) -> int:
+    """Highest bcrypt cost whose hash takes at most `target_ms` on this machine (never below `min_rounds`).
+
+    Each extra round doubles the work, so one timing at a cheap cost predicts
+    the rest; the prediction is then measured and stepped down while over budget.
+    """
+    def hash_ms(rounds: int) -> float:
+        handler = bcrypt.using(rounds=rounds)
+        start = time.perf_counter()
+        handler.hash("calibration")
+        return (time.perf_counter() - start) * 1000
+
+    base_rounds = 8
+    base_ms = min(hash_ms(base_rounds) for _ in range(3))
+    rounds = base_rounds + math.floor(math.log2(target_ms / base_ms))
+    rounds = max(min_rounds, min(rounds, max_rounds))
+    while rounds > min_rounds and hash_ms(rounds) > target_ms:
+        rounds -= 1
+    return rounds
+
+
+def bcrypt_rounds() -> int:
+    """BCRYPT_ROUNDS, or the cost calibrated against BCRYPT_TARGET_MS on first use."""
+    global _bcrypt_rounds
+    if _bcrypt_rounds is None:
+        with _bcrypt_rounds_lock:
+            if _bcrypt_rounds is None:
+                if Config.BCRYPT_ROUNDS:
+                    _bcrypt_rounds = Config.BCRYPT_ROUNDS
+                else:
+                    _bcrypt_rounds = calibrate_bcrypt_rounds(Config.BCRYPT_TARGET_MS, Config.BCRYPT_MIN_ROUNDS)
+                    logger.info(f"Calibrated bcrypt cost: {_bcrypt_rounds} rounds for a {Config.BCRYPT_TARGET_MS:.0f} ms target")
+    return _bcrypt_rounds
+
+
+def bcrypt_rehash_bounds() -> tuple[int, int | None]:
+    """Costs outside which a stored hash is re-hashed, as (min, max or None).
+
+    A pinned BCRYPT_ROUNDS is exact: hashes above it are re-hashed down as
+    well as hashes below it up. A calibrated cost only sets a floor
+    (BCRYPT_MIN_ROUNDS), never "any other cost": workers that calibrate to
+    different costs would otherwise keep re-hashing each other's users on
+    every login.
+    """
+    if Config.BCRYPT_ROUNDS:
+        return Config.BCRYPT_ROUNDS, Config.BCRYPT_ROUNDS
+    return Config.BCRYPT_MIN_ROUNDS, None
+
 
+@lru_cache
+def bcrypt_context(rounds: int, min_rounds: int, max_rounds: int | None = None) -> CryptContext:
+    """Context that hashes at `rounds` and flags costs outside `min_rounds`..`max_rounds` (or an old ident) as needing an update."""
+    options = {"bcrypt__default_rounds": rounds, "bcrypt__min_rounds": min(min_rounds, rounds)}
+    if max_rounds is not None:
+        options["bcrypt__max_rounds"] = max(max_rounds, rounds)
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", **options)
 
-def hash_password(password: str) -> str:
-    """Hash a password."""
-    return pwd_context.hash(password)
+
+def hash_password(password: str, rounds: int | None = None) -> str:
+    """Hash a password at `rounds`, by default the configured bcrypt cost.
+
+    Pool workers get `rounds` passed in, so they never calibrate on their own.
+    """
+    rounds = rounds or bcrypt_rounds()
+    return bcrypt_context(rounds, rounds).hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made outside the allowed bcrypt costs (see `bcrypt_rehash_bounds`)."""
+    return bcrypt_context(bcrypt_rounds(), *bcrypt_rehash_bounds()).needs_update(hashed_password)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the crypto pool without blocking the event loop."""
+    return await crypto_pool.run_async("hash_password", hash_password, password, bcrypt_rounds())
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the crypto pool without blocking the event loop."""
+    return await crypto_pool.run_async("verify_password", verify_password, plain_password, hashed_password)
+
+async def rehash_password_if_needed(db: AsyncSession, db_user: UserAuthRecord, plain_password: str):
+    """After a successful verify, re-hash a password stored outside the allowed bcrypt costs.
+
+    Stored hashes are moved to the current cost as users log in, with no forced
+    resets. The UPDATE only applies if the hash is unchanged (a concurrent
+    reset wins), and a failure never fails the login.
+    """
+    old_hash = db_user.hashed_password
+    if not password_needs_rehash(old_hash):
+        return
+    try:
+        new_hash = await hash_password_async(plain_password)
+        users = User.__table__
+        await db.execute(
+            update(users)
+            .where(users.c.id == db_user.id, users.c.hashed_password == old_hash)
+            .values(hashed_password=new_hash, updated_at=users.c.updated_at)
+        )
+        await db.commit()
+        user_auth_cache.invalidate(db_user.id)
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"Re-hashing the password of user {db_user.id} failed: {e}")
+
 
 
 def is_strong_password(password: str) -> bool:
@@ -122,25 +235,17 @@ def generate_otp(digit: int = 6) -> str:
 
 
 def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
+    """Send an email synchronously on a fresh connection.
 
+    Request handlers should use `utils.mailer.queue_email` instead.
+    """
     try:
         # Create the email
-        msg = MIMEMultipart()
-        msg["From"] = Config.SMTP_USERNAME
-        msg["To"] = to_email
-        msg["Subject"] = subject
-
-        # Attach the body of the email
-        if is_html:
-            msg.attach(MIMEText(body, "html"))  # Use "html" subtype for HTML content
-        else:
-            msg.attach(MIMEText(body, "plain"))  # Use "plain" subtype for plain text
+        msg = build_email_message(to_email, subject, body, is_html)
 
         # Connect to the SMTP server
-        with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
-            server.starttls()  # Upgrade the connection to secure
-            server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)  # Log in to the SMTP server
-            server.sendmail(Config.SMTP_USERNAME, to_email, msg.as_string())  # Send the email
+        with observe("send_email"), open_smtp_connection() as server:
+            server.sendmail(Config.MAIL_FROM, to_email, msg.as_string())  # Send the email
 
         return {"message": "Email sent successfully!"}
     except Exception as e:
@@ -155,13 +260,3 @@ def send_email(to_email: str, subject: str, body: str, is_html: bool = False):
 def generate_reset_token() -> str:
     """Generate a secure, random token for password reset."""
     return secrets.token_urlsafe(32)  
-
-def hash_token(token: str) -> str:
-    """Hash a token using bcrypt."""
-    return pwd_context.hash(token)
-
-def verify_hash_token(plain_token: str, hashed_token: str) -> bool:
-    """Verify a token against its hashed version using bcrypt."""
-    return pwd_context.verify(plain_token, hashed_token)
-
-
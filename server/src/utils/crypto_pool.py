@@ -0,0 +1,120 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from fastapi import HTTPException, status
+from config import Config
+from utils.logger import logger
+from utils.metrics import CRYPTO_POOL_REJECTED, CRYPTO_POOL_WAIT, OPERATION_DURATION
+
+
+def _timed_call(fn, *args):
+    """Run `fn` in the worker and report how long the call itself took."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+class CryptoPool:
+    """Dedicated, bounded executor for slow crypto (bcrypt, PBKDF2, bulk Fernet).
+
+    At most `size` calls run at once and at most `max_queue` more may wait;
+    anything beyond that is rejected immediately with a 503 instead of
+    piling up behind a login storm. Functions submitted to a process-backed
+    pool must be importable top-level functions.
+    """
+
+    def __init__(self, size: int, kind: str = "thread", max_queue: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError("CRYPTO_POOL_KIND must be 'thread' or 'process'.")
+        self.size = size
+        self.kind = kind
+        self.max_queue = max_queue
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stats = {}
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.kind == "process":
+                        self._executor = ProcessPoolExecutor(max_workers=self.size)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="crypto")
+                    logger.info(f"Crypto pool started: {self.kind} x{self.size}, max queue {self.max_queue}")
+        return self._executor
+
+    def _primitive_stats(self, name: str) -> dict:
+        return self._stats.setdefault(name, {
+            "count": 0,
+            "rejected": 0,
+            "run_seconds_total": 0.0,
+            "run_seconds_max": 0.0,
+            "wait_seconds_total": 0.0,
+        })
+
+    def _reserve(self, name: str):
+        with self._lock:
+            if self._pending >= self.size + self.max_queue:
+                self._primitive_stats(name)["rejected"] += 1
+                CRYPTO_POOL_REJECTED.labels(name).inc()
+                logger.warning(f"Crypto pool saturated, rejecting {name}")
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy, please retry shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+
+    def _release(self, name: str, started: float, run_seconds: float | None):
+        total = time.perf_counter() - started
+        with self._lock:
+            self._pending -= 1
+            if run_seconds is None:
+                return
+            wait_seconds = max(total - run_seconds, 0.0)
+            stats = self._primitive_stats(name)
+            stats["count"] += 1
+            stats["run_seconds_total"] += run_seconds
+            stats["run_seconds_max"] = max(stats["run_seconds_max"], run_seconds)
+            stats["wait_seconds_total"] += wait_seconds
+        OPERATION_DURATION.labels(name).observe(run_seconds)
+        CRYPTO_POOL_WAIT.labels(name).observe(wait_seconds)
+
+    async def run_async(self, name: str, fn, *args):
+        """Run `fn(*args)` on the pool without blocking the event loop."""
+        self._reserve(name)
+        started = time.perf_counter()
+        run_seconds = None
+        try:
+            loop = asyncio.get_running_loop()
+            run_seconds, result = await loop.run_in_executor(self._get_executor(), _timed_call, fn, *args)
+            return result
+        finally:
+            self._release(name, started, run_seconds)
+
+    def stats(self) -> dict:
+        """Snapshot of pool occupancy and per-primitive timings."""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "size": self.size,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "primitives": {name: dict(values) for name, values in self._stats.items()},
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+crypto_pool = CryptoPool(
+    size=Config.CRYPTO_POOL_SIZE or os.cpu_count() or 1,
+    kind=Config.CRYPTO_POOL_KIND,
+    max_queue=Config.CRYPTO_POOL_MAX_QUEUE,
+)
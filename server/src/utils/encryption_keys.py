@@ -0,0 +1,65 @@
+import hashlib
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from config import Config
+
+SEPARATOR = "$"  # Never appears in a Fernet token (urlsafe base64)
+
+
+def fingerprint(key: str) -> str:
+    """Short, stable id for a Fernet key, stored in front of every ciphertext it produced."""
+    return hashlib.sha256(key.encode()).hexdigest()[:8]
+
+
+class EncryptionKeyRing:
+    """Versioned Fernet keys for stored passwords.
+
+    Ciphertexts are stored as `<key id>$<fernet token>`, where the key id is
+    the key's fingerprint. The first key encrypts; every key in the ring
+    decrypts. Tokens written before key ids existed carry no prefix and are
+    tried against every key, as MultiFernet does.
+
+    To rotate, put the new key first and keep the old ones after it: rows are
+    re-encrypted as they are read or written (see `needs_rotation`), or in
+    bulk by jobs/reencrypt.py, and an old key can be dropped once no row
+    uses it.
+    """
+
+    def __init__(self, keys: list):
+        if not keys:
+            raise ValueError("At least one encryption key is required.")
+        self._fernets = {fingerprint(key): Fernet(key.encode()) for key in keys}
+        self.current_id = fingerprint(keys[0])
+        self._current = self._fernets[self.current_id]
+        self._legacy = MultiFernet(list(self._fernets.values()))
+
+    @classmethod
+    def from_config(cls):
+        keys = Config.ENCRYPTION_KEYS.split(",") if Config.ENCRYPTION_KEYS else [Config.ENCRYPTION_KEY]
+        return cls([key.strip() for key in keys if key.strip()])
+
+    @staticmethod
+    def key_id(stored: str) -> str | None:
+        key_id, separator, _ = stored.partition(SEPARATOR)
+        return key_id if separator else None
+
+    def encrypt(self, data: bytes) -> str:
+        return f"{self.current_id}{SEPARATOR}{self._current.encrypt(data).decode()}"
+
+    def decrypt(self, stored: str) -> bytes:
+        key_id, separator, token = stored.partition(SEPARATOR)
+        if not separator:
+            return self._legacy.decrypt(stored.encode())
+        fernet = self._fernets.get(key_id)
+        if fernet is None:
+            raise InvalidToken(f"Unknown encryption key id: {key_id}")
+        return fernet.decrypt(token.encode())
+
+    def needs_rotation(self, stored: str) -> bool:
+        return self.key_id(stored) != self.current_id
+
+    def rotate(self, stored: str) -> str:
+        """Re-encrypt `stored` under the current key."""
+        return self.encrypt(self.decrypt(stored))
+
+
+encryption_keys = EncryptionKeyRing.from_config()
@@ -0,0 +1,137 @@
+"""Framed, chunked encryption format for streaming vault exports.
+
+Layout::
+
+    header  = MAGIC (4) | salt (16) | nonce prefix (7)
+    frame   = length (4, big endian) | AES-256-GCM ciphertext + tag
+
+Every frame is sealed under one PBKDF2-derived key with the nonce
+`prefix | counter (4) | last flag (1)` and the header as associated data,
+so frames can't be reordered, dropped, or truncated from the end without
+failing authentication. The last frame carries the flag and may be empty.
+"""
+import os
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b"PMX1"
+SALT_SIZE = 16
+NONCE_PREFIX_SIZE = 7
+HEADER_SIZE = len(MAGIC) + SALT_SIZE + NONCE_PREFIX_SIZE
+TAG_SIZE = 16
+MAX_COUNTER = 2 ** 32 - 1
+
+
+class ExportFormatError(ValueError):
+    pass
+
+
+def _nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    if counter > MAX_COUNTER:
+        raise ExportFormatError("Too many chunks in one export.")
+    return prefix + struct.pack(">IB", counter, 1 if last else 0)
+
+
+def is_chunked_export(data: bytes) -> bool:
+    return data[:len(MAGIC)] == MAGIC
+
+
+class StreamEncryptor:
+    def __init__(self, key: bytes, salt: bytes):
+        self._aead = AESGCM(key)
+        self._prefix = os.urandom(NONCE_PREFIX_SIZE)
+        self.header = MAGIC + salt + self._prefix
+        self._counter = 0
+
+    def encrypt_chunk(self, data: bytes, last: bool = False) -> bytes:
+        ciphertext = self._aead.encrypt(_nonce(self._prefix, self._counter, last), data, self.header)
+        self._counter += 1
+        return struct.pack(">I", len(ciphertext)) + ciphertext
+
+
+def encrypt_stream(key: bytes, salt: bytes, pieces, chunk_size: int):
+    """Encrypt an iterable of byte strings into header + fixed-size frames.
+
+    Only one chunk of plaintext is buffered at a time, however long `pieces` is.
+    """
+    encryptor = StreamEncryptor(key, salt)
+    yield encryptor.header
+
+    buffer = bytearray()
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= chunk_size:
+            yield encryptor.encrypt_chunk(bytes(buffer[:chunk_size]))
+            del buffer[:chunk_size]
+    yield encryptor.encrypt_chunk(bytes(buffer), last=True)
+
+
+class StreamDecryptor:
+    """Incremental decryptor: `feed` bytes in, get plaintext chunks out.
+
+    The key is derived from the salt in the header, so callers read `salt`
+    once `header_ready` is true and then call `set_key` before more plaintext
+    is returned.
+    """
+
+    def __init__(self, max_frame_size: int = 16 * 1024 * 1024):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._header = None
+        self._aead = None
+        self._counter = 0
+        self.finished = False
+
+    @property
+    def header_ready(self) -> bool:
+        return self._header is not None
+
+    @property
+    def salt(self) -> bytes:
+        return self._header[len(MAGIC):len(MAGIC) + SALT_SIZE]
+
+    def set_key(self, key: bytes):
+        self._aead = AESGCM(key)
+
+    def feed(self, data: bytes) -> list:
+        self._buffer += data
+        if self._header is None:
+            if len(self._buffer) < HEADER_SIZE:
+                return []
+            if not is_chunked_export(self._buffer):
+                raise ExportFormatError("Not a chunked export file.")
+            self._header = bytes(self._buffer[:HEADER_SIZE])
+            del self._buffer[:HEADER_SIZE]
+        if self._aead is None:
+            return []
+
+        plaintext = []
+        while len(self._buffer) >= 4:
+            if self.finished:
+                raise ExportFormatError("Unexpected data after the final chunk.")
+            (length,) = struct.unpack(">I", self._buffer[:4])
+            if length < TAG_SIZE or length > self.max_frame_size:
+                raise ExportFormatError("Corrupt chunk length.")
+            if len(self._buffer) < 4 + length:
+                break
+            frame = bytes(self._buffer[4:4 + length])
+            del self._buffer[:4 + length]
+            plaintext.append(self._open(frame))
+        return plaintext
+
+    def _open(self, frame: bytes) -> bytes:
+        prefix = self._header[-NONCE_PREFIX_SIZE:]
+        for last in (False, True):
+            try:
+                data = self._aead.decrypt(_nonce(prefix, self._counter, last), frame, self._header)
+            except InvalidTag:
+                continue
+            self._counter += 1
+            self.finished = last
+            return data
+        raise ExportFormatError("Chunk failed authentication (wrong passphrase or corrupted file).")
+
+    def close(self):
+        if not self.finished or self._buffer:
+            raise ExportFormatError("Export file is truncated.")
@@ -0,0 +1,74 @@
+import codecs
+import json
+
+
+class JSONArrayParser:
+    """Incremental parser for a top-level JSON array.
+
+    Bytes are fed in arbitrary pieces and complete elements come out as
+    soon as they have been read, so only the current element is ever
+    buffered. Elements larger than `max_element_size` characters are
+    rejected rather than buffered forever.
+    """
+
+    _WHITESPACE = " \t\r\n"
+
+    def __init__(self, max_element_size: int = 1024 * 1024):
+        self.max_element_size = max_element_size
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = "start"  # start -> first -> (value -> next)* -> done
+        self.done = False
+
+    def _skip_whitespace(self, pos: int) -> int:
+        while pos < len(self._buffer) and self._buffer[pos] in self._WHITESPACE:
+            pos += 1
+        return pos
+
+    def feed(self, data: bytes) -> list:
+        self._buffer += self._text.decode(data)
+        items = []
+        pos = self._skip_whitespace(0)
+
+        while pos < len(self._buffer) and self._state != "done":
+            char = self._buffer[pos]
+            if self._state == "start":
+                if char != "[":
+                    raise ValueError("Expected a JSON array.")
+                self._state = "first"
+                pos += 1
+            elif char == "]" and self._state in ("first", "next"):
+                self._state = "done"
+                pos += 1
+            elif self._state == "next":
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' but found {char!r}.")
+                self._state = "value"
+                pos += 1
+            else:
+                try:
+                    item, end = self._decoder.raw_decode(self._buffer, pos)
+                except json.JSONDecodeError:
+                    # Most likely the element is split across feeds; wait for more data.
+                    if len(self._buffer) - pos > self.max_element_size:
+                        raise ValueError("JSON element is too large or malformed.")
+                    break
+                if end == len(self._buffer) and not isinstance(item, (dict, list, str)):
+                    # A number or literal at the very end may continue in the next feed.
+                    break
+                pos = end
+                items.append(item)
+                self._state = "next"
+            pos = self._skip_whitespace(pos)
+
+        self._buffer = self._buffer[pos:]
+        self.done = self._state == "done"
+        if self.done and self._buffer.strip():
+            raise ValueError("Unexpected data after the JSON array.")
+        return items
+
+    def close(self):
+        self._buffer += self._text.decode(b"", final=True)
+        if not self.done:
+            raise ValueError("JSON array is incomplete or malformed.")
@@ -1,8 +1,18 @@
 import jwt
+import base64
 import datetime
+import hashlib
+import os
+import secrets
+import threading
+import time
+from cachetools import TLRUCache
 from cryptography.hazmat.primitives import serialization
-from typing import Union
+from typing import NamedTuple, Union
 from config import Config
+from utils.logger import logger
+from utils.signing_keys import JWT_ALGORITHMS, algorithm_for_key, key_id
+from utils.metrics import observe
 
 
 
@@ -19,6 +29,157 @@ def load_public_key(file_path: str):
             key_file.read()
         )
 
+
+class SigningKey(NamedTuple):
+    kid: str
+    key: object
+    algorithm: str
+
+
+class VerificationKey(NamedTuple):
+    key: object
+    algorithm: str
+
+
+class KeyRing:
+    """Holds the signing key and every active verification key, indexed by kid.
+
+    Keys are parsed once and kept in memory. The PEM files are re-checked at
+    most every `reload_interval` seconds and re-read only when their mtime
+    changes; `request_reload()` (wired to SIGHUP in main.py) forces a re-read
+    on the next access.
+
+    Each key's algorithm follows from its type (RSA, P-256 or Ed25519), so
+    verification keys of different types can be active together while the
+    signing algorithm is migrated. If `algorithm` is given, the private key
+    must be of the matching type.
+    """
+
+    def __init__(self, private_key_path: str, public_key_paths: list[str], reload_interval: float = 30.0,
+                 algorithm: Union[str, None] = None):
+        if algorithm and algorithm not in JWT_ALGORITHMS:
+            raise ValueError(f"Unknown JWT_ALGORITHM: {algorithm} (choose from {', '.join(JWT_ALGORITHMS)})")
+        self.private_key_path = private_key_path
+        self.public_key_paths = public_key_paths
+        self.reload_interval = reload_interval
+        self.algorithm = algorithm
+        self._lock = threading.Lock()
+        self._mtimes = None
+        self._next_check = 0.0
+        self._force_reload = True
+        self._signing_key = None
+        self._verification_keys = {}
+        self._listeners = []
+
+    def request_reload(self):
+        """Force the key files to be re-read on the next access."""
+        self._force_reload = True
+
+    def on_reload(self, callback):
+        """Register a callback run after the key set changes."""
+        self._listeners.append(callback)
+
+    def _current_mtimes(self):
+        paths = [self.private_key_path, *self.public_key_paths]
+        return tuple(os.stat(path).st_mtime_ns for path in paths)
+
+    def _load(self):
+        private_key = load_private_key(self.private_key_path)
+        algorithm = algorithm_for_key(private_key)
+        if self.algorithm and algorithm != self.algorithm:
+            raise ValueError(f"JWT_ALGORITHM is {self.algorithm} but {self.private_key_path} is an {algorithm} key")
+
+        verification_keys = {}
+        for path in self.public_key_paths:
+            public_key = load_public_key(path)
+            verification_keys[key_id(public_key)] = VerificationKey(public_key, algorithm_for_key(public_key))
+
+        # The signing key's own public half is always accepted for verification.
+        signing_kid = key_id(private_key.public_key())
+        verification_keys.setdefault(signing_kid, VerificationKey(private_key.public_key(), algorithm))
+
+        self._signing_key = SigningKey(signing_kid, private_key, algorithm)
+        self._verification_keys = verification_keys
+        logger.info(f"JWT key ring loaded: signing kid={signing_kid} ({algorithm}), verification kids="
+                    f"{ {kid: key.algorithm for kid, key in sorted(verification_keys.items())} }")
+
+    def _refresh(self):
+        now = time.monotonic()
+        if not self._force_reload and now < self._next_check:
+            return
+        with self._lock:
+            if not self._force_reload and now < self._next_check:
+                return
+            self._next_check = now + self.reload_interval
+            mtimes = self._current_mtimes()
+            if not self._force_reload and mtimes == self._mtimes:
+                return
+            self._force_reload = False
+            self._load()
+            self._mtimes = mtimes
+        for callback in self._listeners:
+            callback()
+
+    def signing_key(self) -> SigningKey:
+        """Return the key (with its kid and algorithm) used to sign new tokens."""
+        self._refresh()
+        return self._signing_key
+
+    def verification_key(self, kid: Union[str, None], algorithm: Union[str, None] = None) -> list[VerificationKey]:
+        """Return the key for `kid`, or every active key for `algorithm` when kid is absent."""
+        self._refresh()
+        if kid is None:
+            return [key for key in self._verification_keys.values() if key.algorithm == algorithm]
+        key = self._verification_keys.get(kid)
+        return [key] if key is not None else []
+
+
+def _parse_paths(value: Union[str, None]) -> list[str]:
+    return [path.strip() for path in (value or "").split(",") if path.strip()]
+
+
+key_ring = KeyRing(
+    Config.PRIVATE_KEY_PATH,
+    [Config.PUBLIC_KEY_PATH, *_parse_paths(Config.JWT_VERIFY_KEY_PATHS)],
+    reload_interval=Config.JWT_KEY_RELOAD_INTERVAL_SECONDS,
+    algorithm=Config.JWT_ALGORITHM,
+)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU cache of already-verified token payloads.
+
+    An entry lives until the earlier of the token's `exp` claim and the
+    configured TTL, so a cached token never outlives its signature validity.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cache = TLRUCache(maxsize=maxsize, ttu=self._time_to_use, timer=time.time)
+
+    def _time_to_use(self, _token, payload, now):
+        return min(payload.get("exp", now), now + self.ttl)
+
+    def get(self, token: str):
+        with self._lock:
+            payload = self._cache.get(token)
+        return dict(payload) if payload is not None else None
+
+    def put(self, token: str, payload: dict):
+        with self._lock:
+            self._cache[token] = dict(payload)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+token_cache = VerifiedTokenCache(Config.TOKEN_CACHE_SIZE, Config.TOKEN_CACHE_TTL_SECONDS)
+# A rotation may retire a verification key, so drop payloads verified under the old set.
+key_ring.on_reload(token_cache.clear)
+
+
 def create_access_token(data: dict, expires_delta: Union[datetime.timedelta, None] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -29,20 +190,76 @@ def create_access_token(data: dict, expires_delta: Union[datetime.timedelta, Non
         expire = datetime.datetime.utcnow() + datetime.timedelta(hours=Config.ACCESS_TOKEN_EXPIRE_HOURS)
 
     to_encode.update({"exp": expire})
-    private_key = load_private_key(Config.PRIVATE_KEY_PATH)
-    encoded_jwt = jwt.encode(to_encode, private_key, algorithm="RS256")
+    # A unique id lets logout revoke this one token (see utils.revocation)
+    to_encode.setdefault("jti", secrets.token_urlsafe(16))
+    signing_key = key_ring.signing_key()
+    with observe("jwt_sign"):
+        encoded_jwt = jwt.encode(to_encode, signing_key.key, algorithm=signing_key.algorithm, headers={"kid": signing_key.kid})
     return encoded_jwt
 
 def decode_access_token(token: str):
-    public_key = load_public_key(Config.PUBLIC_KEY_PATH)
-    try:
-        # Decode the token using the public key and RS256 algorithm
-        payload = jwt.decode(token, public_key, algorithms=["RS256"])
+    payload = token_cache.get(token)
+    if payload is not None:
         return payload
+
+    try:
+        header = jwt.get_unverified_header(token)
+        kid = header.get("kid")
+        public_keys = key_ring.verification_key(kid, header.get("alg"))
+        if not public_keys:
+            raise jwt.InvalidTokenError(f"Unknown key id: {kid}")
+
+        with observe("jwt_verify"):
+            # Tokens issued before kids were added carry none, so try every active key of the header's algorithm.
+            # Each key only verifies with its own algorithm, whatever the header claims.
+            for public_key in public_keys[:-1]:
+                try:
+                    payload = jwt.decode(token, public_key.key, algorithms=[public_key.algorithm])
+                    break
+                except jwt.InvalidSignatureError:
+                    continue
+            else:
+                payload = jwt.decode(token, public_keys[-1].key, algorithms=[public_keys[-1].algorithm])
     except jwt.ExpiredSignatureError:
-        print("Token has expired")
+        logger.debug("Rejected an expired access token")
         raise
     except jwt.InvalidTokenError:
-        print("Invalid token")
+        logger.debug("Rejected an invalid access token")
         raise
 
+    token_cache.put(token, payload)
+    return payload
+
+
+STEP_UP_AUDIENCE = "step-up"
+STEP_UP_COOKIE = "step_up_grant"
+
+
+def access_token_hash(access_token: str) -> str:
+    """`ath` claim binding a step-up grant to one access token (as in DPoP, RFC 9449)."""
+    return base64.urlsafe_b64encode(hashlib.sha256(access_token.encode()).digest()).rstrip(b"=").decode()
+
+
+def create_step_up_grant(access_token: str, user_id: int) -> str:
+    """Short-lived HS256 grant proving the master password was checked for this session.
+
+    Signed with SECRET_KEY: only this service issues and checks it, and an
+    HMAC verify costs microseconds next to bcrypt or a public-key signature.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return jwt.encode({
+        "sub": str(user_id),
+        "aud": STEP_UP_AUDIENCE,
+        "ath": access_token_hash(access_token),
+        "iat": now,
+        "exp": now + datetime.timedelta(minutes=Config.STEP_UP_GRANT_MINUTES),
+    }, Config.SECRET_KEY, algorithm="HS256")
+
+
+def verify_step_up_grant(grant: str, access_token: str, user_id: int | str) -> bool:
+    """True if `grant` is unexpired and was issued to this user for this access token."""
+    try:
+        payload = jwt.decode(grant, Config.SECRET_KEY, algorithms=["HS256"], audience=STEP_UP_AUDIENCE)
+    except jwt.InvalidTokenError:
+        return False
+    return payload.get("sub") == str(user_id) and payload.get("ath") == access_token_hash(access_token)
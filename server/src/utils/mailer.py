@@ -0,0 +1,364 @@
+import glob
+import heapq
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+import uuid
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from cryptography.fernet import InvalidToken
+from config import Config
+from utils.encryption_keys import encryption_keys
+from utils.logger import logger
+from utils.metrics import observe
+
+
+def build_email_message(to_email: str, subject: str, body: str, is_html: bool = False) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = Config.MAIL_FROM
+    msg["To"] = to_email
+    msg["Subject"] = subject
+
+    # Attach the body of the email
+    if is_html:
+        msg.attach(MIMEText(body, "html"))  # Use "html" subtype for HTML content
+    else:
+        msg.attach(MIMEText(body, "plain"))  # Use "plain" subtype for plain text
+    return msg
+
+
+def open_smtp_connection() -> smtplib.SMTP:
+    """Connect, upgrade to TLS and log in using the SMTP settings from Config."""
+    server = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT, timeout=Config.SMTP_TIMEOUT_SECONDS)
+    try:
+        if Config.SMTP_USE_TLS:
+            server.starttls()  # Upgrade the connection to secure
+        if Config.SMTP_USERNAME and Config.SMTP_PASSWORD:
+            server.login(Config.SMTP_USERNAME, Config.SMTP_PASSWORD)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+class SMTPConnectionPool:
+    """Keeps up to `size` logged-in SMTP connections open for reuse.
+
+    Connections idle for longer than `idle_timeout` are closed instead of
+    reused, since most servers drop them on their own.
+    """
+
+    def __init__(self, size: int, idle_timeout: float, connect=open_smtp_connection):
+        self.idle_timeout = idle_timeout
+        self._connect = connect
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+
+    def acquire(self) -> smtplib.SMTP:
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn, last_used = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._connect()
+                if time.monotonic() - last_used < self.idle_timeout:
+                    return conn
+                self._quit(conn)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: smtplib.SMTP, broken: bool = False):
+        if broken:
+            self._quit(conn)
+        else:
+            self._idle.put((conn, time.monotonic()))
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._quit(conn)
+
+    @staticmethod
+    def _quit(conn: smtplib.SMTP):
+        try:
+            conn.quit()
+        except Exception:
+            conn.close()
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class MailDispatcher:
+    """Background mail queue backed by a durable on-disk spool.
+
+    `enqueue` writes the message to `spool_dir` and returns immediately.
+    Worker threads take ready messages in batches, send each batch over one
+    pooled connection, and retry failures with exponential backoff. Before a
+    send a worker claims the spool file by renaming it, so several processes
+    sharing one spool never send the same message twice. Mail still queued
+    at shutdown stays in the spool and is picked up on the next start.
+
+    Messages carry OTPs and reset links, so spool files are encrypted with
+    the Fernet key ring and kept owner-only. A file is deleted once its
+    message is sent; messages that failed for good are kept in `failed/`
+    for `failed_retention` seconds and then removed by `purge_failed`.
+    """
+
+    STALE_CLAIM_SECONDS = 600
+
+    def __init__(self, pool: SMTPConnectionPool, spool_dir: str, workers: int = 2, batch_size: int = 20,
+                 max_attempts: int = 5, backoff: float = 2.0, max_backoff: float = 300.0,
+                 failed_retention: float = 86400.0, cipher=encryption_keys):
+        self.pool = pool
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failed_retention = failed_retention
+        self._cipher = cipher
+        self._cond = threading.Condition()
+        self._heap = []  # (next_attempt_at, message id)
+        self._in_flight = 0
+        self._running = False
+        self._threads = []
+        self._spool_ready = False
+
+    def _path(self, message_id: str) -> str:
+        return os.path.join(self.spool_dir, f"{message_id}.json")
+
+    def _failed_dir(self) -> str:
+        return os.path.join(self.spool_dir, "failed")
+
+    def _ensure_spool(self):
+        if not self._spool_ready:
+            os.makedirs(self._failed_dir(), mode=0o700, exist_ok=True)
+            # makedirs leaves existing directories alone and is subject to the umask
+            os.chmod(self.spool_dir, 0o700)
+            os.chmod(self._failed_dir(), 0o700)
+            self._spool_ready = True
+
+    def _write(self, path: str, message: dict):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(self._cipher.encrypt(json.dumps(message).encode()))
+        os.replace(tmp_path, path)
+
+    def _read(self, path: str) -> dict:
+        with open(path) as f:
+            stored = f.read()
+        if stored.startswith("{"):
+            return json.loads(stored)  # Spooled before the spool was encrypted
+        try:
+            return json.loads(self._cipher.decrypt(stored))
+        except InvalidToken as e:
+            raise ValueError(f"Cannot decrypt spooled message {path}") from e
+
+    def _schedule(self, message_id: str, at: float):
+        with self._cond:
+            heapq.heappush(self._heap, (at, message_id))
+            self._cond.notify_all()
+
+    def enqueue(self, to_email: str, subject: str, body: str, is_html: bool = False) -> str:
+        self._ensure_spool()
+        message_id = uuid.uuid4().hex
+        message = {
+            "id": message_id,
+            "to": to_email,
+            "subject": subject,
+            "body": body,
+            "is_html": is_html,
+            "attempts": 0,
+            "next_attempt_at": time.time(),
+        }
+        self._write(self._path(message_id), message)
+        self._schedule(message_id, message["next_attempt_at"])
+        return message_id
+
+    def _load_spool(self):
+        now = time.time()
+        for path in glob.glob(os.path.join(self.spool_dir, "*.json.claimed")):
+            # Left behind by a process that died mid-send
+            if now - os.path.getmtime(path) > self.STALE_CLAIM_SECONDS:
+                try:
+                    os.replace(path, path[:-len(".claimed")])
+                except FileNotFoundError:
+                    pass
+        for path in glob.glob(os.path.join(self.spool_dir, "*.json")):
+            try:
+                message = self._read(path)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Mail spool: skipping {os.path.basename(path)}: {e}")
+                continue
+            self._schedule(message["id"], message.get("next_attempt_at", now))
+        if self._heap:
+            logger.info(f"Mail spool: {len(self._heap)} queued messages loaded")
+
+    def _claim(self, message_id: str):
+        """Take exclusive ownership of a spooled message, or return None if already taken."""
+        path = self._path(message_id)
+        claimed = f"{path}.claimed"
+        try:
+            os.rename(path, claimed)
+            return self._read(claimed)
+        except (OSError, ValueError):
+            return None
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    batch = []
+                    while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                        batch.append(heapq.heappop(self._heap)[1])
+                    self._in_flight += 1
+                    return batch
+                if not self._running:
+                    return []
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._cond.wait(timeout)
+
+    def _finish(self, message: dict, error: Exception = None, count_attempt: bool = True):
+        claimed = f"{self._path(message['id'])}.claimed"
+        if error is None:
+            os.remove(claimed)
+            return
+
+        if count_attempt:
+            message["attempts"] += 1
+        message["last_error"] = str(error)
+        if _is_permanent(error) or message["attempts"] >= self.max_attempts:
+            logger.error(f"Giving up on email to {message['to']} after {message['attempts']} attempts: {error}")
+            failed = os.path.join(self._failed_dir(), f"{message['id']}.json")
+            os.replace(claimed, failed)
+            os.utime(failed)  # The retention period starts now, not at enqueue
+            return
+
+        delay = min(self.backoff * 2 ** max(message["attempts"] - 1, 0), self.max_backoff)
+        message["next_attempt_at"] = time.time() + delay
+        logger.warning(f"Email to {message['to']} failed ({error}), retrying in {delay:.0f}s")
+        self._write(claimed, message)
+        os.replace(claimed, self._path(message["id"]))
+        self._schedule(message["id"], message["next_attempt_at"])
+
+    def _send_batch(self, message_ids: list):
+        messages = [m for m in (self._claim(message_id) for message_id in message_ids) if m is not None]
+        if not messages:
+            return
+        try:
+            conn = self.pool.acquire()
+        except Exception as e:
+            for message in messages:
+                self._finish(message, e)
+            return
+
+        broken = False
+        for message in messages:
+            if broken:
+                # The connection died earlier in this batch; retry without counting an attempt.
+                self._finish(message, smtplib.SMTPServerDisconnected("connection lost"), count_attempt=False)
+                continue
+            try:
+                msg = build_email_message(message["to"], message["subject"], message["body"], message["is_html"])
+                with observe("send_email"):
+                    conn.sendmail(Config.MAIL_FROM, message["to"], msg.as_string())
+                self._finish(message)
+            except Exception as e:
+                # SMTPException subclasses OSError, so only non-SMTP socket errors mean a dead connection
+                broken = isinstance(e, smtplib.SMTPServerDisconnected) or (
+                    isinstance(e, OSError) and not isinstance(e, smtplib.SMTPException)
+                )
+                self._finish(message, e)
+        self.pool.release(conn, broken=broken)
+
+    def _worker(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self._send_batch(batch)
+            except Exception as e:
+                logger.error(f"Mail worker error: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def purge_failed(self) -> int:
+        """Delete messages that failed for good more than `failed_retention` seconds ago."""
+        cutoff = time.time() - self.failed_retention
+        removed = 0
+        for path in glob.glob(os.path.join(self._failed_dir(), "*.json")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._ensure_spool()
+        self._load_spool()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"mailer-{i}", daemon=True)
+            for i in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float):
+        """Send whatever is ready within `timeout` seconds, then stop the workers."""
+        deadline = time.time() + timeout
+        with self._cond:
+            while self._in_flight or (self._heap and self._heap[0][0] <= time.time()):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logger.warning(f"Mail drain timed out; {len(self._heap)} messages stay spooled")
+                    break
+                self._cond.wait(remaining)
+            self._running = False
+            self._heap.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=max(deadline - time.time(), 0) + Config.SMTP_TIMEOUT_SECONDS)
+        self._threads = []
+        self.pool.close()
+
+
+mail_dispatcher = MailDispatcher(
+    SMTPConnectionPool(Config.MAIL_POOL_SIZE, Config.SMTP_IDLE_TIMEOUT_SECONDS),
+    Config.MAIL_SPOOL_DIR,
+    workers=Config.MAIL_POOL_SIZE,
+    batch_size=Config.MAIL_BATCH_SIZE,
+    max_attempts=Config.MAIL_MAX_ATTEMPTS,
+    backoff=Config.MAIL_RETRY_BACKOFF_SECONDS,
+    max_backoff=Config.MAIL_RETRY_BACKOFF_MAX_SECONDS,
+    failed_retention=Config.MAIL_FAILED_RETENTION_HOURS * 3600,
+)
+
+
+def queue_email(to_email: str, subject: str, body: str, is_html: bool = False):
+    """Hand an email to the background dispatcher and return immediately."""
+    mail_dispatcher.enqueue(to_email, subject, body, is_html)
+    return {"message": "Email queued successfully!"}
@@ -0,0 +1,138 @@
+"""Prometheus metrics.
+
+With PROMETHEUS_MULTIPROC_DIR set, prometheus_client keeps every value in
+per-process mmap files and the /metrics endpoint aggregates them, so several
+uvicorn/gunicorn workers report as one. The directory must exist and be
+emptied before the server starts.
+"""
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+# Crypto runs from ~10µs (Fernet) to hundreds of ms (bcrypt, PBKDF2)
+OPERATION_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                     0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests handled.", ["method", "route", "status"]
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to handle an HTTP request, until the body is sent.", ["method", "route"]
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled.", ["method"], multiprocess_mode="livesum"
+)
+
+OPERATION_DURATION = Histogram(
+    "operation_duration_seconds", "Time spent in slow primitives (crypto, JWT, SMTP).", ["operation"],
+    buckets=OPERATION_BUCKETS,
+)
+CRYPTO_POOL_WAIT = Histogram(
+    "crypto_pool_wait_seconds", "Time calls spent queued for a crypto pool worker.", ["operation"],
+    buckets=OPERATION_BUCKETS,
+)
+CRYPTO_POOL_REJECTED = Counter(
+    "crypto_pool_rejected_total", "Calls rejected with 503 because the crypto pool queue was full.", ["operation"]
+)
+
+DB_POOL_CAPACITY = Gauge(
+    "db_pool_capacity", "Pool size plus allowed overflow.", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_IN_USE = Gauge(
+    "db_pool_connections_in_use", "Connections checked out of the pool.", ["engine"], multiprocess_mode="livesum"
+)
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection.", ["engine"],
+    buckets=OPERATION_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that failed waiting for a connection.", ["engine"]
+)
+
+USER_CACHE_LOOKUPS = Counter(
+    "user_auth_cache_lookups_total", "User auth cache lookups.", ["key", "result"]
+)
+
+RATE_LIMIT_CHECKS = Counter(
+    "rate_limit_checks_total", "Rate limit checks on bcrypt-backed endpoints.", ["route", "scope", "result"]
+)
+RATE_LIMIT_KEYS = Gauge(
+    "rate_limit_tracked_keys", "Token buckets held in memory by the rate limiter.", multiprocess_mode="livesum"
+)
+
+
+@contextmanager
+def observe(operation: str):
+    """Time the enclosed block into operation_duration_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        OPERATION_DURATION.labels(operation).observe(time.perf_counter() - start)
+
+
+def generate_metrics() -> bytes:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the shared directory on shutdown."""
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request counts, latency and in-flight requests.
+
+    Requests are labelled with the matched route template (e.g.
+    /api/v1/get-password-entry/{service_id}) to keep label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            # The router stores the matched route in the (shared) scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            HTTP_REQUESTS.labels(method, route_path, str(status_code)).inc()
+            HTTP_REQUEST_DURATION.labels(method, route_path).observe(elapsed)
+
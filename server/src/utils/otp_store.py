@@ -0,0 +1,196 @@
+import heapq
+import threading
+import time
+from typing import NamedTuple, Union
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from database import SessionLocal
+from models.models import OTPCode
+
+
+# Outcomes of OTPStore.verify
+OTP_OK = "ok"
+OTP_NOT_FOUND = "not_found"
+OTP_EXPIRED = "expired"
+OTP_TOO_MANY = "too_many"
+OTP_INVALID = "invalid"
+
+
+class OTPResult(NamedTuple):
+    status: str
+    record: Union[dict, None] = None
+    remaining: int = 0
+
+
+class OTPStore:
+    """Interface for OTP storage.
+
+    `create` and `verify` must be atomic per email: two concurrent logins
+    can't both issue an OTP, and concurrent verify attempts can't together
+    exceed `max_retries`.
+    """
+
+    blocking = False  # True if calls do I/O and must run off the event loop
+
+    def create(self, email: str, record: dict, ttl: float) -> bool:
+        """Store `record` unless an unexpired OTP exists. Returns False if one does."""
+        raise NotImplementedError
+
+    def verify(self, email: str, otp: str, max_retries: int) -> OTPResult:
+        """Consume the OTP if it matches, otherwise count a failed attempt."""
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """Delete expired OTPs and return how many were removed."""
+        raise NotImplementedError
+
+
+class MemoryOTPStore(OTPStore):
+    """Process-local store. Only correct when running a single worker."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._records = {}
+        self._expiry_heap = []  # (expires_at, email); stale entries are skipped on pop
+
+    def _sweep_locked(self, now: float) -> int:
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, email = heapq.heappop(self._expiry_heap)
+            record = self._records.get(email)
+            if record is not None and record["expires_at"] == expires_at:
+                del self._records[email]
+                removed += 1
+        return removed
+
+    def create(self, email: str, record: dict, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            self._sweep_locked(now)
+            if email in self._records:
+                return False
+            record = {**record, "expires_at": now + ttl, "retry_count": 0}
+            self._records[email] = record
+            heapq.heappush(self._expiry_heap, (record["expires_at"], email))
+            return True
+
+    def verify(self, email: str, otp: str, max_retries: int) -> OTPResult:
+        with self._lock:
+            record = self._records.get(email)
+            if record is None:
+                return OTPResult(OTP_NOT_FOUND)
+
+            if time.time() > record["expires_at"]:
+                del self._records[email]
+                return OTPResult(OTP_EXPIRED, record)
+
+            if record["retry_count"] >= max_retries:
+                del self._records[email]
+                return OTPResult(OTP_TOO_MANY, record)
+
+            if otp != record["otp"]:
+                record["retry_count"] += 1
+                return OTPResult(OTP_INVALID, record, max_retries - record["retry_count"])
+
+            del self._records[email]
+            return OTPResult(OTP_OK, record)
+
+    def sweep(self) -> int:
+        with self._lock:
+            return self._sweep_locked(time.time())
+
+
+class DatabaseOTPStore(OTPStore):
+    """Store backed by the `otp_codes` table, shared by every worker.
+
+    Each state change is a single conditional DELETE/UPDATE, so the database
+    arbitrates between workers racing on the same email.
+    """
+
+    blocking = True
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+
+    @staticmethod
+    def _to_record(row: OTPCode) -> dict:
+        return {
+            "otp": row.otp,
+            "expires_at": row.expires_at,
+            "retry_count": row.retry_count,
+            "user_id": row.user_id,
+            "username": row.username,
+        }
+
+    def create(self, email: str, record: dict, ttl: float) -> bool:
+        now = time.time()
+        with self.session_factory() as db:
+            db.execute(delete(OTPCode).where(OTPCode.email == email, OTPCode.expires_at <= now))
+            db.add(OTPCode(
+                email=email,
+                otp=record["otp"],
+                user_id=record["user_id"],
+                username=record["username"],
+                retry_count=0,
+                expires_at=now + ttl,
+            ))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return False
+            return True
+
+    def verify(self, email: str, otp: str, max_retries: int) -> OTPResult:
+        now = time.time()
+        live = (OTPCode.email == email, OTPCode.retry_count < max_retries, OTPCode.expires_at > now)
+        with self.session_factory() as db:
+            row = db.execute(select(OTPCode).where(OTPCode.email == email)).scalar_one_or_none()
+            if row is None:
+                return OTPResult(OTP_NOT_FOUND)
+            record = self._to_record(row)
+
+            consumed = db.execute(delete(OTPCode).where(*live, OTPCode.otp == otp))
+            if consumed.rowcount == 1:
+                db.commit()
+                return OTPResult(OTP_OK, record)
+
+            failed = db.execute(
+                update(OTPCode)
+                .where(*live, OTPCode.otp != otp)
+                .values(retry_count=OTPCode.retry_count + 1)
+            )
+            db.commit()
+            db.expire_all()
+            row = db.execute(select(OTPCode).where(OTPCode.email == email)).scalar_one_or_none()
+            if row is None:
+                # Consumed or swept by another worker in the meantime
+                return OTPResult(OTP_NOT_FOUND)
+            record = self._to_record(row)
+
+            if failed.rowcount == 1:
+                return OTPResult(OTP_INVALID, record, max(max_retries - row.retry_count, 0))
+
+            db.execute(delete(OTPCode).where(OTPCode.email == email))
+            db.commit()
+            if row.expires_at <= now:
+                return OTPResult(OTP_EXPIRED, record)
+            return OTPResult(OTP_TOO_MANY, record)
+
+    def sweep(self) -> int:
+        with self.session_factory() as db:
+            result = db.execute(delete(OTPCode).where(OTPCode.expires_at <= time.time()))
+            db.commit()
+            return result.rowcount
+
+
+def create_otp_store(backend: str) -> OTPStore:
+    if backend == "memory":
+        return MemoryOTPStore()
+    if backend == "database":
+        return DatabaseOTPStore()
+    raise ValueError(f"Unknown OTP_STORE_BACKEND: {backend}")
+
+
+otp_store = create_otp_store(Config.OTP_STORE_BACKEND)
@@ -0,0 +1,332 @@
+import asyncio
+import json
+import math
+import threading
+import time
+from typing import NamedTuple
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from starlette.requests import cookie_parser
+from config import Config
+from database import SessionLocal
+from models.models import RateLimitBucket
+from utils.jwt import STEP_UP_COOKIE, decode_access_token, verify_step_up_grant
+from utils.logger import logger
+from utils.metrics import RATE_LIMIT_CHECKS, RATE_LIMIT_KEYS
+
+MAX_INSPECTED_BODY = 16 * 1024  # Larger login bodies aren't parsed for the email; the IP limit still applies
+
+
+class RateLimitRule(NamedTuple):
+    name: str
+    burst: float  # Bucket capacity
+    per_second: float  # Refill rate
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    retry_after: float = 0.0
+
+
+class RateLimitStore:
+    """Interface for token-bucket storage.
+
+    `consume` takes one token from the bucket `key` (created full on first
+    use) and must be atomic per key.
+    """
+
+    blocking = False  # True if calls do I/O and must run off the event loop
+
+    def consume(self, key: str, rule: RateLimitRule, now: float) -> Decision:
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """Drop buckets that have refilled completely and return how many were removed."""
+        raise NotImplementedError
+
+    def size(self) -> int | None:
+        """Number of buckets held, if cheap to know."""
+        return None
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Process-local buckets: each worker enforces the limits on its own.
+
+    Buckets are `(tokens, updated_at, expires_at)` tuples in a dict kept in
+    least-recently-used order, capped at `max_keys`; a bucket that is full
+    again carries no state and is dropped by `sweep`.
+    """
+
+    def __init__(self, max_keys: int, clock=time.time):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def consume(self, key: str, rule: RateLimitRule, now: float) -> Decision:
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = rule.burst if bucket is None else min(rule.burst, bucket[0] + (now - bucket[1]) * rule.per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (rule.burst - tokens) / rule.per_second)
+            while len(self._buckets) > self.max_keys:
+                # Forgetting a bucket refills it, so evict the one idle the longest
+                del self._buckets[next(iter(self._buckets))]
+        return Decision(True) if allowed else Decision(False, (1 - tokens) / rule.per_second)
+
+    def sweep(self) -> int:
+        now = self.clock()
+        with self._lock:
+            expired = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+            for key in expired:
+                del self._buckets[key]
+        return len(expired)
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class DatabaseRateLimitStore(RateLimitStore):
+    """Buckets in the `rate_limit_buckets` table, shared by every worker.
+
+    Taking a token is one conditional UPDATE that refills and decrements in
+    SQL, so concurrent workers can't overspend a bucket.
+    """
+
+    blocking = True
+
+    def __init__(self, session_factory=SessionLocal, clock=time.time):
+        self.session_factory = session_factory
+        self.clock = clock
+
+    def consume(self, key: str, rule: RateLimitRule, now: float) -> Decision:
+        elapsed_tokens = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rule.per_second
+        refilled = case((elapsed_tokens > rule.burst, rule.burst), else_=elapsed_tokens)
+        with self.session_factory() as db:
+            for _ in range(2):
+                taken = db.execute(
+                    update(RateLimitBucket)
+                    .where(RateLimitBucket.key == key, refilled >= 1)
+                    .values(
+                        tokens=refilled - 1,
+                        updated_at=now,
+                        expires_at=now + (rule.burst - (refilled - 1)) / rule.per_second,
+                    )
+                )
+                if taken.rowcount == 1:
+                    db.commit()
+                    return Decision(True)
+
+                row = db.execute(select(RateLimitBucket.tokens, RateLimitBucket.updated_at).where(RateLimitBucket.key == key)).first()
+                if row is not None:
+                    db.rollback()
+                    tokens = min(rule.burst, row.tokens + (now - row.updated_at) * rule.per_second)
+                    return Decision(False, (1 - tokens) / rule.per_second)
+
+                try:
+                    db.execute(insert(RateLimitBucket).values(
+                        key=key,
+                        tokens=rule.burst - 1,
+                        updated_at=now,
+                        expires_at=now + 1 / rule.per_second,
+                    ))
+                    db.commit()
+                    return Decision(True)
+                except IntegrityError:
+                    # Another worker created it first; take from theirs
+                    db.rollback()
+        return Decision(False, 1 / rule.per_second)
+
+    def sweep(self) -> int:
+        with self.session_factory() as db:
+            result = db.execute(delete(RateLimitBucket).where(RateLimitBucket.expires_at <= self.clock()))
+            db.commit()
+            return result.rowcount
+
+
+def create_rate_limit_store(backend: str) -> RateLimitStore:
+    if backend == "memory":
+        return MemoryRateLimitStore(Config.RATE_LIMIT_MAX_KEYS)
+    if backend == "database":
+        return DatabaseRateLimitStore()
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+
+class RateLimiter:
+    """Token buckets per client IP and per account (email or user id)."""
+
+    def __init__(self, store: RateLimitStore, ip_rule: RateLimitRule, account_rule: RateLimitRule):
+        self.store = store
+        self.ip_rule = ip_rule
+        self.account_rule = account_rule
+        self._rejected = {}
+
+    async def check(self, route: str, ip: str | None, account: str | None) -> Decision:
+        """Take a token from every bucket that applies; the first empty one rejects the request."""
+        for rule, subject in ((self.ip_rule, ip), (self.account_rule, account)):
+            if subject is None:
+                continue
+            key = f"{rule.name}:{subject}"
+            if self.store.blocking:
+                decision = await asyncio.to_thread(self.store.consume, key, rule, time.time())
+            else:
+                decision = self.store.consume(key, rule, time.time())
+            RATE_LIMIT_CHECKS.labels(route, rule.name, "allowed" if decision.allowed else "rejected").inc()
+            if not decision.allowed:
+                self._rejected[rule.name] = self._rejected.get(rule.name, 0) + 1
+                self._report_size()
+                return decision
+        self._report_size()
+        return Decision(True)
+
+    def _report_size(self):
+        size = self.store.size()
+        if size is not None:
+            RATE_LIMIT_KEYS.set(size)
+
+    def sweep(self) -> int:
+        removed = self.store.sweep()
+        self._report_size()
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.store).__name__,
+            "tracked_keys": self.store.size(),
+            "rejected": dict(self._rejected),
+            "rules": {rule.name: rule._asdict() for rule in (self.ip_rule, self.account_rule)},
+        }
+
+
+rate_limiter = RateLimiter(
+    create_rate_limit_store(Config.RATE_LIMIT_BACKEND),
+    RateLimitRule("ip", Config.RATE_LIMIT_IP_BURST, Config.RATE_LIMIT_IP_PER_MINUTE / 60),
+    RateLimitRule("account", Config.RATE_LIMIT_ACCOUNT_BURST, Config.RATE_LIMIT_ACCOUNT_PER_MINUTE / 60),
+)
+
+
+def client_ip(scope) -> str | None:
+    if Config.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                # The last hop is the one our proxy appended; earlier ones are client-supplied
+                return value.decode("latin-1").split(",")[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def request_header(scope, wanted: bytes) -> str | None:
+    for name, value in scope["headers"]:
+        if name == wanted:
+            return value.decode("latin-1")
+    return None
+
+
+def token_user_id(access_token: str | None) -> str | None:
+    """User id from a valid access token (the verified payload is cached)."""
+    if not access_token:
+        return None
+    try:
+        payload = decode_access_token(access_token)
+    except Exception:
+        return None
+    user_id = payload.get("user_id") or payload.get("sub")
+    return str(user_id) if user_id else None
+
+
+async def read_body(receive):
+    """Read up to MAX_INSPECTED_BODY bytes and return them with a `receive` that replays them."""
+    messages = []
+    body = b""
+    while len(body) <= MAX_INSPECTED_BODY:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return body, replay
+
+
+def login_email(body: bytes) -> str | None:
+    if len(body) > MAX_INSPECTED_BODY:
+        return None
+    try:
+        email = json.loads(body).get("email")
+    except (ValueError, AttributeError):
+        return None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware that rejects over-limit requests to the bcrypt-backed endpoints with 429.
+
+    It runs before routing and body validation, so a rejected request costs
+    a dict lookup (or one UPDATE with the database backend) rather than a
+    bcrypt verify. Login is limited per IP and per email in the body; the
+    vault endpoints (step-up included) per IP and per user id from the access
+    token.
+    """
+
+    ROUTES = {
+        ("POST", "/auth/login"): "email",
+        ("POST", "/api/v1/step-up"): "user",
+        ("POST", "/api/v1/get-password"): "user",
+        ("POST", "/api/v1/get-passwords"): "user",
+        ("DELETE", "/api/v1/delete-password"): "user",
+    }
+    # Endpoints where a valid step-up grant replaces the bcrypt check, so there's nothing to protect
+    GRANT_ROUTES = {
+        ("POST", "/api/v1/get-password"),
+        ("POST", "/api/v1/get-passwords"),
+        ("DELETE", "/api/v1/delete-password"),
+    }
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter, enabled: bool = Config.RATE_LIMIT_ENABLED):
+        self.app = app
+        self.limiter = limiter
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        account_source = self.ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if not self.enabled or account_source is None:
+            await self.app(scope, receive, send)
+            return
+
+        if account_source == "email":
+            body, receive = await read_body(receive)
+            account = login_email(body)
+        else:
+            cookies = cookie_parser(request_header(scope, b"cookie") or "")
+            account = token_user_id(cookies.get("access_token"))
+            grant = request_header(scope, b"x-step-up-grant") or cookies.get(STEP_UP_COOKIE)
+            if (account and grant and (scope["method"], scope["path"]) in self.GRANT_ROUTES
+                    and verify_step_up_grant(grant, cookies["access_token"], account)):
+                await self.app(scope, receive, send)
+                return
+
+        decision = await self.limiter.check(scope["path"], client_ip(scope), account)
+        if decision.allowed:
+            await self.app(scope, receive, send)
+            return
+
+        retry_after = str(max(1, math.ceil(decision.retry_after)))
+        logger.warning(f"Rate limited {scope['method']} {scope['path']} from {client_ip(scope)}")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [(b"content-type", b"application/json"), (b"retry-after", retry_after.encode())],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": json.dumps({"detail": "Too many attempts, please retry later."}).encode(),
+        })
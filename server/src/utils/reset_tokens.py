@@ -0,0 +1,24 @@
+import hashlib
+import hmac
+import time
+from sqlalchemy import delete
+from config import Config
+from database import SessionLocal
+from models.models import PasswordResetToken
+
+
+def reset_token_digest(token: str) -> str:
+    """Keyed SHA-256 of a reset token, used as its primary key.
+
+    Reset tokens are 256 random bits, so a fast hash is as strong as bcrypt
+    here; the SECRET_KEY keeps a leaked table from being checked offline.
+    """
+    return hmac.new(Config.SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
+def sweep_reset_tokens() -> int:
+    """Delete expired reset tokens and return how many were removed."""
+    with SessionLocal() as db:
+        result = db.execute(delete(PasswordResetToken).where(PasswordResetToken.expires_at <= time.time()))
+        db.commit()
+        return result.rowcount
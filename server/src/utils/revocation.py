@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from database import SessionLocal
+from models.models import RevokedToken
+from utils.logger import logger
+
+# Re-read this much history on every refresh, for commits that land late and clock skew between workers
+REFRESH_OVERLAP_SECONDS = 60
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, tunable false positives.
+
+    Sized for `capacity` items at `error_rate`; probe positions come from
+    one BLAKE2b digest split into two hashes (Kirsch-Mitzenmacher).
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def add(self, item: str):
+        if item in self:
+            return  # Refreshes overlap, so don't count an item twice
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """Revoked access-token ids (`jti`), stored in `revoked_tokens` until the token would have expired.
+
+    Each worker keeps a Bloom filter of the stored ids, so checking a token
+    that isn't revoked (nearly all of them) never touches the database; only
+    a filter hit is confirmed with a primary-key lookup. `refresh` adds rows
+    revoked by other workers since the last refresh; `sweep` deletes expired
+    rows and rebuilds the filter, which is how entries leave it.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, session_factory=SessionLocal, clock=time.time):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.session_factory = session_factory
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._filter = BloomFilter(capacity, error_rate)
+        self._loaded_until = 0.0  # Every row revoked before this is in the filter
+        self._stats = {"checks": 0, "filter_hits": 0, "confirmed": 0}
+
+    def rebuild(self):
+        """Reload the filter from every unexpired revocation."""
+        started = self.clock()
+        with self.session_factory() as db:
+            jtis = db.scalars(select(RevokedToken.jti).where(RevokedToken.expires_at > started)).all()
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            self._filter = bloom
+            self._loaded_until = started
+        logger.info(f"Revocation filter rebuilt: {len(jtis)} revoked tokens, {bloom.nbytes} bytes")
+
+    def refresh(self):
+        """Add revocations written since the last refresh (by any worker)."""
+        started = self.clock()
+        with self.session_factory() as db:
+            jtis = db.scalars(
+                select(RevokedToken.jti).where(RevokedToken.revoked_at >= self._loaded_until - REFRESH_OVERLAP_SECONDS)
+            ).all()
+        with self._lock:
+            for jti in jtis:
+                self._filter.add(jti)
+            self._loaded_until = started
+            overfull = self._filter.count > self._filter.capacity
+        if overfull:
+            self.rebuild()
+
+    def sweep(self) -> int:
+        """Delete revocations of tokens that have expired anyway and rebuild the filter without them."""
+        with self.session_factory() as db:
+            result = db.execute(delete(RevokedToken).where(RevokedToken.expires_at <= self.clock()))
+            db.commit()
+        self.rebuild()
+        return result.rowcount
+
+    def revoke(self, jti: str, expires_at: float):
+        with self.session_factory() as db:
+            db.add(RevokedToken(jti=jti, expires_at=expires_at, revoked_at=self.clock()))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()  # Already revoked
+        with self._lock:
+            self._filter.add(jti)
+
+    def _is_stored(self, jti: str) -> bool:
+        with self.session_factory() as db:
+            return db.scalar(select(func.count()).where(RevokedToken.jti == jti, RevokedToken.expires_at > self.clock())) > 0
+
+    async def is_revoked(self, jti: str) -> bool:
+        with self._lock:
+            self._stats["checks"] += 1
+            if jti not in self._filter:
+                return False
+            self._stats["filter_hits"] += 1
+        revoked = await asyncio.to_thread(self._is_stored, jti)
+        if revoked:
+            with self._lock:
+                self._stats["confirmed"] += 1
+        return revoked
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "filter_items": self._filter.count,
+                "filter_capacity": self._filter.capacity,
+                "filter_bytes": self._filter.nbytes,
+                "hash_count": self._filter.hash_count,
+            }
+
+
+revocation_list = RevocationList(Config.REVOCATION_FILTER_CAPACITY, Config.REVOCATION_FILTER_ERROR_RATE)
@@ -0,0 +1,244 @@
+import bisect
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from urllib.parse import urlsplit
+from config import Config
+
+_WORD = re.compile(r"[0-9a-z]+")
+_DOTTED = re.compile(r"[0-9a-z]+(?:\.[0-9a-z]+)+")  # Hosts and emails' domain parts, e.g. mail.google.com
+_STOPWORDS = {"http", "https", "www"}
+
+# Second-level labels under which registrations happen one level down (example.co.uk)
+_SECOND_LEVEL_LABELS = {"ac", "co", "com", "edu", "gov", "net", "org"}
+
+
+def tokenize(text: str | None) -> set:
+    """Lowercase words plus dotted compounds, so "google.com" matches as a whole too."""
+    if not text:
+        return set()
+    text = text.lower()
+    return (set(_WORD.findall(text)) | set(_DOTTED.findall(text))) - _STOPWORDS
+
+
+def url_tokens(url: str | None) -> set:
+    """Word tokens of a URL plus its full host and registrable domain."""
+    if not url:
+        return set()
+    tokens = tokenize(url)
+    host = urlsplit(url if "://" in url else f"http://{url}").hostname or ""
+    labels = [label for label in host.split(".") if label]
+    if len(labels) >= 2:
+        tokens.add(host)
+        size = 3 if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in _SECOND_LEVEL_LABELS else 2
+        tokens.add(".".join(labels[-size:]))
+    return tokens
+
+
+def trigrams(token: str) -> set:
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class UserSearchIndex:
+    """Inverted index over one user's entries (title, url, username).
+
+    Tokens are kept sorted for prefix lookups, and a trigram index over the
+    distinct tokens drives fuzzy matching.
+    """
+
+    EXACT_SCORE = 1.0
+    PREFIX_SCORE = 0.8
+    FUZZY_WEIGHT = 0.6
+    FUZZY_THRESHOLD = 0.3
+
+    def __init__(self, version: int = 0):
+        self.version = version  # Vault version the index reflects
+        self._lock = threading.Lock()
+        self._tokens_by_entry = {}
+        self._postings = defaultdict(set)  # token -> entry ids
+        self._trigram_postings = defaultdict(set)  # trigram -> tokens
+        self._sorted_tokens = []
+
+    def __len__(self):
+        return len(self._tokens_by_entry)
+
+    def _add_token(self, token: str, entry_id: int):
+        postings = self._postings[token]
+        if not postings:
+            bisect.insort(self._sorted_tokens, token)
+            for gram in trigrams(token):
+                self._trigram_postings[gram].add(token)
+        postings.add(entry_id)
+
+    def _remove_token(self, token: str, entry_id: int):
+        postings = self._postings[token]
+        postings.discard(entry_id)
+        if postings:
+            return
+        del self._postings[token]
+        del self._sorted_tokens[bisect.bisect_left(self._sorted_tokens, token)]
+        for gram in trigrams(token):
+            grams = self._trigram_postings[gram]
+            grams.discard(token)
+            if not grams:
+                del self._trigram_postings[gram]
+
+    def upsert(self, entry_id: int, title: str | None, url: str | None, username: str | None):
+        tokens = tokenize(title) | url_tokens(url) | tokenize(username)
+        with self._lock:
+            old_tokens = self._tokens_by_entry.get(entry_id, set())
+            for token in old_tokens - tokens:
+                self._remove_token(token, entry_id)
+            for token in tokens - old_tokens:
+                self._add_token(token, entry_id)
+            self._tokens_by_entry[entry_id] = tokens
+
+    def remove(self, entry_id: int):
+        with self._lock:
+            for token in self._tokens_by_entry.pop(entry_id, set()):
+                self._remove_token(token, entry_id)
+
+    def _match(self, term: str, fuzzy: bool) -> dict:
+        """Best score per entry id for a single query term."""
+        scores = {}
+        position = bisect.bisect_left(self._sorted_tokens, term)
+        while position < len(self._sorted_tokens) and self._sorted_tokens[position].startswith(term):
+            token = self._sorted_tokens[position]
+            position += 1
+            score = self.EXACT_SCORE if token == term else self.PREFIX_SCORE
+            for entry_id in self._postings[token]:
+                scores[entry_id] = max(scores.get(entry_id, 0.0), score)
+
+        if fuzzy and len(term) >= 3:
+            term_grams = trigrams(term)
+            shared = defaultdict(int)
+            for gram in term_grams:
+                for token in self._trigram_postings.get(gram, ()):
+                    shared[token] += 1
+            for token, common in shared.items():
+                similarity = common / (len(term_grams) + len(trigrams(token)) - common)
+                if similarity < self.FUZZY_THRESHOLD:
+                    continue
+                score = similarity * self.FUZZY_WEIGHT
+                for entry_id in self._postings[token]:
+                    if score > scores.get(entry_id, 0.0):
+                        scores[entry_id] = score
+        return scores
+
+    def search(self, query: str, limit: int, fuzzy: bool = True) -> list:
+        """Ids of entries matching every query term, best first."""
+        terms = sorted(tokenize(query), key=len, reverse=True)
+        if not terms:
+            return []
+        with self._lock:
+            totals = None
+            for term in terms:
+                scores = self._match(term, fuzzy)
+                if totals is None:
+                    totals = scores
+                else:
+                    totals = {entry_id: total + scores[entry_id] for entry_id, total in totals.items() if entry_id in scores}
+                if not totals:
+                    return []
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))
+        return [entry_id for entry_id, _ in ranked[:limit]]
+
+
+class SearchIndexRegistry:
+    """Per-user indexes with LRU eviction once `max_users` are loaded.
+
+    Each index records the vault version (see utils/vault_version.py) it
+    reflects. A search passes the current version and gets a rebuilt index
+    if it differs, so writes made by other workers show up on the next
+    search. This worker's writes are applied in place with the version they
+    committed, as long as that is the next one after the index's; otherwise
+    another worker wrote in between and the index is dropped.
+
+    Writes that land while a build is reading the database are counted, and
+    a build that raced with one is used once but not cached.
+    """
+
+    def __init__(self, max_users: int):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+        self._builds = {}  # user_id -> [builds in progress, writes seen meanwhile]
+
+    async def get_or_build(self, user_id: int, version: int, load_rows) -> UserSearchIndex:
+        """Return the user's index at `version`, building it from `load_rows()` (an async iterable) if needed."""
+        user_id = int(user_id)
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None and index.version == version:
+                self._indexes.move_to_end(user_id)
+                return index
+            self._indexes.pop(user_id, None)
+            build = self._builds.setdefault(user_id, [0, 0])
+            build[0] += 1
+            writes_before = build[1]
+
+        index = UserSearchIndex(version)
+        try:
+            async for row in load_rows():
+                index.upsert(row.id, row.title, row.url, row.username)
+        except BaseException:
+            with self._lock:
+                self._finish_build(user_id, build)
+            raise
+
+        with self._lock:
+            self._finish_build(user_id, build)
+            if build[1] == writes_before:
+                self._indexes[user_id] = index
+                self._indexes.move_to_end(user_id)
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        return index
+
+    def _finish_build(self, user_id: int, build: list):
+        build[0] -= 1
+        if not build[0]:
+            del self._builds[user_id]
+
+    def is_loaded(self, user_id: int) -> bool:
+        with self._lock:
+            return int(user_id) in self._indexes
+
+    def apply(self, user_id: int, version: int, upserts=(), removals=()):
+        """Apply one committed write that moved the user's vault to `version`.
+
+        `upserts` are `(entry_id, title, url, username)` tuples, `removals` entry ids.
+        """
+        user_id = int(user_id)
+        with self._lock:
+            if user_id in self._builds:
+                self._builds[user_id][1] += 1
+            index = self._indexes.get(user_id)
+            if index is None:
+                return
+            if index.version != version - 1:
+                # Another worker's write is missing from the index
+                del self._indexes[user_id]
+                return
+            for entry_id, title, url, username in upserts:
+                index.upsert(entry_id, title, url, username)
+            for entry_id in removals:
+                index.remove(entry_id)
+            index.version = version
+
+    def upsert(self, user_id: int, version: int, entry_id: int, title: str | None, url: str | None, username: str | None):
+        self.apply(user_id, version, upserts=[(entry_id, title, url, username)])
+
+    def remove(self, user_id: int, version: int, entry_id: int):
+        self.apply(user_id, version, removals=[entry_id])
+
+    def invalidate(self, user_id: int):
+        user_id = int(user_id)
+        with self._lock:
+            if user_id in self._builds:
+                self._builds[user_id][1] += 1
+            self._indexes.pop(user_id, None)
+
+
+search_index = SearchIndexRegistry(Config.SEARCH_INDEX_MAX_USERS)
@@ -0,0 +1,61 @@
+import hashlib
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+# Supported JWT algorithms; the key type decides which one a key signs with
+JWT_ALGORITHMS = ("RS256", "ES256", "EdDSA")
+
+
+def algorithm_for_key(key) -> str:
+    """The JWT algorithm for a private or public key, detected from its type."""
+    if isinstance(key, (rsa.RSAPrivateKey, rsa.RSAPublicKey)):
+        return "RS256"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and isinstance(key.curve, ec.SECP256R1):
+        return "ES256"
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    raise ValueError(f"Unsupported JWT key type: {type(key).__name__} (use RSA, P-256 or Ed25519)")
+
+
+def key_id(public_key) -> str:
+    """Derive a stable key id (kid) from the SHA-256 of the public key."""
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+def generate_signing_key(algorithm: str, rsa_key_size: int = 2048):
+    if algorithm == "RS256":
+        return rsa.generate_private_key(public_exponent=65537, key_size=rsa_key_size)
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unknown JWT algorithm: {algorithm} (choose from {', '.join(JWT_ALGORITHMS)})")
+
+
+def private_key_pem(private_key) -> bytes:
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def public_key_pem(key) -> bytes:
+    """PEM public key for a private key or a public key."""
+    public_key = key.public_key() if hasattr(key, "public_key") else key
+    return public_key.public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+
+
+def write_key_pair(private_key, private_path: str, public_path: str):
+    """Write the private key (PKCS#8) and its public half (SPKI) as PEM files."""
+    with open(private_path, "wb") as f:
+        f.write(private_key_pem(private_key))
+    with open(public_path, "wb") as f:
+        f.write(public_key_pem(private_key))
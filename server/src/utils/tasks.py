@@ -0,0 +1,22 @@
+import asyncio
+from utils.logger import logger
+
+
+async def run_periodically(name: str, interval: float, fn):
+    """Call the blocking `fn` every `interval` seconds in a worker thread until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(fn)
+        except Exception as e:
+            logger.error(f"Periodic task {name} failed: {e}")
+
+
+def start_periodic(name: str, interval: float, fn) -> asyncio.Task:
+    return asyncio.create_task(run_periodically(name, interval, fn), name=name)
+
+
+async def stop_tasks(tasks: list):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
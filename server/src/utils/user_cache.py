@@ -0,0 +1,120 @@
+import threading
+from typing import NamedTuple
+from cachetools import TTLCache
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import Config
+from models.models import User
+from utils.metrics import USER_CACHE_LOOKUPS
+
+
+class UserAuthRecord(NamedTuple):
+    """The columns the auth checks read, detached from any session."""
+    id: int
+    email: str
+    username: str
+    hashed_password: str
+    is_blocked: bool
+    is_verified: bool
+
+
+AUTH_COLUMNS = (User.id, User.email, User.username, User.hashed_password, User.is_blocked, User.is_verified)
+
+
+class UserAuthCache:
+    """Bounded TTL cache of user auth records, by id and by email.
+
+    Per process: a write made by another worker is seen once the entry
+    expires, so USER_CACHE_TTL_SECONDS bounds how long e.g. a block takes to
+    apply everywhere. Writes in this process invalidate explicitly.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._by_id = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self._id_by_email = TTLCache(maxsize=max(maxsize, 1), ttl=ttl)
+        self._hits = {"id": 0, "email": 0}
+        self._misses = {"id": 0, "email": 0}
+
+    def _count(self, key: str, hit: bool):
+        (self._hits if hit else self._misses)[key] += 1
+        USER_CACHE_LOOKUPS.labels(key, "hit" if hit else "miss").inc()
+
+    def get(self, user_id: int) -> UserAuthRecord | None:
+        with self._lock:
+            record = self._by_id.get(user_id)
+            self._count("id", record is not None)
+        return record
+
+    def get_by_email(self, email: str) -> UserAuthRecord | None:
+        with self._lock:
+            user_id = self._id_by_email.get(email)
+            record = self._by_id.get(user_id) if user_id is not None else None
+            if record is not None and record.email != email:
+                record = None  # The email changed since it was cached
+            self._count("email", record is not None)
+        return record
+
+    def put(self, record: UserAuthRecord):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._by_id[record.id] = record
+            self._id_by_email[record.email] = record.id
+
+    def invalidate(self, user_id: int | None = None, email: str | None = None):
+        with self._lock:
+            if user_id is not None:
+                record = self._by_id.pop(user_id, None)
+                if record is not None:
+                    self._id_by_email.pop(record.email, None)
+            if email is not None:
+                self._by_id.pop(self._id_by_email.pop(email, None), None)
+
+    def clear(self):
+        with self._lock:
+            self._by_id.clear()
+            self._id_by_email.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._by_id),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": dict(self._hits),
+                "misses": dict(self._misses),
+            }
+
+
+user_auth_cache = UserAuthCache(Config.USER_CACHE_SIZE, Config.USER_CACHE_TTL_SECONDS)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_updated_user(mapper, connection, target):
+    # Catches ORM writes made anywhere (e.g. blocking a user); Core UPDATEs must invalidate themselves
+    user_auth_cache.invalidate(target.id)
+
+
+async def load_user_auth(db: AsyncSession, user_id: int) -> UserAuthRecord | None:
+    record = user_auth_cache.get(user_id)
+    if record is None:
+        row = (await db.execute(select(*AUTH_COLUMNS).where(User.id == user_id))).first()
+        if row is None:
+            return None
+        record = UserAuthRecord(*row)
+        user_auth_cache.put(record)
+    return record
+
+
+async def load_user_auth_by_email(db: AsyncSession, email: str) -> UserAuthRecord | None:
+    record = user_auth_cache.get_by_email(email)
+    if record is None:
+        row = (await db.execute(select(*AUTH_COLUMNS).where(User.email == email))).first()
+        if row is None:
+            return None
+        record = UserAuthRecord(*row)
+        user_auth_cache.put(record)
+    return record
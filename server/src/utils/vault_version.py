@@ -0,0 +1,69 @@
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from models.models import VaultVersion
+
+
+def _upsert_statement(dialect: str, user_id: int):
+    """Dialect upsert that creates or increments the user's version, or None if unsupported."""
+    if dialect in ("postgresql", "sqlite"):
+        upsert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        return upsert(VaultVersion).values(user_id=user_id, version=1).on_conflict_do_update(
+            index_elements=[VaultVersion.user_id],
+            set_={"version": VaultVersion.version + 1},
+        )
+    if dialect == "mysql":
+        return mysql.insert(VaultVersion).values(user_id=user_id, version=1).on_duplicate_key_update(
+            version=VaultVersion.version + 1,
+        )
+    return None
+
+
+def _increment_statement(user_id: int):
+    return update(VaultVersion).where(VaultVersion.user_id == user_id).values(version=VaultVersion.version + 1)
+
+
+def _version_statement(user_id: int):
+    return select(VaultVersion.version).where(VaultVersion.user_id == user_id)
+
+
+def bump_vault_version(db: Session, user_id: int) -> int:
+    """Increment the user's vault version inside the caller's transaction and return the new version.
+
+    Uses the dialect's upsert so the first write for a user can't race
+    another one into a duplicate-key error. The bump holds the row lock, so
+    the version read back is this write's own.
+    """
+    statement = _upsert_statement(db.get_bind().dialect.name, user_id)
+    if statement is None:
+        if not db.execute(_increment_statement(user_id)).rowcount:
+            db.execute(insert(VaultVersion).values(user_id=user_id, version=1))
+    else:
+        db.execute(statement)
+    return db.scalar(_version_statement(user_id))
+
+
+async def bump_vault_version_async(db: AsyncSession, user_id: int) -> int:
+    """`bump_vault_version` for an AsyncSession."""
+    statement = _upsert_statement(db.get_bind().dialect.name, user_id)
+    if statement is None:
+        if not (await db.execute(_increment_statement(user_id))).rowcount:
+            await db.execute(insert(VaultVersion).values(user_id=user_id, version=1))
+    else:
+        await db.execute(statement)
+    return await db.scalar(_version_statement(user_id))
+
+
+async def get_vault_version(db: AsyncSession, user_id: int) -> int:
+    """Current vault version: a single primary-key lookup."""
+    version = await db.scalar(_version_statement(user_id))
+    return version or 0
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison, per RFC 9110 for If-None-Match
+    return "*" in candidates or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in candidates)
@@ -0,0 +1,20 @@
+"""Isolate the test session the way the benchmarks are isolated.
+
+`Config` reads the environment once, at import time, so bench/harness.py
+points it at a throwaway SQLite database, fresh keys and a private mail
+spool before any test module imports from `src/`.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench"))
+
+import harness  # noqa: E402
+
+harness.prepare_environment(tempfile.mkdtemp(prefix="pm-tests-"))
+
+from database import engine  # noqa: E402
+from models import models  # noqa: E402
+
+models.Base.metadata.create_all(bind=engine)
@@ -0,0 +1,34 @@
+"""Which stored bcrypt costs are re-hashed on login, pinned and calibrated."""
+import pytest
+from passlib.hash import bcrypt
+
+from config import Config
+from utils import auth
+
+
+def hash_at(rounds: int) -> str:
+    return bcrypt.using(rounds=rounds).hash("correct horse")
+
+
+@pytest.fixture
+def cost(monkeypatch):
+    def configure(pinned: int, calibrated: int = 0, min_rounds: int = 4):
+        monkeypatch.setattr(Config, "BCRYPT_ROUNDS", pinned)
+        monkeypatch.setattr(Config, "BCRYPT_MIN_ROUNDS", min_rounds)
+        monkeypatch.setattr(auth, "_bcrypt_rounds", pinned or calibrated)
+    return configure
+
+
+def test_pinned_cost_rehashes_both_directions(cost):
+    cost(pinned=5)
+    assert auth.password_needs_rehash(hash_at(4))
+    assert not auth.password_needs_rehash(hash_at(5))
+    assert auth.password_needs_rehash(hash_at(6))
+
+
+def test_calibrated_cost_only_raises_the_floor(cost):
+    cost(pinned=0, calibrated=6, min_rounds=5)
+    assert auth.password_needs_rehash(hash_at(4))
+    assert not auth.password_needs_rehash(hash_at(5))
+    # Made by a worker that calibrated higher; re-hashing it down would flap between workers
+    assert not auth.password_needs_rehash(hash_at(7))
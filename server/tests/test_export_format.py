@@ -0,0 +1,111 @@
+"""Round trips and tampering of the chunked PMX1 export format, plus the legacy fallback on import."""
+import asyncio
+import base64
+import io
+import json
+import os
+import struct
+
+import pytest
+from fastapi import UploadFile
+
+from utils.export_format import HEADER_SIZE, ExportFormatError, StreamDecryptor, encrypt_stream
+
+KEY = os.urandom(32)
+SALT = os.urandom(16)
+PLAINTEXT = json.dumps([{"title": f"entry {i}", "notes": "x" * 50} for i in range(40)]).encode()
+
+
+def encrypt(plaintext: bytes = PLAINTEXT, chunk_size: int = 256) -> bytes:
+    pieces = [plaintext[i:i + 100] for i in range(0, len(plaintext), 100)]
+    return b"".join(encrypt_stream(KEY, SALT, pieces, chunk_size))
+
+
+def split_frames(data: bytes) -> tuple[bytes, list]:
+    header, rest = data[:HEADER_SIZE], data[HEADER_SIZE:]
+    frames = []
+    while rest:
+        (length,) = struct.unpack(">I", rest[:4])
+        frames.append(rest[:4 + length])
+        rest = rest[4 + length:]
+    return header, frames
+
+
+def decrypt(data: bytes, feed_size: int = 100) -> bytes:
+    decryptor = StreamDecryptor()
+    plaintext = []
+    for i in range(0, len(data), feed_size):
+        plaintext += decryptor.feed(data[i:i + feed_size])
+        if decryptor.header_ready and decryptor._aead is None:
+            assert decryptor.salt == SALT
+            decryptor.set_key(KEY)
+            plaintext += decryptor.feed(b"")
+    decryptor.close()
+    return b"".join(plaintext)
+
+
+def test_multi_chunk_round_trip():
+    data = encrypt()
+    _, frames = split_frames(data)
+    assert len(frames) > 3
+    assert decrypt(data) == PLAINTEXT
+    assert decrypt(data, feed_size=1) == PLAINTEXT  # Frames split across every possible boundary
+
+
+def test_empty_plaintext_round_trip():
+    assert decrypt(encrypt(b"")) == b""
+
+
+def test_missing_final_chunk_is_truncated():
+    header, frames = split_frames(encrypt())
+    with pytest.raises(ExportFormatError, match="truncated"):
+        decrypt(header + b"".join(frames[:-1]))
+
+
+def test_partial_frame_is_truncated():
+    data = encrypt()
+    with pytest.raises(ExportFormatError, match="truncated"):
+        decrypt(data[:-5])
+
+
+def test_swapped_chunks_fail_authentication():
+    header, frames = split_frames(encrypt())
+    frames[1], frames[2] = frames[2], frames[1]
+    with pytest.raises(ExportFormatError, match="authentication"):
+        decrypt(header + b"".join(frames))
+
+
+def test_data_after_final_chunk_is_refused():
+    header, frames = split_frames(encrypt())
+    with pytest.raises(ExportFormatError, match="after the final chunk"):
+        decrypt(header + b"".join(frames) + frames[0])
+
+
+@pytest.mark.parametrize("offset", [HEADER_SIZE - 1, HEADER_SIZE + 10, -1])
+def test_flipped_byte_fails_authentication(offset):
+    data = bytearray(encrypt())
+    data[offset] ^= 0x01  # In the header (nonce prefix), in a frame, and in the last tag
+    with pytest.raises(ExportFormatError, match="authentication"):
+        decrypt(bytes(data))
+
+
+def collect_import(data: bytes, passphrase: str) -> list:
+    from routers.encryption import iter_import_entries
+
+    async def run():
+        return [entry async for entry in iter_import_entries(UploadFile(io.BytesIO(data)), passphrase)]
+
+    return asyncio.run(run())
+
+
+def test_import_reads_chunked_and_legacy_exports():
+    from routers.encryption import derive_key, encrypt_password
+
+    entries = json.loads(PLAINTEXT)
+    salt = os.urandom(16)
+    key = base64.urlsafe_b64decode(derive_key("passphrase", salt))
+    chunked = b"".join(encrypt_stream(key, salt, [PLAINTEXT], 256))
+    assert collect_import(chunked, "passphrase") == entries
+    # Exports made before the chunked format: one Fernet token over the whole JSON
+    legacy = encrypt_password(PLAINTEXT.decode(), "passphrase").encode()
+    assert collect_import(legacy, "passphrase") == entries
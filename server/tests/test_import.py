@@ -0,0 +1,95 @@
+"""Batch commits, resume and rollback of /api/v1/encryption/import-passwords."""
+import json
+
+import pytest
+from sqlalchemy import delete, func, select
+
+from config import Config
+from database import SessionLocal
+from models.models import ImportBatch, ImportJob, PasswordEntry
+from routers.encryption import encrypt_password
+
+USER_ID = 7
+PASSPHRASE = "import passphrase"
+URL = "/api/v1/encryption/import-passwords"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    monkeypatch.setattr(Config, "IMPORT_BATCH_SIZE", 2)
+    with SessionLocal() as db:
+        for model in (PasswordEntry, ImportBatch, ImportJob):
+            db.execute(delete(model))
+        db.commit()
+    return TestClient(app)
+
+
+def export_file(count: int, broken_at: int | None = None) -> bytes:
+    entries = [
+        {"title": f"t{i}", "url": None, "username": "u", "encrypted_password": "x", "notes": None,
+         "is_deleted": False, "is_Favrout": False, "created_at": None, "updated_at": None}
+        for i in range(count)
+    ]
+    if broken_at is not None:
+        del entries[broken_at]["title"]
+    return encrypt_password(json.dumps(entries), PASSPHRASE).encode()
+
+
+def upload(client, data: bytes, **params):
+    return client.post(URL, params={"user_id": USER_ID, **params}, data={"passphrase": PASSPHRASE},
+                       files={"file": ("export.json", data)})
+
+
+def stored_titles() -> list:
+    with SessionLocal() as db:
+        return list(db.scalars(select(PasswordEntry.title).where(PasswordEntry.user_id == USER_ID).order_by(PasswordEntry.id)))
+
+
+def import_jobs() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(ImportJob))
+
+
+def test_import_commits_every_batch_and_forgets_the_job(client):
+    response = upload(client, export_file(5))
+    assert response.status_code == 200
+    assert response.json()["imported"] == 5
+    assert stored_titles() == [f"t{i}" for i in range(5)]
+    assert import_jobs() == 0
+
+
+def test_failed_import_keeps_committed_batches_and_resumes(client):
+    response = upload(client, export_file(7, broken_at=5))
+    assert response.status_code == 400
+    import_id = response.headers["X-Import-Id"]
+    assert stored_titles() == [f"t{i}" for i in range(4)]  # Two full batches
+
+    response = upload(client, export_file(7), resume=import_id)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 7
+    assert stored_titles() == [f"t{i}" for i in range(7)]
+    assert import_jobs() == 0
+    # A finished import can't be resumed again
+    assert upload(client, export_file(7), resume=import_id).status_code == 404
+
+
+def test_failed_import_rolls_back(client):
+    upload(client, export_file(3))
+    response = upload(client, export_file(7, broken_at=5))
+    import_id = response.headers["X-Import-Id"]
+
+    response = client.post(f"{URL}/{import_id}/rollback", params={"user_id": USER_ID})
+    assert response.status_code == 200
+    assert response.json()["removed"] == 4
+    assert stored_titles() == ["t0", "t1", "t2"]  # Entries from the earlier import stay
+    assert client.post(f"{URL}/{import_id}/rollback", params={"user_id": USER_ID}).status_code == 404
+
+
+def test_other_users_cannot_resume_or_roll_back(client):
+    import_id = upload(client, export_file(3, broken_at=2)).headers["X-Import-Id"]
+    assert client.post(f"{URL}/{import_id}/rollback", params={"user_id": USER_ID + 1}).status_code == 404
+    assert client.post(URL, params={"user_id": USER_ID + 1, "resume": import_id}, data={"passphrase": PASSPHRASE},
+                       files={"file": ("export.json", export_file(3))}).status_code == 404
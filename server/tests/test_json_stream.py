@@ -0,0 +1,95 @@
+"""JSONArrayParser on awkward elements, every chunk boundary, and bad input."""
+import json
+
+import pytest
+
+from utils.json_stream import JSONArrayParser
+
+ELEMENTS = [
+    {"title": "brackets [in] {strings}", "notes": "a ] then a , and a ["},
+    {"title": 'escaped \\" quote', "notes": "\"quoted\" and \\ backslash"},
+    {"title": "unicode: café ☃ \U0001f511", "notes": "日本語"},
+    12345,
+    [1, [2, [3]]],
+    None,
+    "plain string",
+]
+
+
+def parse(data: bytes, step: int | None = None) -> list:
+    parser = JSONArrayParser()
+    items = []
+    step = step or len(data) or 1
+    for i in range(0, len(data), step):
+        items += parser.feed(data[i:i + step])
+    parser.close()
+    return items
+
+
+def parse_split_at(data: bytes, split: int) -> list:
+    parser = JSONArrayParser()
+    items = parser.feed(data[:split]) + parser.feed(data[split:])
+    parser.close()
+    return items
+
+
+def test_awkward_elements_in_one_feed():
+    assert parse(json.dumps(ELEMENTS).encode()) == ELEMENTS
+
+
+def test_elements_split_at_every_boundary():
+    # Non-ASCII escaping off, so some splits land inside a multi-byte UTF-8 sequence
+    data = json.dumps(ELEMENTS, ensure_ascii=False, indent=1).encode()
+    for split in range(len(data) + 1):
+        assert parse_split_at(data, split) == ELEMENTS, f"split at byte {split}"
+
+
+def test_one_byte_feeds():
+    data = json.dumps(ELEMENTS, ensure_ascii=False).encode()
+    assert parse(data, step=1) == ELEMENTS
+
+
+def test_elements_come_out_as_soon_as_they_are_complete():
+    parser = JSONArrayParser()
+    assert parser.feed(b'[{"a": 1}, {"b"') == [{"a": 1}]
+    assert parser.feed(b': 2}]') == [{"b": 2}]
+    assert parser.done
+
+
+@pytest.mark.parametrize("data", [b"[]", b"  [ ]  ", b"\n[\n]\n"])
+def test_empty_array(data):
+    assert parse(data) == []
+
+
+@pytest.mark.parametrize("data", [
+    b"",                  # No array at all
+    b'{"a": 1}',          # Not an array
+    b"[1, 2",             # Unterminated
+    b'[{"a": 1}',         # Unterminated after an element
+    b"[1 2]",             # Missing comma
+    b"[1,]",              # Trailing comma
+    b'[{"a": tru}]',      # Malformed literal
+    b'["unterminated]',   # Unterminated string
+])
+def test_malformed_input_is_rejected(data):
+    with pytest.raises(ValueError):
+        parse(data)
+
+
+@pytest.mark.parametrize("data", [b"[1] 2", b"[1]]", b'[1] {"a": 1}'])
+def test_trailing_data_is_rejected(data):
+    with pytest.raises(ValueError, match="after the JSON array"):
+        parse(data)
+
+
+def test_trailing_data_in_a_later_feed_is_rejected():
+    parser = JSONArrayParser()
+    assert parser.feed(b"[1]") == [1]
+    with pytest.raises(ValueError, match="after the JSON array"):
+        parser.feed(b" x")
+
+
+def test_oversized_element_is_rejected():
+    parser = JSONArrayParser(max_element_size=100)
+    with pytest.raises(ValueError, match="too large"):
+        parser.feed(b'[{"notes": "' + b"x" * 200)
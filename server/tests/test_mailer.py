@@ -0,0 +1,95 @@
+"""Spool handling of the background mail dispatcher, with a fake SMTP connection."""
+import os
+import smtplib
+import stat
+import time
+
+import pytest
+
+from utils.mailer import MailDispatcher
+
+
+class FakeConnection:
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.sent = []
+
+    def sendmail(self, sender, to, message):
+        if self.error:
+            raise self.error
+        self.sent.append(to)
+
+
+class FakePool:
+    def __init__(self, connection: FakeConnection):
+        self.connection = connection
+
+    def acquire(self):
+        return self.connection
+
+    def release(self, conn, broken=False):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def spool_dir(tmp_path):
+    return str(tmp_path / "spool")
+
+
+def spooled(spool_dir: str) -> list:
+    return sorted(name for name in os.listdir(spool_dir) if name.endswith(".json"))
+
+
+def test_spool_is_encrypted_and_owner_only(spool_dir):
+    dispatcher = MailDispatcher(FakePool(FakeConnection()), spool_dir)
+    message_id = dispatcher.enqueue("a@example.com", "Your code", "OTP 424242")
+
+    path = os.path.join(spool_dir, f"{message_id}.json")
+    with open(path) as f:
+        assert "424242" not in f.read()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(spool_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(os.path.join(spool_dir, "failed")).st_mode) == 0o700
+
+
+def test_sent_mail_is_deleted(spool_dir):
+    connection = FakeConnection()
+    dispatcher = MailDispatcher(FakePool(connection), spool_dir)
+    message_id = dispatcher.enqueue("a@example.com", "Your code", "OTP 424242")
+
+    dispatcher._send_batch([message_id])
+    assert connection.sent == ["a@example.com"]
+    assert spooled(spool_dir) == []
+
+
+def test_legacy_plaintext_spool_is_still_sent(spool_dir):
+    connection = FakeConnection()
+    dispatcher = MailDispatcher(FakePool(connection), spool_dir)
+    dispatcher._ensure_spool()
+    with open(os.path.join(spool_dir, "legacy.json"), "w") as f:
+        f.write('{"id": "legacy", "to": "b@example.com", "subject": "s", "body": "b", "is_html": false, '
+                '"attempts": 0, "next_attempt_at": 0}')
+
+    dispatcher._load_spool()
+    dispatcher._send_batch([dispatcher._heap[0][1]])
+    assert connection.sent == ["b@example.com"]
+
+
+def test_failed_mail_is_purged_after_retention(spool_dir):
+    error = smtplib.SMTPRecipientsRefused({"c@example.com": (550, b"no such user")})
+    dispatcher = MailDispatcher(FakePool(FakeConnection(error)), spool_dir, failed_retention=60)
+    message_id = dispatcher.enqueue("c@example.com", "Reset", "https://example.com/reset?token=secret")
+
+    dispatcher._send_batch([message_id])
+    failed = os.path.join(spool_dir, "failed", f"{message_id}.json")
+    assert spooled(spool_dir) == []
+    assert os.path.exists(failed)
+
+    assert dispatcher.purge_failed() == 0  # Still within the retention period
+    past = time.time() - 61
+    os.utime(failed, (past, past))
+    assert dispatcher.purge_failed() == 1
+    assert not os.path.exists(failed)
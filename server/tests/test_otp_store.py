@@ -0,0 +1,76 @@
+"""Single use, expiry and attempt limits of both OTP stores."""
+import threading
+
+import pytest
+
+from models.models import OTPCode
+from database import SessionLocal
+from sqlalchemy import delete
+from utils.otp_store import (
+    OTP_EXPIRED, OTP_INVALID, OTP_NOT_FOUND, OTP_OK, OTP_TOO_MANY, DatabaseOTPStore, MemoryOTPStore,
+)
+
+EMAIL = "otp@example.com"
+RECORD = {"otp": "123456", "user_id": 1, "username": "otp"}
+
+
+@pytest.fixture(params=["memory", "database"])
+def store(request):
+    if request.param == "memory":
+        return MemoryOTPStore()
+    with SessionLocal() as db:
+        db.execute(delete(OTPCode))
+        db.commit()
+    return DatabaseOTPStore()
+
+
+def test_code_is_single_use(store):
+    assert store.create(EMAIL, RECORD, ttl=60)
+    assert not store.create(EMAIL, RECORD, ttl=60)  # One live code per email
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_OK
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_NOT_FOUND
+
+
+def test_concurrent_consumes_succeed_once(store):
+    for _ in range(10):
+        assert store.create(EMAIL, RECORD, ttl=60)
+        barrier = threading.Barrier(2)
+        results = []
+
+        def consume():
+            barrier.wait()
+            results.append(store.verify(EMAIL, "123456", max_retries=3).status)
+
+        threads = [threading.Thread(target=consume) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(results) == [OTP_NOT_FOUND, OTP_OK]
+
+
+def test_expired_code_is_refused_and_removed(store):
+    assert store.create(EMAIL, RECORD, ttl=-1)
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_EXPIRED
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_NOT_FOUND
+    # An expired code doesn't block issuing a new one
+    assert store.create(EMAIL, RECORD, ttl=-1)
+    assert store.create(EMAIL, RECORD, ttl=60)
+
+
+def test_attempts_are_limited(store):
+    assert store.create(EMAIL, RECORD, ttl=60)
+    remaining = [store.verify(EMAIL, "000000", max_retries=3) for _ in range(3)]
+    assert [result.status for result in remaining] == [OTP_INVALID] * 3
+    assert [result.remaining for result in remaining] == [2, 1, 0]
+    # Even the right code is refused once the attempts are used up, and the code is gone
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_TOO_MANY
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_NOT_FOUND
+
+
+def test_sweep_removes_only_expired(store):
+    assert store.create("live@example.com", RECORD, ttl=60)
+    assert store.create(EMAIL, RECORD, ttl=-1)
+    assert store.sweep() == 1
+    assert store.verify(EMAIL, "123456", max_retries=3).status == OTP_NOT_FOUND
+    assert store.verify("live@example.com", "123456", max_retries=3).status == OTP_OK
@@ -0,0 +1,75 @@
+"""Keyset pagination of /api/v1/passwords-list over rows that share a timestamp.
+
+Runs the app in-process against the throwaway database from conftest.py::
+
+    python -m pytest tests
+"""
+import datetime
+
+import pytest
+
+ENTRIES = 7
+PAGE_SIZE = 3
+
+
+@pytest.fixture(scope="module")
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+    from utils.jwt import create_access_token
+
+    client = TestClient(app)
+    client.cookies.set("access_token", create_access_token({"sub": "1", "email": "a@example.com", "username": "a"}))
+    return client
+
+
+def reset_entries(rows: list):
+    from sqlalchemy import delete, insert
+    from database import SessionLocal
+    from models.models import PasswordEntry
+
+    with SessionLocal() as db:
+        db.execute(delete(PasswordEntry))
+        db.execute(insert(PasswordEntry), rows)
+        db.commit()
+
+
+def page_ids(client) -> list:
+    ids = []
+    cursor = None
+    for _ in range(ENTRIES):  # More pages than this means a cursor repeated itself
+        params = {"sort": "updated_at", "limit": PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/passwords-list", params=params)
+        assert response.status_code == 200
+        ids += [entry["id"] for entry in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ids
+    pytest.fail(f"pagination did not end; ids so far {ids}")
+
+
+def entry_rows(updated_at) -> list:
+    return [
+        {"id": i, "user_id": 1, "title": f"t{i}", "username": "u", "encrypted_password": "x", "updated_at": updated_at}
+        for i in range(1, ENTRIES + 1)
+    ]
+
+
+def test_same_timestamp_pages_end(client):
+    reset_entries(entry_rows(datetime.datetime(2024, 1, 1, 12, 0, 0)))
+    assert page_ids(client) == list(range(ENTRIES, 0, -1))
+
+
+def test_legacy_timestamps_without_fraction_page_end(client):
+    from sqlalchemy import text
+    from database import engine
+    from jobs.normalize_timestamps import normalize_entry_timestamps
+
+    reset_entries(entry_rows(datetime.datetime(2024, 1, 1, 12, 0, 0)))
+    # What the old func.now() server default stored on SQLite
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE password_entries SET updated_at = '2024-01-01 12:00:00'"))
+    assert normalize_entry_timestamps(engine, batch_size=3) == ENTRIES  # updated_at only
+    assert page_ids(client) == list(range(ENTRIES, 0, -1))
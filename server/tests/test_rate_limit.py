@@ -0,0 +1,81 @@
+"""Token buckets of both rate-limit stores, driven by an injected clock."""
+import pytest
+from sqlalchemy import delete
+
+from database import SessionLocal
+from models.models import RateLimitBucket
+from utils.rate_limit import DatabaseRateLimitStore, MemoryRateLimitStore, RateLimitRule
+
+RULE = RateLimitRule("login-ip", burst=3, per_second=0.5)  # A token every 2 seconds
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture(params=["memory", "database"])
+def store(request, clock):
+    if request.param == "memory":
+        return MemoryRateLimitStore(max_keys=100, clock=clock)
+    with SessionLocal() as db:
+        db.execute(delete(RateLimitBucket))
+        db.commit()
+    return DatabaseRateLimitStore(clock=clock)
+
+
+def consume(store, clock, key: str = "login-ip:1.2.3.4"):
+    return store.consume(key, RULE, clock())
+
+
+def test_burst_then_refused_with_retry_after(store, clock):
+    assert [consume(store, clock).allowed for _ in range(3)] == [True, True, True]
+    decision = consume(store, clock)
+    assert not decision.allowed
+    assert decision.retry_after == pytest.approx(2.0)
+
+    clock.now += 1.5
+    decision = consume(store, clock)
+    assert not decision.allowed
+    assert decision.retry_after == pytest.approx(0.5)
+
+
+def test_tokens_refill_over_time(store, clock):
+    for _ in range(3):
+        consume(store, clock)
+    clock.now += 2.0
+    assert consume(store, clock).allowed
+    assert not consume(store, clock).allowed
+
+
+def test_refill_is_capped_at_burst(store, clock):
+    consume(store, clock)
+    clock.now += 3600
+    assert [consume(store, clock).allowed for _ in range(4)] == [True, True, True, False]
+
+
+def test_buckets_are_independent(store, clock):
+    for _ in range(3):
+        consume(store, clock, "login-ip:1.2.3.4")
+    assert not consume(store, clock, "login-ip:1.2.3.4").allowed
+    assert consume(store, clock, "login-ip:5.6.7.8").allowed
+
+
+def test_sweep_drops_only_full_buckets(store, clock):
+    consume(store, clock, "login-ip:idle")  # Full again 2 seconds later
+    clock.now += 1
+    for _ in range(3):
+        consume(store, clock, "login-ip:busy")  # Full again 6 seconds later
+    clock.now += 1.5
+    assert store.sweep() == 1
+    clock.now += 5
+    assert store.sweep() == 1
+    assert store.sweep() == 0
@@ -0,0 +1,105 @@
+"""Bloom filter guarantees and cross-worker refresh of the revocation list, with an injected clock."""
+import asyncio
+import secrets
+
+import pytest
+from sqlalchemy import delete, insert
+
+from database import SessionLocal
+from models.models import RevokedToken
+from utils.revocation import REFRESH_OVERLAP_SECONDS, BloomFilter, RevocationList
+
+
+class Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    with SessionLocal() as db:
+        db.execute(delete(RevokedToken))
+        db.commit()
+    return Clock()
+
+
+def is_revoked(revocations: RevocationList, jti: str) -> bool:
+    return asyncio.run(revocations.is_revoked(jti))
+
+
+def store_revocation(jti: str, expires_at: float, revoked_at: float):
+    """A revocation written by another worker."""
+    with SessionLocal() as db:
+        db.execute(insert(RevokedToken).values(jti=jti, expires_at=expires_at, revoked_at=revoked_at))
+        db.commit()
+
+
+@pytest.mark.parametrize("capacity", [10_000, 100])  # Sized right, and overfilled 100 times over
+def test_bloom_filter_has_no_false_negatives(capacity):
+    bloom = BloomFilter(capacity, error_rate=0.01)
+    items = [secrets.token_urlsafe(16) for _ in range(10_000)]
+    for item in items:
+        bloom.add(item)
+    assert all(item in bloom for item in items)
+
+
+def test_bloom_filter_false_positive_rate_is_near_target():
+    bloom = BloomFilter(10_000, error_rate=0.01)
+    for _ in range(10_000):
+        bloom.add(secrets.token_urlsafe(16))
+    false_positives = sum(secrets.token_urlsafe(16) in bloom for _ in range(10_000))
+    assert false_positives < 300  # 1% expected
+
+
+def test_bloom_filter_counts_repeats_once():
+    bloom = BloomFilter(100, error_rate=0.01)
+    bloom.add("jti")
+    bloom.add("jti")
+    assert bloom.count == 1
+
+
+def test_revoked_token_is_refused_until_it_expires(clock):
+    revocations = RevocationList(1000, 0.01, clock=clock)
+    revocations.rebuild()
+    revocations.revoke("jti-1", expires_at=clock.now + 60)
+    assert is_revoked(revocations, "jti-1")
+    assert not is_revoked(revocations, "jti-2")
+
+    clock.now += 61
+    assert not is_revoked(revocations, "jti-1")  # Still in the filter, but the lookup sees it has expired
+    assert revocations.sweep() == 1
+
+
+def test_refresh_picks_up_other_workers_revocations(clock):
+    revocations = RevocationList(1000, 0.01, clock=clock)
+    revocations.rebuild()
+    store_revocation("other-worker", expires_at=clock.now + 600, revoked_at=clock.now + 5)
+    assert not is_revoked(revocations, "other-worker")  # Not in this worker's filter yet
+
+    clock.now += 30
+    revocations.refresh()
+    assert is_revoked(revocations, "other-worker")
+
+
+def test_refresh_overlap_catches_late_commits(clock):
+    revocations = RevocationList(1000, 0.01, clock=clock)
+    revocations.rebuild()
+    clock.now += 30
+    revocations.refresh()
+    loaded_until = clock.now
+
+    # Stamped before the last refresh but committed after it (a slow commit, or a worker whose clock lags)
+    store_revocation("late", expires_at=clock.now + 600, revoked_at=loaded_until - REFRESH_OVERLAP_SECONDS + 1)
+    # Older than the overlap window: a refresh never looks back that far
+    store_revocation("too-late", expires_at=clock.now + 600, revoked_at=loaded_until - REFRESH_OVERLAP_SECONDS - 1)
+    clock.now += 30
+    revocations.refresh()
+    assert is_revoked(revocations, "late")
+    assert not is_revoked(revocations, "too-late")
+
+    # A rebuild (which sweep runs) loads every unexpired row regardless of when it was stamped
+    revocations.rebuild()
+    assert is_revoked(revocations, "too-late")
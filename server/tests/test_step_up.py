@@ -0,0 +1,91 @@
+"""Step-up grants: bound to one access token and one user, short-lived, and useless once the token is revoked."""
+import jwt
+import pytest
+from sqlalchemy import delete, insert
+
+from config import Config
+from database import SessionLocal
+from models.models import PasswordEntry, RevokedToken
+from utils.auth import encrypt_password
+from utils.jwt import create_access_token, create_step_up_grant, decode_access_token, verify_step_up_grant
+from utils.revocation import revocation_list
+
+USER_ID = 42
+ENTRY_ID = 4200
+
+
+def access_token(user_id: int = USER_ID) -> str:
+    return create_access_token({"sub": str(user_id), "email": "step@example.com", "username": "step"})
+
+
+def test_grant_verifies_for_its_own_token_and_user():
+    token = access_token()
+    assert verify_step_up_grant(create_step_up_grant(token, USER_ID), token, USER_ID)
+
+
+def test_grant_bound_to_another_access_token_is_refused():
+    grant = create_step_up_grant(access_token(), USER_ID)
+    # Same user, another session: the ath claim doesn't match
+    assert not verify_step_up_grant(grant, access_token(), USER_ID)
+
+
+def test_grant_for_another_user_is_refused():
+    token = access_token()
+    assert not verify_step_up_grant(create_step_up_grant(token, USER_ID), token, USER_ID + 1)
+
+
+def test_expired_grant_is_refused(monkeypatch):
+    token = access_token()
+    monkeypatch.setattr(Config, "STEP_UP_GRANT_MINUTES", -1)
+    assert not verify_step_up_grant(create_step_up_grant(token, USER_ID), token, USER_ID)
+
+
+def test_grant_needs_the_step_up_audience_and_key():
+    token = access_token()
+    payload = jwt.decode(create_step_up_grant(token, USER_ID), Config.SECRET_KEY, algorithms=["HS256"], audience="step-up")
+    assert not verify_step_up_grant(jwt.encode({**payload, "aud": "other"}, Config.SECRET_KEY, algorithm="HS256"), token, USER_ID)
+    assert not verify_step_up_grant(jwt.encode(payload, "another-secret-another-secret-1234", algorithm="HS256"), token, USER_ID)
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    from main import app
+
+    with SessionLocal() as db:
+        db.execute(delete(PasswordEntry).where(PasswordEntry.id == ENTRY_ID))
+        db.execute(delete(RevokedToken))
+        db.execute(insert(PasswordEntry).values(
+            id=ENTRY_ID, user_id=USER_ID, title="t", username="u", encrypted_password=encrypt_password("hunter2hunter2"),
+        ))
+        db.commit()
+    revocation_list.rebuild()
+    return TestClient(app)
+
+
+def reveal(client, token: str, grant: str):
+    client.cookies.set("access_token", token)
+    return client.post("/api/v1/get-password", json={"serviceID": str(ENTRY_ID), "email": "step@example.com"},
+                       headers={"X-Step-Up-Grant": grant})
+
+
+def test_reveal_with_grant_skips_the_master_password(client):
+    token = access_token()
+    response = reveal(client, token, create_step_up_grant(token, USER_ID))
+    assert response.status_code == 200
+    assert response.json()["password"] == "hunter2hunter2"
+
+
+def test_reveal_with_grant_for_another_session_is_refused(client):
+    grant = create_step_up_grant(access_token(), USER_ID)
+    response = reveal(client, access_token(), grant)
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Master password or step-up grant required."
+
+
+def test_grant_is_useless_once_its_token_is_revoked(client):
+    token = access_token()
+    grant = create_step_up_grant(token, USER_ID)
+    payload = decode_access_token(token)
+    revocation_list.revoke(payload["jti"], payload["exp"])
+    assert reveal(client, token, grant).status_code == 401